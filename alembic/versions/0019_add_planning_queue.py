@@ -0,0 +1,52 @@
+"""add planning queue
+
+Revision ID: 0019
+Revises: 0018
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0019"
+down_revision = "0018"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Rows are populated by app.planning.ensure_planning_queue on startup.
+    op.create_table(
+        "planning_queue",
+        sa.Column("address_id", sa.Integer, primary_key=True),
+        sa.Column("street_key", sa.String(length=200), nullable=False),
+        sa.Column("house_number", sa.Integer(), nullable=False),
+        sa.Column("house_suffix", sa.String(length=50), nullable=False, server_default=""),
+        sa.Column("priority", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("plannable", sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column("reschedule", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("blocked", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("buffer", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["address_id"], ["addresses.id"]),
+    )
+    op.create_index(
+        "ix_planning_queue_order",
+        "planning_queue",
+        [
+            "plannable",
+            "blocked",
+            sa.text("reschedule DESC"),
+            sa.text("priority DESC"),
+            "street_key",
+            "house_number",
+            "house_suffix",
+        ],
+    )
+    op.create_index("ix_planning_queue_street_key", "planning_queue", ["street_key"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_planning_queue_street_key", table_name="planning_queue")
+    op.drop_index("ix_planning_queue_order", table_name="planning_queue")
+    op.drop_table("planning_queue")
@@ -0,0 +1,96 @@
+"""add address sort key
+
+Revision ID: 0020
+Revises: 0019
+Create Date: 2026-10-16
+"""
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0020"
+down_revision = "0019"
+branch_labels = None
+depends_on = None
+
+HOUSE_NO_PATTERN = re.compile(r"(\d+)\s*(.*)")
+NO_HOUSE_NUMBER = 999999
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("addresses") as batch_op:
+        batch_op.add_column(
+            sa.Column("street_key", sa.String(length=200), nullable=False, server_default="")
+        )
+        batch_op.add_column(
+            sa.Column(
+                "house_number",
+                sa.Integer(),
+                nullable=False,
+                server_default=str(NO_HOUSE_NUMBER),
+            )
+        )
+        batch_op.add_column(
+            sa.Column("house_suffix", sa.String(length=50), nullable=False, server_default="")
+        )
+
+    bind = op.get_bind()
+    addresses = sa.table(
+        "addresses",
+        sa.column("id", sa.Integer),
+        sa.column("street", sa.String),
+        sa.column("house_no", sa.String),
+        sa.column("street_key", sa.String),
+        sa.column("house_number", sa.Integer),
+        sa.column("house_suffix", sa.String),
+    )
+    rows = bind.execute(sa.select(addresses.c.id, addresses.c.street, addresses.c.house_no)).all()
+    updates = []
+    for row in rows:
+        house_no = (row.house_no or "").strip()
+        match = HOUSE_NO_PATTERN.match(house_no)
+        if match:
+            number, suffix = int(match.group(1)), match.group(2).strip().lower()
+        else:
+            number, suffix = NO_HOUSE_NUMBER, house_no.lower()
+        updates.append(
+            {
+                "row_id": row.id,
+                "street_key": (row.street or "").lower(),
+                "house_number": number,
+                "house_suffix": suffix,
+            }
+        )
+    if updates:
+        bind.execute(
+            addresses.update()
+            .where(addresses.c.id == sa.bindparam("row_id"))
+            .values(
+                street_key=sa.bindparam("street_key"),
+                house_number=sa.bindparam("house_number"),
+                house_suffix=sa.bindparam("house_suffix"),
+            ),
+            updates,
+        )
+
+    op.create_index(
+        "ix_addresses_sort_key",
+        "addresses",
+        ["street_key", "house_number", "house_suffix", "id"],
+    )
+    op.create_index(
+        "ix_street_priorities_street_lower",
+        "street_priorities",
+        [sa.text("lower(street)")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_street_priorities_street_lower", table_name="street_priorities")
+    op.drop_index("ix_addresses_sort_key", table_name="addresses")
+    with op.batch_alter_table("addresses") as batch_op:
+        batch_op.drop_column("house_suffix")
+        batch_op.drop_column("house_number")
+        batch_op.drop_column("street_key")
@@ -0,0 +1,40 @@
+"""add address current status
+
+Revision ID: 0021
+Revises: 0020
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0021"
+down_revision = "0020"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Rows are populated by app.current_status.ensure_current_status on startup.
+    op.create_table(
+        "address_current_status",
+        sa.Column("address_id", sa.Integer, primary_key=True),
+        sa.Column("appointment_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=50), nullable=True),
+        sa.Column("starts_at", sa.DateTime(), nullable=True),
+        sa.Column("not_home_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("photo_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("response_type", sa.String(length=40), nullable=True),
+        sa.Column("response_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["address_id"], ["addresses.id"]),
+        sa.ForeignKeyConstraint(["appointment_id"], ["appointments.id"]),
+    )
+    op.create_index(
+        "ix_address_current_status_status", "address_current_status", ["status"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_address_current_status_status", table_name="address_current_status")
+    op.drop_table("address_current_status")
@@ -0,0 +1,58 @@
+"""add address search index
+
+Revision ID: 0022
+Revises: 0021
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+
+revision = "0022"
+down_revision = "0021"
+branch_labels = None
+depends_on = None
+
+# FTS5 is SQLite only; other backends search with LIKE and have no typo
+# tolerance.
+COLUMNS = "street, house_no, zip, city, customer_name, customer_email, customer_phone"
+NEW_VALUES = (
+    "new.street, new.house_no, new.zip, new.city, "
+    "new.customer_name, new.customer_email, new.customer_phone"
+)
+OLD_VALUES = (
+    "old.street, old.house_no, old.zip, old.city, "
+    "old.customer_name, old.customer_email, old.customer_phone"
+)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS address_search USING fts5("
+        f"{COLUMNS}, content='addresses', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        f"CREATE TRIGGER IF NOT EXISTS address_search_ai AFTER INSERT ON addresses BEGIN "
+        f"INSERT INTO address_search(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER IF NOT EXISTS address_search_ad AFTER DELETE ON addresses BEGIN "
+        f"INSERT INTO address_search(address_search, rowid, {COLUMNS}) "
+        f"VALUES ('delete', old.id, {OLD_VALUES}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER IF NOT EXISTS address_search_au AFTER UPDATE ON addresses BEGIN "
+        f"INSERT INTO address_search(address_search, rowid, {COLUMNS}) "
+        f"VALUES ('delete', old.id, {OLD_VALUES}); "
+        f"INSERT INTO address_search(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END"
+    )
+    op.execute("INSERT INTO address_search(address_search) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for trigger in ("address_search_ai", "address_search_ad", "address_search_au"):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS address_search")
@@ -0,0 +1,68 @@
+"""add unique normalised address key
+
+Revision ID: 0023
+Revises: 0022
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0023"
+down_revision = "0022"
+branch_labels = None
+depends_on = None
+
+
+def normalize_address(*parts: str | None) -> str:
+    return "|".join(" ".join((part or "").split()).lower() for part in parts)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("addresses") as batch_op:
+        batch_op.add_column(sa.Column("address_key", sa.String(length=400), nullable=True))
+
+    bind = op.get_bind()
+    addresses = sa.table(
+        "addresses",
+        sa.column("id", sa.Integer),
+        sa.column("street", sa.String),
+        sa.column("house_no", sa.String),
+        sa.column("zip", sa.String),
+        sa.column("city", sa.String),
+        sa.column("address_key", sa.String),
+    )
+    rows = bind.execute(
+        sa.select(
+            addresses.c.id,
+            addresses.c.street,
+            addresses.c.house_no,
+            addresses.c.zip,
+            addresses.c.city,
+        ).order_by(addresses.c.id)
+    ).all()
+    # Existing duplicates keep a NULL key; only the oldest row of each address
+    # takes part in the unique index.
+    seen: set[str] = set()
+    updates = []
+    for row in rows:
+        key = normalize_address(row.street, row.house_no, row.zip, row.city)
+        if key in seen:
+            continue
+        seen.add(key)
+        updates.append({"row_id": row.id, "address_key": key})
+    if updates:
+        bind.execute(
+            addresses.update()
+            .where(addresses.c.id == sa.bindparam("row_id"))
+            .values(address_key=sa.bindparam("address_key")),
+            updates,
+        )
+
+    op.create_index("ux_addresses_address_key", "addresses", ["address_key"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ux_addresses_address_key", table_name="addresses")
+    with op.batch_alter_table("addresses") as batch_op:
+        batch_op.drop_column("address_key")
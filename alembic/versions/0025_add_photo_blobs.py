@@ -0,0 +1,41 @@
+"""add content-addressed photo blobs
+
+Revision ID: 0025
+Revises: 0024
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0025"
+down_revision = "0024"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "photo_blobs",
+        sa.Column("sha256", sa.String(length=64), primary_key=True),
+        sa.Column("file_path", sa.String(length=255), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    # Existing photos keep their file paths until `python -m app.photo_store`
+    # moves them into the blob store.
+    with op.batch_alter_table("appointment_photos") as batch_op:
+        batch_op.add_column(sa.Column("blob_sha256", sa.String(length=64), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_appointment_photos_blob_sha256", "photo_blobs", ["blob_sha256"], ["sha256"]
+        )
+        batch_op.create_index("ix_appointment_photos_blob_sha256", ["blob_sha256"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("appointment_photos") as batch_op:
+        batch_op.drop_index("ix_appointment_photos_blob_sha256")
+        batch_op.drop_constraint("fk_appointment_photos_blob_sha256", type_="foreignkey")
+        batch_op.drop_column("blob_sha256")
+    op.drop_table("photo_blobs")
@@ -0,0 +1,58 @@
+"""add secondary indexes for appointment and photo lookups
+
+Revision ID: 0026
+Revises: 0025
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0026"
+down_revision = "0025"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_appointments_address_id_starts_at", "appointments", ["address_id", "starts_at"]),
+    (
+        "ix_appointments_contractor_id_status_starts_at",
+        "appointments",
+        ["contractor_id", "status", "starts_at"],
+    ),
+    ("ix_appointments_starts_at", "appointments", ["starts_at"]),
+    ("ix_appointment_photos_appointment_id", "appointment_photos", ["appointment_id"]),
+    ("ix_appointment_photos_address_id", "appointment_photos", ["address_id"]),
+    ("ix_vvs_availability_date_user_id", "vvs_availability", ["date", "user_id"]),
+    (
+        "ix_resident_responses_address_id_created_at",
+        "resident_responses",
+        ["address_id", "created_at"],
+    ),
+    (
+        "ix_address_unavailable_periods_starts_at_ends_at",
+        "address_unavailable_periods",
+        ["starts_at", "ends_at"],
+    ),
+]
+
+
+def upgrade() -> None:
+    # Some tables are only ever created by init_db(), which also creates their
+    # indexes, so only tables that exist and lack the index are touched.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in INDEXES:
+        if table not in tables:
+            continue
+        if name in {index["name"] for index in inspector.get_indexes(table)}:
+            continue
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, _ in reversed(INDEXES):
+        if table in tables:
+            op.drop_index(name, table_name=table)
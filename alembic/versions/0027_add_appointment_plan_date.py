@@ -0,0 +1,39 @@
+"""add persisted appointment plan date
+
+Revision ID: 0027
+Revises: 0026
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0027"
+down_revision = "0026"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("appointments") as batch_op:
+        batch_op.add_column(sa.Column("plan_date", sa.Date(), nullable=True))
+
+    appointments = sa.table(
+        "appointments",
+        sa.column("starts_at", sa.DateTime),
+        sa.column("plan_date", sa.Date),
+    )
+    op.execute(
+        appointments.update().values(
+            plan_date=sa.func.date(appointments.c.starts_at, type_=sa.Date)
+        )
+    )
+    op.create_index(
+        "ix_appointments_plan_date_status", "appointments", ["plan_date", "status"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_appointments_plan_date_status", table_name="appointments")
+    with op.batch_alter_table("appointments") as batch_op:
+        batch_op.drop_column("plan_date")
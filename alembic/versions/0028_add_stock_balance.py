@@ -0,0 +1,38 @@
+"""add running stock balance
+
+Revision ID: 0028
+Revises: 0027
+Create Date: 2026-10-16
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0028"
+down_revision = "0027"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    stock_balance = op.create_table(
+        "stock_balance",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    movements = sa.table("stock_movements", sa.column("quantity", sa.Integer))
+    bind = op.get_bind()
+    quantity = bind.execute(
+        sa.select(sa.func.coalesce(sa.func.sum(movements.c.quantity), 0))
+    ).scalar()
+    op.bulk_insert(
+        stock_balance,
+        [{"id": 1, "quantity": quantity, "updated_at": datetime.utcnow()}],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("stock_balance")
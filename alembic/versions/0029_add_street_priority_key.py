@@ -0,0 +1,71 @@
+"""add normalised street key to street priorities
+
+Revision ID: 0029
+Revises: 0028
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0029"
+down_revision = "0028"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("street_priorities") as batch_op:
+        batch_op.add_column(sa.Column("street_key", sa.String(length=200), nullable=True))
+
+    # Lowered in Python so Æ, Ø and Å match addresses.street_key.
+    bind = op.get_bind()
+    priorities = sa.table(
+        "street_priorities",
+        sa.column("id", sa.Integer),
+        sa.column("street", sa.String),
+        sa.column("street_key", sa.String),
+        sa.column("priority", sa.Integer),
+    )
+    rows = bind.execute(
+        sa.select(priorities.c.id, priorities.c.street, priorities.c.priority)
+    ).all()
+    updates = [{"row_id": row.id, "street_key": (row.street or "").lower()} for row in rows]
+    if updates:
+        bind.execute(
+            priorities.update()
+            .where(priorities.c.id == sa.bindparam("row_id"))
+            .values(street_key=sa.bindparam("street_key")),
+            updates,
+        )
+        # Queue entries on non-ASCII streets were given priority 0 before.
+        queue = sa.table(
+            "planning_queue",
+            sa.column("street_key", sa.String),
+            sa.column("priority", sa.Integer),
+        )
+        bind.execute(
+            queue.update()
+            .where(queue.c.street_key == sa.bindparam("key"))
+            .values(priority=sa.bindparam("queue_priority")),
+            [
+                {"key": (row.street or "").lower(), "queue_priority": row.priority}
+                for row in rows
+            ],
+        )
+
+    op.drop_index("ix_street_priorities_street_lower", table_name="street_priorities")
+    with op.batch_alter_table("street_priorities") as batch_op:
+        batch_op.alter_column("street_key", existing_type=sa.String(length=200), nullable=False)
+        batch_op.create_index("ix_street_priorities_street_key", ["street_key"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("street_priorities") as batch_op:
+        batch_op.drop_index("ix_street_priorities_street_key")
+        batch_op.drop_column("street_key")
+    op.create_index(
+        "ix_street_priorities_street_lower",
+        "street_priorities",
+        [sa.text("lower(street)")],
+    )
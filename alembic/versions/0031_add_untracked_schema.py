@@ -0,0 +1,82 @@
+"""add schema that earlier migrations never created
+
+Revision ID: 0031
+Revises: 0030
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0031"
+down_revision = "0030"
+branch_labels = None
+depends_on = None
+
+# Columns the models gained without a migration. Databases created by
+# init_db() already have them, so only missing ones are added.
+COLUMNS = [
+    ("addresses", "old_meter_no", lambda: sa.String(length=120), {"nullable": True}),
+    ("addresses", "new_meter_no", lambda: sa.String(length=120), {"nullable": True}),
+    ("appointments", "old_meter_no", lambda: sa.String(length=120), {"nullable": True}),
+    ("appointments", "new_meter_no", lambda: sa.String(length=120), {"nullable": True}),
+    ("meter_batches", "meter_type", lambda: sa.String(length=120), {"nullable": True}),
+    (
+        "letter_templates",
+        "include_resident_link",
+        sa.Boolean,
+        {"nullable": False, "server_default": sa.true()},
+    ),
+]
+UNAVAILABLE_TABLE = "address_unavailable_periods"
+UNAVAILABLE_INDEX = "ix_address_unavailable_periods_starts_at_ends_at"
+
+# What this revision actually added, so downgrade() leaves schema that
+# init_db() created on its own.
+ADDED_TABLE = "schema_0031_added"
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    added = op.create_table(
+        ADDED_TABLE,
+        sa.Column("table_name", sa.String(length=120), nullable=False),
+        sa.Column("column_name", sa.String(length=120), nullable=True),
+    )
+    rows = []
+    for table, name, column_type, options in COLUMNS:
+        existing = {item["name"] for item in inspector.get_columns(table)}
+        if name not in existing:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column(name, column_type(), **options))
+            rows.append({"table_name": table, "column_name": name})
+
+    if UNAVAILABLE_TABLE not in tables:
+        op.create_table(
+            UNAVAILABLE_TABLE,
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("address_id", sa.Integer(), sa.ForeignKey("addresses.id"), nullable=True),
+            sa.Column("starts_at", sa.DateTime(), nullable=False),
+            sa.Column("ends_at", sa.DateTime(), nullable=False),
+            sa.Column("note", sa.String(length=255), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index(UNAVAILABLE_INDEX, UNAVAILABLE_TABLE, ["starts_at", "ends_at"])
+        rows.append({"table_name": UNAVAILABLE_TABLE, "column_name": None})
+    if rows:
+        op.bulk_insert(added, rows)
+
+
+def downgrade() -> None:
+    added = sa.table(ADDED_TABLE, sa.column("table_name"), sa.column("column_name"))
+    rows = op.get_bind().execute(sa.select(added.c.table_name, added.c.column_name)).all()
+    for table, name in reversed(rows):
+        if name is None:
+            op.drop_index(UNAVAILABLE_INDEX, table_name=table)
+            op.drop_table(table)
+        else:
+            # A plain DROP COLUMN (SQLite 3.35+) keeps the table, so the
+            # search triggers on addresses survive.
+            op.drop_column(table, name)
+    op.drop_table(ADDED_TABLE)
@@ -0,0 +1,32 @@
+"""add planning queue sort key index
+
+Revision ID: 0032
+Revises: 0031
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0032"
+down_revision = "0031"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_planning_queue_sort_key",
+        "planning_queue",
+        [
+            sa.text("priority DESC"),
+            "street_key",
+            "house_number",
+            "house_suffix",
+            "address_id",
+        ],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_planning_queue_sort_key", table_name="planning_queue")
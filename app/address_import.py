@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+import csv
+from dataclasses import dataclass, field
+from datetime import datetime
+import io
+from typing import BinaryIO
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.engine import Connection, Row
+from sqlalchemy.orm import Session
+
+from app import current_status, models, planning
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 20
+REQUIRED_FIELDS = ("street", "house_no", "zip", "city")
+OPTIONAL_FIELDS = ("customer_name", "customer_email", "customer_phone")
+
+# append: new addresses only, existing ones are reported and skipped.
+# upsert: existing addresses get the optional fields from the file.
+IMPORT_MODES = ("append", "upsert")
+
+
+class AddressImportError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def add_error(self, line_no: int, message: str) -> None:
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Linje {line_no}: {message}")
+
+
+def parse_row(row: dict[str, str | None]) -> tuple[dict[str, object] | None, str | None]:
+    values = {name: (row.get(name) or "").strip() for name in REQUIRED_FIELDS}
+    missing = [name for name in REQUIRED_FIELDS if not values[name]]
+    if missing:
+        return None, "mangler " + ", ".join(missing)
+    for name in OPTIONAL_FIELDS:
+        values[name] = (row.get(name) or "").strip() or None
+    values["street_key"] = models.normalize_street(values["street"])
+    values["house_number"], values["house_suffix"] = models.house_number_key(values["house_no"])
+    values["address_key"] = models.normalize_address(
+        values["street"], values["house_no"], values["zip"], values["city"]
+    )
+    return values, None
+
+
+def existing_addresses(connection: Connection, keys: list[str]) -> dict[str, Row]:
+    address_table = models.Address.__table__
+    rows = connection.execute(
+        select(
+            address_table.c.id,
+            address_table.c.address_key,
+            *(address_table.c[name] for name in OPTIONAL_FIELDS),
+        ).where(address_table.c.address_key.in_(keys))
+    ).all()
+    return {row.address_key: row for row in rows}
+
+
+def insert_addresses(connection: Connection, rows: list[dict[str, object]]) -> None:
+    # Core inserts bypass the ORM validators and flush listeners, so sort keys
+    # are computed in parse_row and the projections are refreshed here.
+    address_table = models.Address.__table__
+    new_ids = connection.execute(
+        insert(address_table).returning(address_table.c.id), rows
+    ).scalars().all()
+    planning.refresh_addresses(connection, new_ids)
+    current_status.refresh_addresses(connection, new_ids)
+
+
+def update_addresses(
+    connection: Connection, rows: list[dict[str, object]], fields: list[str]
+) -> None:
+    address_table = models.Address.__table__
+    connection.execute(
+        update(address_table)
+        .where(address_table.c.id == bindparam("row_id"))
+        .values(
+            {
+                **{name: bindparam(f"new_{name}") for name in fields},
+                "updated_at": bindparam("new_updated_at"),
+            }
+        ),
+        rows,
+    )
+
+
+def write_batch(
+    connection: Connection,
+    batch: list[tuple[int, dict[str, object]]],
+    mode: str,
+    update_fields: list[str],
+    result: ImportResult,
+) -> None:
+    existing = existing_addresses(
+        connection, list({values["address_key"] for _, values in batch})
+    )
+    inserts: dict[str, dict[str, object]] = {}
+    updates: dict[int, dict[str, object]] = {}
+    now = datetime.utcnow()
+    for line_no, values in batch:
+        key = values["address_key"]
+        current = existing.get(key)
+        if mode != "upsert":
+            if current is not None:
+                result.add_error(line_no, "adressen findes allerede")
+            elif key in inserts:
+                result.add_error(line_no, "adressen står flere gange i filen")
+            else:
+                inserts[key] = values
+            continue
+
+        # Later rows for the same address win.
+        if current is None:
+            inserts[key] = values
+            continue
+        if all(getattr(current, name) == values[name] for name in update_fields):
+            updates.pop(current.id, None)
+            continue
+        updates[current.id] = {
+            "row_id": current.id,
+            "new_updated_at": now,
+            **{f"new_{name}": values[name] for name in update_fields},
+        }
+
+    if inserts:
+        insert_addresses(connection, list(inserts.values()))
+    if updates:
+        update_addresses(connection, list(updates.values()), update_fields)
+    result.created += len(inserts)
+    result.updated += len(updates)
+    if mode == "upsert":
+        result.unchanged += len(batch) - len(inserts) - len(updates)
+
+
+def import_addresses(
+    db: Session,
+    file: BinaryIO,
+    mode: str = "append",
+    on_progress: Callable[[ImportResult], None] | None = None,
+) -> ImportResult:
+    if mode not in IMPORT_MODES:
+        raise AddressImportError("Ukendt importtype")
+    result = ImportResult()
+    batch: list[tuple[int, dict[str, object]]] = []
+
+    def flush_batch() -> None:
+        if not batch:
+            return
+        write_batch(db.connection(), batch, mode, update_fields, result)
+        db.commit()
+        batch.clear()
+        if on_progress:
+            on_progress(result)
+
+    try:
+        reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+        if not reader.fieldnames or not set(REQUIRED_FIELDS).issubset(reader.fieldnames):
+            raise AddressImportError("CSV skal indeholde street, house_no, zip, city")
+        update_fields = [name for name in OPTIONAL_FIELDS if name in reader.fieldnames]
+        for row in reader:
+            result.processed += 1
+            values, error = parse_row(row)
+            if error:
+                result.add_error(reader.line_num, error)
+                continue
+            batch.append((reader.line_num, values))
+            if len(batch) >= BATCH_SIZE:
+                flush_batch()
+    except UnicodeDecodeError:
+        raise AddressImportError(
+            f"CSV-filen kunne ikke læses efter {result.created} importerede adresser"
+        )
+    except csv.Error as exc:
+        raise AddressImportError(f"CSV-filen er ugyldig: {exc}")
+    flush_batch()
+    return result
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+import fcntl
+import json
+import os
+from pathlib import Path
+import shutil
+import time
+from typing import BinaryIO
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+
+# Kept outside data/uploads so half-finished files are never served.
+CHUNK_DIR = Path("data") / "chunks"
+CHUNK_DIR.mkdir(parents=True, exist_ok=True)
+
+MAX_UPLOAD_BYTES = int(os.environ.get("PHOTO_MAX_MB", "25")) * 1024 * 1024
+MAX_CHUNK_BYTES = 4 * 1024 * 1024
+RETENTION = timedelta(hours=24)
+DATA_FILENAME = "data.part"
+META_FILENAME = "meta.json"
+
+
+class ChunkedUploadError(ValueError):
+    pass
+
+
+class OffsetMismatch(ChunkedUploadError):
+    def __init__(self, offset: int) -> None:
+        super().__init__("Uventet offset")
+        self.offset = offset
+
+
+@dataclass
+class UploadSession:
+    id: str
+    user_id: int
+    appointment_id: int
+    filename: str
+    content_type: str
+    size: int
+
+    @property
+    def directory(self) -> Path:
+        return CHUNK_DIR / self.id
+
+    @property
+    def data_path(self) -> Path:
+        return self.directory / DATA_FILENAME
+
+    @property
+    def offset(self) -> int:
+        try:
+            return self.data_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.size
+
+
+def create_upload(
+    user_id: int, appointment_id: int, filename: str, content_type: str, size: int
+) -> UploadSession:
+    if not content_type.startswith("image/"):
+        raise ChunkedUploadError("Kun billedfiler er tilladt")
+    if size <= 0 or size > MAX_UPLOAD_BYTES:
+        raise ChunkedUploadError("Filen er for stor")
+    prune_uploads()
+    session = UploadSession(
+        id=uuid4().hex,
+        user_id=user_id,
+        appointment_id=appointment_id,
+        filename=Path(filename).name,
+        content_type=content_type,
+        size=size,
+    )
+    session.directory.mkdir(parents=True)
+    session.data_path.touch()
+    (session.directory / META_FILENAME).write_text(json.dumps(asdict(session)))
+    return session
+
+
+def get_upload(upload_id: str, user_id: int, appointment_id: int) -> UploadSession | None:
+    if not upload_id.isalnum():
+        return None
+    try:
+        meta = json.loads((CHUNK_DIR / upload_id / META_FILENAME).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    session = UploadSession(**meta)
+    if session.user_id != user_id or session.appointment_id != appointment_id:
+        return None
+    return session
+
+
+def _open_for_append(session: UploadSession, offset: int) -> BinaryIO:
+    # The lock is per file and shared across worker processes. A request that
+    # finds it taken, e.g. a client retry while the first PUT is still
+    # streaming, is answered with the current offset instead of waiting.
+    buffer = session.data_path.open("ab")
+    try:
+        fcntl.flock(buffer.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        current = os.fstat(buffer.fileno()).st_size
+        buffer.close()
+        raise OffsetMismatch(current) from None
+    current = os.fstat(buffer.fileno()).st_size
+    if offset != current:
+        buffer.close()
+        raise OffsetMismatch(current)
+    return buffer
+
+
+async def append_chunk(session: UploadSession, offset: int, body: AsyncIterator[bytes]) -> int:
+    # The client sends the offset it believes the server has; a mismatch means a
+    # chunk was lost or repeated, and the client resumes from the real offset.
+    buffer = await run_in_threadpool(_open_for_append, session, offset)
+    written = 0
+    try:
+        async for chunk in body:
+            written += len(chunk)
+            if written > MAX_CHUNK_BYTES or offset + written > session.size:
+                await run_in_threadpool(buffer.truncate, offset)
+                raise ChunkedUploadError("Filen er større end angivet")
+            await run_in_threadpool(buffer.write, chunk)
+    finally:
+        # Closing the file also releases the lock.
+        await run_in_threadpool(buffer.close)
+    return offset + written
+
+
+def discard(session: UploadSession) -> None:
+    shutil.rmtree(session.directory, ignore_errors=True)
+
+
+def prune_uploads() -> None:
+    cutoff = time.time() - RETENTION.total_seconds()
+    for entry in os.scandir(CHUNK_DIR):
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            continue
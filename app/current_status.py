@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+from app.planning import CHUNK_SIZE, HISTORY_STATUSES
+
+
+def _refresh_chunk(connection: Connection, address_ids: list[int]) -> None:
+    address_table = models.Address.__table__
+    appointment_table = models.Appointment.__table__
+    photo_table = models.AppointmentPhoto.__table__
+    response_table = models.ResidentResponse.__table__
+    status_table = models.AddressCurrentStatus.__table__
+
+    existing_ids = connection.execute(
+        select(address_table.c.id).where(address_table.c.id.in_(address_ids))
+    ).scalars().all()
+
+    latest: dict[int, tuple[int, models.AppointmentStatus, datetime]] = {}
+    appointments = connection.execute(
+        select(
+            appointment_table.c.id,
+            appointment_table.c.address_id,
+            appointment_table.c.status,
+            appointment_table.c.starts_at,
+        )
+        .where(
+            appointment_table.c.address_id.in_(address_ids),
+            appointment_table.c.status.in_(HISTORY_STATUSES),
+        )
+        .order_by(appointment_table.c.starts_at.desc(), appointment_table.c.id.desc())
+    ).all()
+    not_home_counts: dict[int, int] = {}
+    for appointment in appointments:
+        latest.setdefault(
+            appointment.address_id,
+            (appointment.id, appointment.status, appointment.starts_at),
+        )
+        if appointment.status == models.AppointmentStatus.NOT_HOME:
+            not_home_counts[appointment.address_id] = (
+                not_home_counts.get(appointment.address_id, 0) + 1
+            )
+
+    photo_counts = dict(
+        connection.execute(
+            select(photo_table.c.address_id, func.count(photo_table.c.id))
+            .where(photo_table.c.address_id.in_(address_ids))
+            .group_by(photo_table.c.address_id)
+        ).all()
+    )
+
+    responses: dict[int, tuple[str, datetime]] = {}
+    for row in connection.execute(
+        select(
+            response_table.c.address_id,
+            response_table.c.response_type,
+            response_table.c.created_at,
+        )
+        .where(response_table.c.address_id.in_(address_ids))
+        .order_by(response_table.c.created_at.desc(), response_table.c.id.desc())
+    ).all():
+        responses.setdefault(row.address_id, (row.response_type, row.created_at))
+
+    now = datetime.utcnow()
+    entries = []
+    for address_id in existing_ids:
+        appointment_id, status, starts_at = latest.get(address_id, (None, None, None))
+        response_type, response_at = responses.get(address_id, (None, None))
+        entries.append(
+            {
+                "address_id": address_id,
+                "appointment_id": appointment_id,
+                "status": status,
+                "starts_at": starts_at,
+                "not_home_count": not_home_counts.get(address_id, 0),
+                "photo_count": photo_counts.get(address_id, 0),
+                "response_type": response_type,
+                "response_at": response_at,
+                "updated_at": now,
+            }
+        )
+
+    connection.execute(
+        delete(status_table).where(status_table.c.address_id.in_(address_ids))
+    )
+    if entries:
+        connection.execute(insert(status_table), entries)
+
+
+def refresh_addresses(connection: Connection, address_ids: Iterable[int | None]) -> None:
+    ids = sorted({address_id for address_id in address_ids if address_id is not None})
+    for start in range(0, len(ids), CHUNK_SIZE):
+        _refresh_chunk(connection, ids[start : start + CHUNK_SIZE])
+
+
+def rebuild_current_status(connection: Connection) -> None:
+    connection.execute(delete(models.AddressCurrentStatus.__table__))
+    address_ids = connection.execute(select(models.Address.__table__.c.id)).scalars().all()
+    refresh_addresses(connection, address_ids)
+
+
+def ensure_current_status(db: Session) -> None:
+    address_count = db.query(func.count(models.Address.id)).scalar() or 0
+    status_count = db.query(func.count(models.AddressCurrentStatus.address_id)).scalar() or 0
+    if address_count != status_count:
+        rebuild_current_status(db.connection())
+        db.commit()
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def track_status_changes(session: Session, flush_context) -> None:
+    address_ids: set[int | None] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, models.Address):
+            if obj in session.new or obj in session.deleted:
+                address_ids.add(obj.id)
+        elif isinstance(
+            obj, (models.Appointment, models.AppointmentPhoto, models.ResidentResponse)
+        ):
+            address_ids.add(obj.address_id)
+            address_ids.update(inspect(obj).attrs.address_id.history.deleted)
+    if address_ids:
+        refresh_addresses(session.connection(), address_ids)
+
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_
+from sqlalchemy.sql.elements import ColumnElement
+
+
+def day_bounds(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def on_day(column, day: date) -> ColumnElement:
+    # A half-open range on the raw column can use its index; wrapping the
+    # column in date() cannot.
+    start, end = day_bounds(day)
+    return and_(column >= start, column < end)
@@ -1,21 +1,58 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
+import threading
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data" / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
-DATABASE_URL = f"sqlite:///{DATA_DIR / 'app.db'}"
+DATABASE_URL = os.environ.get("DATABASE_URL") or f"sqlite:///{DATA_DIR / 'app.db'}"
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    future=True,
-)
+# Pragmas applied to every new SQLite connection. "production" uses WAL so
+# readers never block the writer and commits only fsync at checkpoints;
+# "safe" keeps SQLite's defaults apart from the busy timeout.
+SQLITE_PROFILES: dict[str, dict[str, str | int]] = {
+    "production": {
+        "journal_mode": "WAL",
+        "busy_timeout": 10000,
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "safe": {
+        "journal_mode": "DELETE",
+        "busy_timeout": 10000,
+        "synchronous": "FULL",
+    },
+}
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "production")
+SQLITE_MAINTENANCE_MINUTES = int(os.environ.get("SQLITE_MAINTENANCE_MINUTES", "30"))
+
+
+def engine_options(url: str) -> dict[str, object]:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}}
+    # Server databases share a pool per app instance; pre-ping drops
+    # connections the server or a proxy closed, recycle keeps them fresh.
+    return {
+        "poolclass": QueuePool,
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+
+engine = create_engine(DATABASE_URL, future=True, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 
@@ -23,6 +60,69 @@ class Base(DeclarativeBase):
     pass
 
 
+def sqlite_pragmas() -> dict[str, str | int]:
+    if SQLITE_PROFILE not in SQLITE_PROFILES:
+        raise RuntimeError(f"Unknown SQLITE_PROFILE {SQLITE_PROFILE!r}")
+    pragmas = dict(SQLITE_PROFILES[SQLITE_PROFILE])
+    # SQLITE_PRAGMAS="cache_size=-32768,mmap_size=0" overrides single values.
+    for item in os.environ.get("SQLITE_PRAGMAS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
+@event.listens_for(engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def run_maintenance() -> None:
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            connection.exec_driver_sql("PRAGMA optimize")
+    except OperationalError:
+        # A busy database skips this round; the next one catches up.
+        pass
+
+
+_maintenance_stop = threading.Event()
+_maintenance_thread: threading.Thread | None = None
+
+
+def _maintenance_loop() -> None:
+    while not _maintenance_stop.wait(SQLITE_MAINTENANCE_MINUTES * 60):
+        run_maintenance()
+
+
+def start_maintenance() -> None:
+    global _maintenance_thread
+    if SQLITE_MAINTENANCE_MINUTES <= 0 or _maintenance_thread is not None:
+        return
+    _maintenance_stop.clear()
+    _maintenance_thread = threading.Thread(
+        target=_maintenance_loop, name="sqlite-maintenance", daemon=True
+    )
+    _maintenance_thread.start()
+
+
+def stop_maintenance() -> None:
+    global _maintenance_thread
+    _maintenance_stop.set()
+    if _maintenance_thread is not None:
+        _maintenance_thread.join(timeout=5)
+        _maintenance_thread = None
+    run_maintenance()
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -32,10 +132,12 @@ def get_db():
 
 
 def init_db() -> None:
-    from app import models
+    from app import current_status, models, planning, search, stock
     from app.auth import hash_password
 
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        search.ensure_search_index(connection)
     with SessionLocal() as db:
         if not db.query(models.User).first():
             admin = models.User(
@@ -45,3 +147,6 @@ def init_db() -> None:
             )
             db.add(admin)
             db.commit()
+        planning.ensure_planning_queue(db)
+        current_status.ensure_current_status(db)
+        stock.reconcile_stock(db)
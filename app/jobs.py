@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import json
+import os
+from pathlib import Path
+import shutil
+import socket
+import threading
+import time
+import traceback
+from typing import Any, BinaryIO
+from uuid import uuid4
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal, engine
+
+# Uploaded inputs and artifacts live on the local disk. Every process that
+# enqueues, runs or serves jobs must therefore share one data/ directory, i.e.
+# run on one host or mount the same volume.
+JOB_DIR = Path("data") / "jobs"
+JOB_DIR.mkdir(parents=True, exist_ok=True)
+
+WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+POLL_SECONDS = 2.0
+PROGRESS_INTERVAL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 30.0
+# A running job whose owner has not reported for this long is treated as lost.
+STALE_AFTER = timedelta(seconds=HEARTBEAT_SECONDS * 5)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+RETENTION = timedelta(days=7)
+COPY_CHUNK_SIZE = 1024 * 1024
+ARTIFACT_FILENAME = "artifact"
+
+JOB_LABELS = {
+    "import_addresses": "Adresseimport",
+    "import_completed": "Import af afsluttede sager",
+    "export_completed": "Eksport af afsluttede sager",
+    "batch_pdf": "Batch PDF",
+}
+
+
+class JobError(Exception):
+    """Fails a job with a message that is shown to the user."""
+
+
+@dataclass
+class JobContext:
+    job_id: str
+    kind: str
+    params: dict[str, Any]
+    user_id: int | None
+    templates: Any
+    message: str | None = None
+    artifact_name: str | None = None
+    _last_progress: float = field(default=0.0, repr=False)
+
+    @property
+    def directory(self) -> Path:
+        return job_dir(self.job_id)
+
+    @property
+    def artifact_path(self) -> Path:
+        return self.directory / ARTIFACT_FILENAME
+
+    def progress(self, done: int, total: int | None = None, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_progress = now
+        values: dict[str, Any] = {"progress": done, "heartbeat_at": datetime.utcnow()}
+        if total is not None:
+            values["total"] = total
+        with engine.begin() as connection:
+            connection.execute(
+                update(models.Job.__table__)
+                .where(models.Job.__table__.c.id == self.job_id)
+                .values(**values)
+            )
+
+
+Handler = Callable[[JobContext, Session], None]
+
+_handlers: dict[str, Handler] = {}
+_threads: list[threading.Thread] = []
+_wake = threading.Event()
+_stop = threading.Event()
+_templates: Any = None
+
+
+def register(kind: str) -> Callable[[Handler], Handler]:
+    def decorator(handler: Handler) -> Handler:
+        _handlers[kind] = handler
+        return handler
+
+    return decorator
+
+
+def job_dir(job_id: str) -> Path:
+    return JOB_DIR / job_id
+
+
+def artifact_path(job: models.Job) -> Path:
+    return job_dir(job.id) / ARTIFACT_FILENAME
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    user: models.User,
+    params: dict[str, Any] | None = None,
+    files: dict[str, BinaryIO] | None = None,
+) -> models.Job:
+    prune_jobs(db)
+    job = models.Job(
+        id=uuid4().hex,
+        kind=kind,
+        status=models.JobStatus.QUEUED,
+        params=json.dumps(params or {}),
+        created_by_user_id=user.id,
+    )
+    directory = job_dir(job.id)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, source in (files or {}).items():
+        source.seek(0)
+        with (directory / name).open("wb") as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+    db.add(job)
+    db.commit()
+    _wake.set()
+    return job
+
+
+def prune_jobs(db: Session) -> None:
+    cutoff = datetime.utcnow() - RETENTION
+    expired = (
+        db.query(models.Job)
+        .filter(
+            models.Job.status.in_([models.JobStatus.DONE, models.JobStatus.FAILED]),
+            models.Job.created_at < cutoff,
+        )
+        .all()
+    )
+    for job in expired:
+        shutil.rmtree(job_dir(job.id), ignore_errors=True)
+        db.delete(job)
+    if expired:
+        db.commit()
+
+
+def claim_next() -> str | None:
+    table = models.Job.__table__
+    with engine.begin() as connection:
+        job_id = connection.execute(
+            select(table.c.id)
+            .where(table.c.status == models.JobStatus.QUEUED)
+            .order_by(table.c.created_at)
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+        claimed = connection.execute(
+            update(table)
+            .where(table.c.id == job_id, table.c.status == models.JobStatus.QUEUED)
+            .values(
+                status=models.JobStatus.RUNNING,
+                started_at=datetime.utcnow(),
+                worker_id=WORKER_ID,
+                heartbeat_at=datetime.utcnow(),
+            )
+        )
+        return job_id if claimed.rowcount == 1 else None
+
+
+def finish(job_id: str, status: models.JobStatus, **values: Any) -> None:
+    table = models.Job.__table__
+    with engine.begin() as connection:
+        connection.execute(
+            update(table)
+            .where(table.c.id == job_id)
+            .values(status=status, finished_at=datetime.utcnow(), **values)
+        )
+
+
+def run_job(job_id: str) -> None:
+    with SessionLocal() as db:
+        job = db.get(models.Job, job_id)
+        context = JobContext(
+            job_id=job.id,
+            kind=job.kind,
+            params=json.loads(job.params or "{}"),
+            user_id=job.created_by_user_id,
+            templates=_templates,
+        )
+        handler = _handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise JobError("Ukendt jobtype")
+            handler(context, db)
+        except JobError as exc:
+            db.rollback()
+            finish(job_id, models.JobStatus.FAILED, message=str(exc))
+            return
+        except Exception:
+            db.rollback()
+            traceback.print_exc()
+            finish(job_id, models.JobStatus.FAILED, message="Der opstod en uventet fejl")
+            return
+    values: dict[str, Any] = {"message": context.message}
+    if context.artifact_name and context.artifact_path.exists():
+        values["artifact_name"] = context.artifact_name
+    finish(job_id, models.JobStatus.DONE, **values)
+
+
+def send_heartbeat() -> None:
+    table = models.Job.__table__
+    with engine.begin() as connection:
+        connection.execute(
+            update(table)
+            .where(table.c.status == models.JobStatus.RUNNING, table.c.worker_id == WORKER_ID)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+
+
+def fail_stale_jobs() -> None:
+    # Only jobs whose owning process stopped sending heartbeats are failed;
+    # jobs running in other live workers or instances keep theirs fresh.
+    table = models.Job.__table__
+    cutoff = datetime.utcnow() - STALE_AFTER
+    with engine.begin() as connection:
+        connection.execute(
+            update(table)
+            .where(
+                table.c.status == models.JobStatus.RUNNING,
+                func.coalesce(table.c.heartbeat_at, table.c.started_at) < cutoff,
+            )
+            .values(
+                status=models.JobStatus.FAILED,
+                message="Afbrudt ved genstart",
+                finished_at=datetime.utcnow(),
+            )
+        )
+
+
+def heartbeat() -> None:
+    while not _stop.wait(HEARTBEAT_SECONDS):
+        send_heartbeat()
+        fail_stale_jobs()
+
+
+def worker() -> None:
+    while not _stop.is_set():
+        job_id = claim_next()
+        if job_id is not None:
+            run_job(job_id)
+            continue
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+
+
+def start(templates: Any) -> None:
+    global _templates
+    _templates = templates
+    # Jobs that were running when their process stopped cannot be resumed.
+    fail_stale_jobs()
+    _stop.clear()
+    for _ in range(WORKERS):
+        thread = threading.Thread(target=worker, name="job-worker", daemon=True)
+        thread.start()
+        _threads.append(thread)
+    thread = threading.Thread(target=heartbeat, name="job-heartbeat", daemon=True)
+    thread.start()
+    _threads.append(thread)
+
+
+def stop() -> None:
+    _stop.set()
+    _wake.set()
+    for thread in _threads:
+        thread.join(timeout=5)
+    _threads.clear()
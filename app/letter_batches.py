@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import io
+import multiprocessing
+import os
+from pathlib import Path
+import threading
+
+from pypdf import PdfWriter
+from sqlalchemy.orm import Session
+from weasyprint import HTML
+
+from app import models
+from app.file_cache import FileCache, content_key
+
+CHUNK_SIZE = int(os.environ.get("LETTER_CHUNK_SIZE", "25"))
+WORKERS = int(os.environ.get("LETTER_WORKERS", "0")) or os.cpu_count() or 1
+
+# Rendered PDFs are keyed by the SHA-256 of their HTML, which already covers the
+# template body, logo, address, appointment window and resident link token.
+pdf_cache = FileCache(
+    Path("data") / "cache" / "letters",
+    int(os.environ.get("LETTER_CACHE_MB", "512")) * 1024 * 1024,
+)
+
+
+_lock = threading.Lock()
+_executor: ProcessPoolExecutor | None = None
+
+
+def render_pdf(html: str) -> bytes:
+    base_url = str(Path(".").resolve())
+    pdf_bytes = HTML(string=html, base_url=base_url).write_pdf()
+    return pdf_bytes if pdf_bytes is not None else b""
+
+
+def cached_pdf(html: str) -> bytes:
+    key = content_key(html)
+    pdf_bytes = pdf_cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = render_pdf(html)
+        pdf_cache.put(key, pdf_bytes)
+    return pdf_bytes
+
+
+def merge_pdfs(parts: Sequence[bytes], target: Path) -> None:
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(io.BytesIO(part))
+    temp_path = target.with_suffix(".tmp")
+    with temp_path.open("wb") as buffer:
+        writer.write(buffer)
+    temp_path.replace(target)
+
+
+def chunked(items: Sequence, size: int = CHUNK_SIZE) -> list[Sequence]:
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Forking the server would copy its threads and open database
+            # connections into the workers; forkserver starts them clean.
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def mark_informed(db: Session, appointment_ids: Sequence[int], user_id: int | None) -> None:
+    appointments = (
+        db.query(models.Appointment)
+        .filter(
+            models.Appointment.id.in_(appointment_ids),
+            models.Appointment.status == models.AppointmentStatus.SCHEDULED,
+        )
+        .all()
+    )
+    for appointment in appointments:
+        appointment.status = models.AppointmentStatus.INFORMED
+        appointment.changed_date = datetime.utcnow()
+        appointment.changed_by_user_id = user_id
+    if appointments:
+        db.commit()
+
+
+def render_batch(
+    html_chunks: Sequence[str],
+    chunk_sizes: Sequence[int],
+    target: Path,
+    on_progress: Callable[[int], None] | None = None,
+) -> None:
+    keys = [content_key(html) for html in html_chunks]
+    parts: list[bytes | None] = [pdf_cache.get(key) for key in keys]
+    done = sum(size for part, size in zip(parts, chunk_sizes) if part is not None)
+    futures = {
+        executor().submit(render_pdf, html_chunks[index]): index
+        for index, part in enumerate(parts)
+        if part is None
+    }
+    for future in as_completed(futures):
+        index = futures[future]
+        parts[index] = future.result()
+        pdf_cache.put(keys[index], parts[index])
+        done += chunk_sizes[index]
+        if on_progress:
+            on_progress(done)
+    merge_pdfs(parts, target)
@@ -8,10 +8,10 @@ from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import RedirectResponse
 
-from app import models
-from app.db import SessionLocal, init_db
+from app import jobs, letter_batches, models, photos
+from app.db import SessionLocal, init_db, start_maintenance, stop_maintenance
 from app.dependencies import consume_flashes, get_optional_user
-from app.routes import admin_addresses, admin_appointments, admin_availability, admin_completed_import, admin_inventory, admin_letters, admin_missing_photos, admin_planning, admin_status, admin_street_priority, admin_users, auth, resident, user_dashboard, vvs_availability, vvs_tasks
+from app.routes import admin_addresses, admin_appointments, admin_availability, admin_completed_import, admin_inventory, admin_letters, admin_missing_photos, admin_planning, admin_status, admin_street_priority, admin_users, auth, jobs as job_routes, resident, user_dashboard, vvs_availability, vvs_tasks
 
 app = FastAPI()
 
@@ -34,7 +34,18 @@ def startup() -> None:
 
     templates = Jinja2Templates(directory="app/templates")
     templates.env.globals["year"] = datetime.utcnow().year
+    templates.env.globals["photo_url"] = photos.photo_url
     app.state.templates = templates
+    start_maintenance()
+    jobs.start(templates)
+
+
+@app.on_event("shutdown")
+def shutdown() -> None:
+    jobs.stop()
+    letter_batches.shutdown()
+    photos.shutdown()
+    stop_maintenance()
 
 
 app.include_router(auth.router)
@@ -49,6 +60,7 @@ app.include_router(admin_letters.router)
 app.include_router(admin_missing_photos.router)
 app.include_router(admin_status.router)
 app.include_router(admin_street_priority.router)
+app.include_router(job_routes.router)
 app.include_router(user_dashboard.router)
 app.include_router(resident.router)
 app.include_router(vvs_tasks.router)
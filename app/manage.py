@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable
+import logging
+
+from app import current_status, photo_store, photos, planning, stock
+from app.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+COMMANDS: dict[str, Callable[[], None]] = {}
+
+
+def command(name: str) -> Callable[[Callable[[], None]], Callable[[], None]]:
+    def decorator(func: Callable[[], None]) -> Callable[[], None]:
+        COMMANDS[name] = func
+        return func
+
+    return decorator
+
+
+@command("rebuild-status")
+def rebuild_status() -> None:
+    with SessionLocal() as db:
+        current_status.rebuild_current_status(db.connection())
+        planning.rebuild_planning_queue(db.connection())
+        db.commit()
+    logger.info("Status og planlægningskø genopbygget")
+
+
+@command("renditions")
+def generate_renditions() -> None:
+    pending = photos.missing_renditions()
+    try:
+        photos.generate_all_renditions(pending)
+    finally:
+        photos.shutdown()
+    logger.info("Billedstørrelser genereret for %d fotos", len(pending))
+
+
+@command("photo-store")
+def tidy_photo_store() -> None:
+    with SessionLocal() as db:
+        migrated = photo_store.migrate_legacy_photos(db)
+        removed = photo_store.collect_garbage(db)
+    try:
+        photos.generate_all_renditions(migrated)
+    finally:
+        photos.shutdown()
+    logger.info(
+        "%d fotos flyttet til blob-lageret, %d ubrugte blobs slettet", len(migrated), removed
+    )
+
+
+@command("reconcile-stock")
+def reconcile_stock() -> None:
+    with SessionLocal() as db:
+        balance, ledger = stock.reconcile_stock(db)
+    if balance == ledger:
+        logger.info("Lagersaldo stemmer: %d", ledger)
+    else:
+        logger.warning("Lagersaldo rettet fra %s til %d", balance, ledger)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    COMMANDS[args.command]()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,48 @@
 from __future__ import annotations
 
 import enum
+import re
 from datetime import date, datetime, time
 
-from sqlalchemy import Boolean, Date, DateTime, Enum, ForeignKey, Integer, String, Text, Time
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import (
+    Boolean,
+    Date,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    Time,
+)
+from sqlalchemy.orm import Mapped, mapped_column, validates
 
 from app.db import Base
 
+HOUSE_NO_PATTERN = re.compile(r"(\d+)\s*(.*)")
+NO_HOUSE_NUMBER = 999999
+
+
+def normalize_street(street: str | None) -> str:
+    return (street or "").lower()
+
+
+def house_number_key(house_no: str | None) -> tuple[int, str]:
+    value = (house_no or "").strip()
+    match = HOUSE_NO_PATTERN.match(value)
+    if match:
+        return int(match.group(1)), match.group(2).strip().lower()
+    return NO_HOUSE_NUMBER, value.lower()
+
+
+def normalize_address(
+    street: str | None, house_no: str | None, zip_code: str | None, city: str | None
+) -> str:
+    return "|".join(
+        " ".join((part or "").split()).lower() for part in (street, house_no, zip_code, city)
+    )
+
 
 class UserRole(str, enum.Enum):
     ADMIN = "admin"
@@ -41,11 +76,52 @@ class Address(Base):
     blocked_reason: Mapped[str | None] = mapped_column(String(255), nullable=True)
     old_meter_no: Mapped[str | None] = mapped_column(String(120), nullable=True)
     new_meter_no: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    street_key: Mapped[str] = mapped_column(String(200), nullable=False, default="")
+    house_number: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=NO_HOUSE_NUMBER
+    )
+    house_suffix: Mapped[str] = mapped_column(String(50), nullable=False, default="")
+    # Normalised street|house_no|zip|city; NULL only for legacy duplicates.
+    address_key: Mapped[str | None] = mapped_column(String(400), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    __table_args__ = (
+        Index("ix_addresses_sort_key", "street_key", "house_number", "house_suffix", "id"),
+        Index("ux_addresses_address_key", "address_key", unique=True),
+    )
+
+    @validates("street")
+    def _set_street_key(self, key: str, value: str) -> str:
+        self.street_key = normalize_street(value)
+        self._set_address_key(street=value)
+        return value
+
+    @validates("house_no")
+    def _set_house_number(self, key: str, value: str) -> str:
+        self.house_number, self.house_suffix = house_number_key(value)
+        self._set_address_key(house_no=value)
+        return value
+
+    @validates("zip")
+    def _set_zip(self, key: str, value: str) -> str:
+        self._set_address_key(zip=value)
+        return value
+
+    @validates("city")
+    def _set_city(self, key: str, value: str) -> str:
+        self._set_address_key(city=value)
+        return value
+
+    def _set_address_key(self, **changed: str) -> None:
+        values = {name: getattr(self, name) for name in ("street", "house_no", "zip", "city")}
+        values.update(changed)
+        self.address_key = normalize_address(
+            values["street"], values["house_no"], values["zip"], values["city"]
+        )
+
 
 class AddressUnavailablePeriod(Base):
     __tablename__ = "address_unavailable_periods"
@@ -59,6 +135,10 @@ class AddressUnavailablePeriod(Base):
     note: Mapped[str | None] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_address_unavailable_periods_starts_at_ends_at", "starts_at", "ends_at"),
+    )
+
 
 class InventoryMovementType(str, enum.Enum):
     PURCHASE = "purchase"
@@ -99,6 +179,17 @@ class StockMovement(Base):
     note: Mapped[str | None] = mapped_column(String(255), nullable=True)
 
 
+# Running sum of stock_movements.quantity, kept in a single row by app.stock.
+class StockBalance(Base):
+    __tablename__ = "stock_balance"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+
 class VvsAvailability(Base):
     __tablename__ = "vvs_availability"
 
@@ -113,6 +204,8 @@ class VvsAvailability(Base):
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    __table_args__ = (Index("ix_vvs_availability_date_user_id", "date", "user_id"),)
+
 
 class AppointmentStatus(str, enum.Enum):
     DRAFT = "draft"
@@ -132,6 +225,8 @@ class Appointment(Base):
     contractor_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
     starts_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     ends_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Calendar day of starts_at, kept for grouping and DISTINCT by day.
+    plan_date: Mapped[date | None] = mapped_column(Date, nullable=True)
     status: Mapped[AppointmentStatus] = mapped_column(
         Enum(AppointmentStatus, native_enum=False, create_constraint=False),
         default=AppointmentStatus.DRAFT,
@@ -149,18 +244,42 @@ class Appointment(Base):
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    __table_args__ = (
+        Index("ix_appointments_address_id_starts_at", "address_id", "starts_at"),
+        Index(
+            "ix_appointments_contractor_id_status_starts_at",
+            "contractor_id",
+            "status",
+            "starts_at",
+        ),
+        Index("ix_appointments_starts_at", "starts_at"),
+        Index("ix_appointments_plan_date_status", "plan_date", "status"),
+    )
+
+    @validates("starts_at")
+    def _set_plan_date(self, key: str, value: datetime) -> datetime:
+        self.plan_date = value.date() if value is not None else None
+        return value
+
 
 class StreetPriority(Base):
     __tablename__ = "street_priorities"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     street: Mapped[str] = mapped_column(String(200), unique=True, nullable=False)
+    # Lowered in Python like Address.street_key; SQL lower() only folds ASCII.
+    street_key: Mapped[str] = mapped_column(String(200), nullable=False, index=True)
     priority: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    @validates("street")
+    def _set_street_key(self, key: str, value: str) -> str:
+        self.street_key = normalize_street(value)
+        return value
+
 
 class AppointmentPhoto(Base):
     __tablename__ = "appointment_photos"
@@ -173,12 +292,31 @@ class AppointmentPhoto(Base):
         Integer, ForeignKey("addresses.id"), nullable=False
     )
     file_path: Mapped[str] = mapped_column(String(255), nullable=False)
+    blob_sha256: Mapped[str | None] = mapped_column(
+        String(64), ForeignKey("photo_blobs.sha256"), nullable=True
+    )
     photo_type: Mapped[str] = mapped_column(String(20), nullable=False, default="both")
     uploaded_by_user_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("users.id"), nullable=True
     )
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_appointment_photos_appointment_id", "appointment_id"),
+        Index("ix_appointment_photos_address_id", "address_id"),
+        Index("ix_appointment_photos_blob_sha256", "blob_sha256"),
+    )
+
+
+class PhotoBlob(Base):
+    __tablename__ = "photo_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    file_path: Mapped[str] = mapped_column(String(255), nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 
 class LetterTemplate(Base):
     __tablename__ = "letter_templates"
@@ -213,3 +351,105 @@ class ResidentResponse(Base):
     phone: Mapped[str | None] = mapped_column(String(50), nullable=True)
     email: Mapped[str | None] = mapped_column(String(200), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_resident_responses_address_id_created_at", "address_id", "created_at"),
+    )
+
+
+class PlanningQueueEntry(Base):
+    __tablename__ = "planning_queue"
+
+    address_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("addresses.id"), primary_key=True
+    )
+    street_key: Mapped[str] = mapped_column(String(200), nullable=False)
+    house_number: Mapped[int] = mapped_column(Integer, nullable=False)
+    house_suffix: Mapped[str] = mapped_column(String(50), nullable=False, default="")
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    plannable: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    reschedule: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    blocked: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    buffer: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+
+Index(
+    "ix_planning_queue_order",
+    PlanningQueueEntry.plannable,
+    PlanningQueueEntry.blocked,
+    PlanningQueueEntry.reschedule.desc(),
+    PlanningQueueEntry.priority.desc(),
+    PlanningQueueEntry.street_key,
+    PlanningQueueEntry.house_number,
+    PlanningQueueEntry.house_suffix,
+)
+Index("ix_planning_queue_street_key", PlanningQueueEntry.street_key)
+Index(
+    "ix_planning_queue_sort_key",
+    PlanningQueueEntry.priority.desc(),
+    PlanningQueueEntry.street_key,
+    PlanningQueueEntry.house_number,
+    PlanningQueueEntry.house_suffix,
+    PlanningQueueEntry.address_id,
+)
+
+
+class AddressCurrentStatus(Base):
+    __tablename__ = "address_current_status"
+
+    address_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("addresses.id"), primary_key=True
+    )
+    appointment_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("appointments.id"), nullable=True
+    )
+    status: Mapped[AppointmentStatus | None] = mapped_column(
+        Enum(AppointmentStatus, native_enum=False, create_constraint=False),
+        nullable=True,
+        index=True,
+    )
+    starts_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    not_home_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    photo_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    response_type: Mapped[str | None] = mapped_column(String(40), nullable=True)
+    response_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(40), nullable=False)
+    status: Mapped[JobStatus] = mapped_column(
+        Enum(JobStatus, native_enum=False, create_constraint=False),
+        default=JobStatus.QUEUED,
+        nullable=False,
+    )
+    params: Mapped[str] = mapped_column(Text, nullable=False, default="{}")
+    progress: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    artifact_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    created_by_user_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    worker_id: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_jobs_status_created_at", "status", "created_at"),)
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import base64
+import json
+
+
+# Keyset cursors are the sort key of the last row on a page, as base64 JSON.
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(raw: str | None, length: int) -> list | None:
+    if not raw:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(raw.encode("ascii")))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Callable
+import hashlib
+from itertools import chain
+import os
+from pathlib import Path
+import shutil
+from typing import BinaryIO
+from uuid import uuid4
+import zipfile
+
+from sqlalchemy import bindparam, event, inspect, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+from app.photos import RENDITIONS, UPLOAD_DIR, rendition_path
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def extension_for(filename: str | None) -> str:
+    return Path(filename or "").suffix.lower() or ".jpg"
+
+
+def blob_file_path(sha256: str, extension: str) -> str:
+    return f"blobs/{sha256[:2]}/{sha256}{extension}"
+
+
+def hash_stream(source: BinaryIO) -> tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := source.read(COPY_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _store(
+    db: Session, sha256: str, size: int, extension: str, write: Callable[[Path], None]
+) -> models.PhotoBlob:
+    # Known content is not written again; the caller only adds a reference.
+    blob = db.get(models.PhotoBlob, sha256)
+    if blob is not None and (UPLOAD_DIR / blob.file_path).is_file():
+        return blob
+
+    file_path = blob_file_path(sha256, extension) if blob is None else blob.file_path
+    target = UPLOAD_DIR / file_path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target.with_name(f"{target.name}.{uuid4().hex}.tmp")
+    write(temp_path)
+    temp_path.replace(target)
+    if blob is not None:
+        return blob
+
+    # Another request may store the same content first. Skipping the insert on
+    # conflict keeps the row in the caller's transaction, unlike a savepoint,
+    # which pysqlite cannot hold reliably.
+    table = models.PhotoBlob.__table__
+    insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    db.execute(
+        insert(table)
+        .values(sha256=sha256, file_path=file_path, size=size, ref_count=0)
+        .on_conflict_do_nothing(index_elements=[table.c.sha256])
+    )
+    return db.get(models.PhotoBlob, sha256)
+
+
+def store_stream(db: Session, source: BinaryIO, filename: str | None) -> models.PhotoBlob:
+    source.seek(0)
+    sha256, size = hash_stream(source)
+
+    def write(target: Path) -> None:
+        source.seek(0)
+        with target.open("wb") as buffer:
+            shutil.copyfileobj(source, buffer, COPY_CHUNK_SIZE)
+
+    return _store(db, sha256, size, extension_for(filename), write)
+
+
+def store_zip_member(db: Session, archive: zipfile.ZipFile, name: str) -> models.PhotoBlob:
+    with archive.open(name) as source:
+        sha256, size = hash_stream(source)
+
+    def write(target: Path) -> None:
+        with archive.open(name) as source, target.open("wb") as buffer:
+            shutil.copyfileobj(source, buffer, COPY_CHUNK_SIZE)
+
+    return _store(db, sha256, size, extension_for(name), write)
+
+
+def store_file(db: Session, path: Path, filename: str | None) -> models.PhotoBlob:
+    """Moves a file on disk into the store, or drops it if the content is known."""
+    with path.open("rb") as source:
+        sha256, size = hash_stream(source)
+    blob = _store(
+        db, sha256, size, extension_for(filename), lambda target: os.replace(path, target)
+    )
+    path.unlink(missing_ok=True)
+    return blob
+
+
+def collect_garbage(db: Session) -> int:
+    blobs = db.query(models.PhotoBlob).filter(models.PhotoBlob.ref_count <= 0).all()
+    for blob in blobs:
+        db.delete(blob)
+    db.commit()
+    for blob in blobs:
+        (UPLOAD_DIR / blob.file_path).unlink(missing_ok=True)
+        for size in RENDITIONS:
+            (UPLOAD_DIR / rendition_path(blob.file_path, size)).unlink(missing_ok=True)
+    return len(blobs)
+
+
+def migrate_legacy_photos(db: Session) -> list[str]:
+    """Moves photos saved before the blob store into it."""
+    migrated: list[str] = []
+    legacy = (
+        db.query(models.AppointmentPhoto)
+        .filter(models.AppointmentPhoto.blob_sha256.is_(None))
+        .all()
+    )
+    for photo in legacy:
+        path = UPLOAD_DIR / photo.file_path
+        if not path.is_file():
+            continue
+        old_path = photo.file_path
+        blob = store_file(db, path, old_path)
+        photo.file_path = blob.file_path
+        photo.blob_sha256 = blob.sha256
+        db.commit()
+        for size in RENDITIONS:
+            (UPLOAD_DIR / rendition_path(old_path, size)).unlink(missing_ok=True)
+        migrated.append(blob.file_path)
+    return migrated
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def track_blob_references(session: Session, flush_context) -> None:
+    deltas: Counter[str] = Counter()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, models.AppointmentPhoto):
+            continue
+        history = inspect(obj).attrs.blob_sha256.history
+        if obj in session.deleted:
+            deltas.subtract(history.deleted or history.unchanged)
+            continue
+        deltas.update(history.added)
+        deltas.subtract(history.deleted)
+    rows = [
+        {"blob_sha256": sha256, "delta": delta}
+        for sha256, delta in deltas.items()
+        if sha256 is not None and delta
+    ]
+    if rows:
+        blob_table = models.PhotoBlob.__table__
+        session.connection().execute(
+            update(blob_table)
+            .where(blob_table.c.sha256 == bindparam("blob_sha256"))
+            .values(ref_count=blob_table.c.ref_count + bindparam("delta")),
+            rows,
+        )
+
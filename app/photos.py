@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+import multiprocessing
+import os
+from pathlib import Path
+import threading
+
+from PIL import Image, ImageOps
+
+from app import models
+from app.db import SessionLocal
+
+UPLOAD_DIR = Path("data") / "uploads"
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# Longest edge in pixels. Thumbnails are shown at 140x100 in the lists, so they
+# are rendered at roughly twice that for high-density screens.
+RENDITIONS = {
+    "thumb": 320,
+    "web": 1600,
+}
+JPEG_QUALITY = 82
+WORKERS = int(os.environ.get("PHOTO_WORKERS", "2"))
+
+_lock = threading.Lock()
+_executor: ProcessPoolExecutor | None = None
+
+
+def rendition_path(file_path: str, size: str) -> str:
+    path = Path(file_path)
+    return str(path.with_name(f"{path.stem}.{size}.jpg"))
+
+
+def photo_url(file_path: str, size: str | None = None) -> str:
+    # Falls back to the original while the renditions are still being made,
+    # and for photos uploaded before the pipeline existed.
+    if size in RENDITIONS:
+        derived = rendition_path(file_path, size)
+        if (UPLOAD_DIR / derived).is_file():
+            return f"/upload/{derived}"
+    return f"/upload/{file_path}"
+
+
+def generate_renditions(file_path: str) -> list[str]:
+    source = UPLOAD_DIR / file_path
+    created: list[str] = []
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            for size, edge in RENDITIONS.items():
+                target = UPLOAD_DIR / rendition_path(file_path, size)
+                if target.exists():
+                    continue
+                rendition = image.copy()
+                rendition.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+                temp_path = target.with_suffix(".tmp")
+                rendition.save(
+                    temp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True
+                )
+                temp_path.replace(target)
+                created.append(str(target.relative_to(UPLOAD_DIR)))
+    except OSError:
+        # Missing files and anything Pillow cannot read keep only the original.
+        return created
+    return created
+
+
+def executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Forking the server would copy its threads and open database
+            # connections into the workers; forkserver starts them clean.
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def submit_renditions(file_path: str) -> Future:
+    return executor().submit(generate_renditions, file_path)
+
+
+def generate_all_renditions(file_paths: Iterable[str]) -> None:
+    futures = [submit_renditions(file_path) for file_path in file_paths]
+    if futures:
+        wait(futures)
+
+
+def missing_renditions() -> list[str]:
+    with SessionLocal() as db:
+        file_paths = [row[0] for row in db.query(models.AppointmentPhoto.file_path)]
+    return [
+        file_path
+        for file_path in file_paths
+        if any(
+            not (UPLOAD_DIR / rendition_path(file_path, size)).exists() for size in RENDITIONS
+        )
+    ]
+
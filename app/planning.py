@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import date, datetime
+from itertools import chain
+
+from sqlalchemy import and_, delete, event, func, inspect, insert, or_, select, tuple_, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app import models
+from app.dates import day_bounds
+from app.db import SessionLocal
+
+CHUNK_SIZE = 500
+
+# An address with any appointment in one of these statuses is taken out of the
+# plannable queue.
+ACTIVE_STATUSES = [
+    models.AppointmentStatus.SCHEDULED,
+    models.AppointmentStatus.INFORMED,
+    models.AppointmentStatus.COMPLETED,
+    models.AppointmentStatus.CLOSED,
+]
+
+HISTORY_STATUSES = [
+    *ACTIVE_STATUSES,
+    models.AppointmentStatus.NOT_HOME,
+    models.AppointmentStatus.NEEDS_RESCHEDULE,
+]
+
+QUEUE_ORDER = (
+    models.PlanningQueueEntry.reschedule.desc(),
+    models.PlanningQueueEntry.priority.desc(),
+    models.PlanningQueueEntry.street_key,
+    models.PlanningQueueEntry.house_number,
+    models.PlanningQueueEntry.house_suffix,
+    models.PlanningQueueEntry.address_id,
+)
+
+
+def street_priorities(connection: Connection, street_keys: set[str]) -> dict[str, int]:
+    if not street_keys:
+        return {}
+    table = models.StreetPriority.__table__
+    rows = connection.execute(
+        select(table.c.street_key, table.c.priority).where(table.c.street_key.in_(street_keys))
+    ).all()
+    return {row.street_key: row.priority for row in rows}
+
+
+def _refresh_chunk(connection: Connection, address_ids: list[int]) -> None:
+    address_table = models.Address.__table__
+    appointment_table = models.Appointment.__table__
+    queue_table = models.PlanningQueueEntry.__table__
+
+    addresses = connection.execute(
+        select(
+            address_table.c.id,
+            address_table.c.street_key,
+            address_table.c.house_number,
+            address_table.c.house_suffix,
+            address_table.c.blocked_reason,
+            address_table.c.buffer_flag,
+        ).where(address_table.c.id.in_(address_ids))
+    ).all()
+    appointments = connection.execute(
+        select(appointment_table.c.address_id, appointment_table.c.status)
+        .where(
+            appointment_table.c.address_id.in_(address_ids),
+            appointment_table.c.status.in_(HISTORY_STATUSES),
+        )
+        .order_by(appointment_table.c.starts_at.desc())
+    ).all()
+
+    latest_status: dict[int, models.AppointmentStatus] = {}
+    active_ids: set[int] = set()
+    for appointment in appointments:
+        latest_status.setdefault(appointment.address_id, appointment.status)
+        if appointment.status in ACTIVE_STATUSES:
+            active_ids.add(appointment.address_id)
+
+    priorities = street_priorities(connection, {address.street_key for address in addresses})
+    now = datetime.utcnow()
+    entries = []
+    for address in addresses:
+        entries.append(
+            {
+                "address_id": address.id,
+                "street_key": address.street_key,
+                "house_number": address.house_number,
+                "house_suffix": address.house_suffix,
+                "priority": priorities.get(address.street_key, 0),
+                "plannable": address.id not in active_ids,
+                "reschedule": latest_status.get(address.id)
+                == models.AppointmentStatus.NEEDS_RESCHEDULE,
+                "blocked": address.blocked_reason is not None,
+                "buffer": bool(address.buffer_flag),
+                "updated_at": now,
+            }
+        )
+
+    connection.execute(
+        delete(queue_table).where(queue_table.c.address_id.in_(address_ids))
+    )
+    if entries:
+        connection.execute(insert(queue_table), entries)
+
+
+def refresh_addresses(connection: Connection, address_ids: Iterable[int | None]) -> None:
+    ids = sorted({address_id for address_id in address_ids if address_id is not None})
+    for start in range(0, len(ids), CHUNK_SIZE):
+        _refresh_chunk(connection, ids[start : start + CHUNK_SIZE])
+
+
+def refresh_streets(connection: Connection, streets: Iterable[str | None]) -> None:
+    street_keys = {models.normalize_street(street) for street in streets if street}
+    priorities = street_priorities(connection, street_keys)
+    queue_table = models.PlanningQueueEntry.__table__
+    for street_key in street_keys:
+        connection.execute(
+            update(queue_table)
+            .where(queue_table.c.street_key == street_key)
+            .values(priority=priorities.get(street_key, 0))
+        )
+
+
+def rebuild_planning_queue(connection: Connection) -> None:
+    connection.execute(delete(models.PlanningQueueEntry.__table__))
+    address_ids = connection.execute(select(models.Address.__table__.c.id)).scalars().all()
+    refresh_addresses(connection, address_ids)
+
+
+def ensure_planning_queue(db: Session) -> None:
+    address_count = db.query(func.count(models.Address.id)).scalar() or 0
+    queue_count = db.query(func.count(models.PlanningQueueEntry.address_id)).scalar() or 0
+    if address_count != queue_count:
+        rebuild_planning_queue(db.connection())
+        db.commit()
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def track_planning_changes(session: Session, flush_context) -> None:
+    address_ids: set[int | None] = set()
+    streets: set[str | None] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, models.Address):
+            address_ids.add(obj.id)
+        elif isinstance(obj, models.Appointment):
+            address_ids.add(obj.address_id)
+            address_ids.update(inspect(obj).attrs.address_id.history.deleted)
+        elif isinstance(obj, models.StreetPriority):
+            streets.add(obj.street)
+            streets.update(inspect(obj).attrs.street.history.deleted)
+    if address_ids:
+        refresh_addresses(session.connection(), address_ids)
+    if streets:
+        refresh_streets(session.connection(), streets)
+
+
+def address_priority():
+    return models.PlanningQueueEntry.priority
+
+
+# The queue carries the street priority next to the address sort key, so the
+# address list pages over ix_planning_queue_sort_key instead of computing the
+# priority per row.
+SORT_KEY = (
+    models.PlanningQueueEntry.street_key,
+    models.PlanningQueueEntry.house_number,
+    models.PlanningQueueEntry.house_suffix,
+    models.PlanningQueueEntry.address_id,
+)
+
+
+def order_addresses(query, after: list | None = None):
+    priority = address_priority()
+    query = query.join(
+        models.PlanningQueueEntry,
+        models.PlanningQueueEntry.address_id == models.Address.id,
+    )
+    if after is not None:
+        after_priority, *after_key = after
+        query = query.filter(
+            or_(
+                priority < after_priority,
+                and_(priority == after_priority, tuple_(*SORT_KEY) > tuple_(*after_key)),
+            )
+        )
+    return query.order_by(priority.desc(), *SORT_KEY)
+
+
+def unavailable_address_ids(plan_date: date):
+    day_start, next_day = day_bounds(plan_date)
+    return select(models.AddressUnavailablePeriod.address_id).where(
+        models.AddressUnavailablePeriod.starts_at < next_day,
+        models.AddressUnavailablePeriod.ends_at >= day_start,
+        models.AddressUnavailablePeriod.address_id.is_not(None),
+    )
+
+
+def queue_query(db: Session, plan_date: date | None = None, *entities):
+    query = (
+        db.query(*entities)
+        .select_from(models.PlanningQueueEntry)
+        .filter(models.PlanningQueueEntry.plannable.is_(True))
+    )
+    if plan_date:
+        query = query.filter(
+            ~models.PlanningQueueEntry.address_id.in_(unavailable_address_ids(plan_date))
+        )
+    return query
+
+
+def plannable_addresses(
+    db: Session,
+    plan_date: date | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+) -> tuple[list[models.Address], set[int]]:
+    query = (
+        queue_query(db, plan_date, models.Address, models.PlanningQueueEntry.reschedule)
+        .join(models.Address, models.Address.id == models.PlanningQueueEntry.address_id)
+        .filter(models.PlanningQueueEntry.blocked.is_(False))
+        .order_by(*QUEUE_ORDER)
+    )
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.all()
+    addresses = [address for address, _ in rows]
+    reschedule_ids = {address.id for address, reschedule in rows if reschedule}
+    return addresses, reschedule_ids
+
+
+def plannable_ids(
+    db: Session, plan_date: date | None = None, address_ids: Iterable[int] | None = None
+) -> set[int]:
+    query = queue_query(db, plan_date, models.PlanningQueueEntry.address_id).filter(
+        models.PlanningQueueEntry.blocked.is_(False)
+    )
+    if address_ids is None:
+        return {row[0] for row in query.all()}
+    ids = sorted(set(address_ids))
+    found: set[int] = set()
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start : start + CHUNK_SIZE]
+        found.update(
+            row[0]
+            for row in query.filter(models.PlanningQueueEntry.address_id.in_(chunk)).all()
+        )
+    return found
+
+
+def plannable_count(db: Session, plan_date: date | None = None) -> int:
+    return (
+        queue_query(db, plan_date, func.count(models.PlanningQueueEntry.address_id))
+        .filter(models.PlanningQueueEntry.blocked.is_(False))
+        .scalar()
+        or 0
+    )
+
+
+def skipped_addresses(
+    db: Session, plan_date: date | None = None
+) -> tuple[list[models.Address], list[models.Address]]:
+    base_query = queue_query(db, plan_date, models.Address).join(
+        models.Address, models.Address.id == models.PlanningQueueEntry.address_id
+    )
+    blocked = (
+        base_query.filter(models.PlanningQueueEntry.blocked.is_(True))
+        .order_by(*QUEUE_ORDER[1:])
+        .all()
+    )
+    buffer = (
+        base_query.filter(
+            models.PlanningQueueEntry.blocked.is_(False),
+            models.PlanningQueueEntry.buffer.is_(True),
+        )
+        .order_by(*QUEUE_ORDER[1:])
+        .all()
+    )
+    return blocked, buffer
@@ -1,19 +1,16 @@
 from __future__ import annotations
 
-import csv
-import io
-import re
 from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
-from sqlalchemy import func, or_
-from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from starlette.responses import RedirectResponse
+from starlette.responses import JSONResponse, RedirectResponse
 
-from app import models
+from app import address_import, jobs, models, planning, search
 from app.db import get_db
 from app.dependencies import consume_flashes, flash, require_role
+from app.pagination import decode_cursor, encode_cursor
+from app.routes.admin_status import invalidate_snapshot
 
 PHOTO_LABELS = {
     "both": "Begge målere",
@@ -27,26 +24,19 @@ RESPONSE_LABELS = {
     "confirm_time": "Tidspunkt bekræftet",
 }
 
-router = APIRouter(prefix="/admin/addresses", tags=["admin"])
-
-
-def street_priority_map(db: Session) -> dict[str, int]:
-    rows = db.query(models.StreetPriority).all()
-    return {row.street.lower(): row.priority for row in rows}
+STATUS_FILTER_MAP = {
+    "planned": models.AppointmentStatus.SCHEDULED,
+    "informed": models.AppointmentStatus.INFORMED,
+    "completed": models.AppointmentStatus.COMPLETED,
+    "closed": models.AppointmentStatus.CLOSED,
+    "not_home": models.AppointmentStatus.NOT_HOME,
+    "needs_reschedule": models.AppointmentStatus.NEEDS_RESCHEDULE,
+}
 
+PAGE_SIZE = 100
+SUGGEST_LIMIT = 25
 
-def address_sort_key(
-    address: models.Address, priority_map: dict[str, int]
-) -> tuple[int, str, int, str]:
-    street = (address.street or "").lower()
-    priority = priority_map.get(street, 0)
-    house_no = (address.house_no or "").strip()
-    match = re.match(r"(\d+)\s*(.*)", house_no)
-    if match:
-        number = int(match.group(1))
-        suffix = match.group(2).strip().lower()
-        return (-priority, street, number, suffix)
-    return (-priority, street, 999999, house_no.lower())
+router = APIRouter(prefix="/admin/addresses", tags=["admin"])
 
 
 def parse_datetime_local(value: str) -> datetime:
@@ -59,36 +49,51 @@ def format_status_date(value: datetime, current_year: int) -> str:
     return value.strftime("%d/%m")
 
 
+def status_label(current: models.AddressCurrentStatus, current_year: int) -> str:
+    status_date = format_status_date(current.starts_at, current_year)
+    if current.status == models.AppointmentStatus.COMPLETED:
+        return "Skiftet " + status_date
+    if current.status == models.AppointmentStatus.CLOSED:
+        return "Afsluttet " + status_date
+    if current.status == models.AppointmentStatus.INFORMED:
+        return "Informeret, planlagt til den " + status_date
+    if current.status == models.AppointmentStatus.NOT_HOME:
+        return "Ikke hjemme"
+    if current.status == models.AppointmentStatus.NEEDS_RESCHEDULE:
+        return "Planlagt til " + status_date + " • Behov for ny dato"
+    return "Planlagt " + status_date
+
+
+def duplicate_address(
+    db: Session,
+    street: str,
+    house_no: str,
+    zip_code: str,
+    city: str,
+    exclude_id: int | None = None,
+) -> bool:
+    query = db.query(models.Address.id).filter(
+        models.Address.address_key
+        == models.normalize_address(street, house_no, zip_code, city)
+    )
+    if exclude_id is not None:
+        query = query.filter(models.Address.id != exclude_id)
+    return query.first() is not None
+
+
 @router.get("")
 def list_addresses(
     request: Request,
     q: str | None = None,
     status: str | None = None,
+    cursor: str | None = None,
     db: Session = Depends(get_db),
     user: models.User = Depends(require_role(models.UserRole.ADMIN, models.UserRole.USER)),
 ):
     query = db.query(models.Address)
     search_value = (q or "").strip().lower()
     if search_value:
-        pattern = f"%{search_value}%"
-        query = query.filter(
-            or_(
-                func.lower(models.Address.street).like(pattern),
-                func.lower(models.Address.house_no).like(pattern),
-                func.lower(models.Address.zip).like(pattern),
-                func.lower(models.Address.city).like(pattern),
-                func.lower(models.Address.customer_name).like(pattern),
-                func.lower(models.Address.customer_email).like(pattern),
-                func.lower(models.Address.customer_phone).like(pattern),
-            )
-        )
-
-    addresses = query.all()
-    priority_map = street_priority_map(db)
-    addresses = sorted(addresses, key=lambda address: address_sort_key(address, priority_map))
-    address_ids = [address.id for address in addresses]
-    status_map: dict[int, str] = {}
-    status_status_map: dict[int, models.AppointmentStatus] = {}
+        query = search.filter_addresses(db, query, search_value)
 
     status_filters = [
         {"value": "all", "label": "Alle"},
@@ -104,110 +109,62 @@ def list_addresses(
     allowed_filters = {item["value"] for item in status_filters}
     selected_status = status if status in allowed_filters else "all"
 
-    not_home_history_map: dict[int, int] = {}
-    photo_map: dict[int, int] = {}
-    resident_response_map: dict[int, dict[str, str]] = {}
-    current_year = datetime.utcnow().year
-    if address_ids:
-        appointments = (
-            db.query(models.Appointment)
-            .filter(
-                models.Appointment.address_id.in_(address_ids),
-                models.Appointment.status.in_(
-                    [
-                        models.AppointmentStatus.SCHEDULED,
-                        models.AppointmentStatus.INFORMED,
-                        models.AppointmentStatus.COMPLETED,
-                        models.AppointmentStatus.CLOSED,
-                        models.AppointmentStatus.NOT_HOME,
-                        models.AppointmentStatus.NEEDS_RESCHEDULE,
-                    ]
-                ),
-            )
-            .order_by(models.Appointment.starts_at.desc())
-            .all()
+    query = (
+        planning.order_addresses(query, after=decode_cursor(cursor, 5))
+        .add_columns(planning.address_priority())
+        .add_entity(models.AddressCurrentStatus)
+        .outerjoin(
+            models.AddressCurrentStatus,
+            models.AddressCurrentStatus.address_id == models.Address.id,
         )
-        for appointment in appointments:
-            if appointment.address_id in status_map:
-                continue
-            status_status_map[appointment.address_id] = appointment.status
-            status_date = format_status_date(appointment.starts_at, current_year)
-            if appointment.status == models.AppointmentStatus.COMPLETED:
-                status_map[appointment.address_id] = "Skiftet " + status_date
-            elif appointment.status == models.AppointmentStatus.CLOSED:
-                status_map[appointment.address_id] = "Afsluttet " + status_date
-            elif appointment.status == models.AppointmentStatus.INFORMED:
-                status_map[appointment.address_id] = (
-                    "Informeret, planlagt til den " + status_date
-                )
-            elif appointment.status == models.AppointmentStatus.NOT_HOME:
-                status_map[appointment.address_id] = "Ikke hjemme"
-            elif appointment.status == models.AppointmentStatus.NEEDS_RESCHEDULE:
-                status_map[appointment.address_id] = (
-                    "Planlagt til " + status_date + " • Behov for ny dato"
-                )
-            else:
-                status_map[appointment.address_id] = "Planlagt " + status_date
-
-        not_home_rows = (
-            db.query(models.Appointment.address_id, func.count(models.Appointment.id))
-            .filter(
-                models.Appointment.address_id.in_(address_ids),
-                models.Appointment.status == models.AppointmentStatus.NOT_HOME,
-            )
-            .group_by(models.Appointment.address_id)
-            .all()
+    )
+    if selected_status == "unplanned":
+        query = query.filter(models.AddressCurrentStatus.status.is_(None))
+    elif selected_status == "not_home_history":
+        query = query.filter(models.AddressCurrentStatus.not_home_count > 0)
+    elif selected_status in STATUS_FILTER_MAP:
+        query = query.filter(
+            models.AddressCurrentStatus.status == STATUS_FILTER_MAP[selected_status]
         )
-        not_home_history_map = {address_id: count for address_id, count in not_home_rows}
 
-        photo_rows = (
-            db.query(models.AppointmentPhoto.address_id, func.count(models.AppointmentPhoto.id))
-            .filter(models.AppointmentPhoto.address_id.in_(address_ids))
-            .group_by(models.AppointmentPhoto.address_id)
-            .all()
+    rows = query.limit(PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(rows) > PAGE_SIZE:
+        rows = rows[:PAGE_SIZE]
+        last_address, last_priority, _ = rows[-1]
+        next_cursor = encode_cursor(
+            [
+                last_priority,
+                last_address.street_key,
+                last_address.house_number,
+                last_address.house_suffix,
+                last_address.id,
+            ]
         )
-        photo_map = {address_id: count for address_id, count in photo_rows}
 
-        responses = (
-            db.query(models.ResidentResponse)
-            .filter(models.ResidentResponse.address_id.in_(address_ids))
-            .order_by(models.ResidentResponse.created_at.desc())
-            .all()
-        )
-        for response in responses:
-            if response.address_id in resident_response_map:
-                continue
-            resident_response_map[response.address_id] = {
-                "label": RESPONSE_LABELS.get(response.response_type, "Svar modtaget"),
-                "date": response.created_at.strftime("%d/%m/%Y"),
+    addresses = [address for address, _, _ in rows]
+    status_map: dict[int, str] = {}
+    status_status_map: dict[int, models.AppointmentStatus] = {}
+    not_home_history_map: dict[int, int] = {}
+    photo_map: dict[int, int] = {}
+    resident_response_map: dict[int, dict[str, str]] = {}
+    current_year = datetime.utcnow().year
+    for address, _, current in rows:
+        if current is None:
+            continue
+        if current.status is not None:
+            status_status_map[address.id] = current.status
+            status_map[address.id] = status_label(current, current_year)
+        if current.not_home_count:
+            not_home_history_map[address.id] = current.not_home_count
+        if current.photo_count:
+            photo_map[address.id] = current.photo_count
+        if current.response_type:
+            resident_response_map[address.id] = {
+                "label": RESPONSE_LABELS.get(current.response_type, "Svar modtaget"),
+                "date": current.response_at.strftime("%d/%m/%Y"),
             }
 
-
-    if selected_status != "all":
-        filter_map = {
-            "planned": {models.AppointmentStatus.SCHEDULED},
-            "informed": {models.AppointmentStatus.INFORMED},
-            "completed": {models.AppointmentStatus.COMPLETED},
-            "closed": {models.AppointmentStatus.CLOSED},
-            "not_home": {models.AppointmentStatus.NOT_HOME},
-            "needs_reschedule": {models.AppointmentStatus.NEEDS_RESCHEDULE},
-        }
-        allowed_statuses = filter_map.get(selected_status, set())
-        if selected_status == "unplanned":
-            addresses = [
-                address for address in addresses if address.id not in status_status_map
-            ]
-        elif selected_status == "not_home_history":
-            addresses = [
-                address for address in addresses if address.id in not_home_history_map
-            ]
-        else:
-            addresses = [
-                address
-                for address in addresses
-                if status_status_map.get(address.id) in allowed_statuses
-            ]
-
     return request.app.state.templates.TemplateResponse(
         "admin_addresses.html",
         {
@@ -224,10 +181,31 @@ def list_addresses(
             "not_home_history_map": not_home_history_map,
             "photo_map": photo_map,
             "resident_response_map": resident_response_map,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
         },
     )
 
 
+@router.get("/search")
+def search_addresses(
+    q: str = "",
+    limit: int = 10,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_role(models.UserRole.ADMIN, models.UserRole.USER)),
+):
+    limit = max(1, min(limit, SUGGEST_LIMIT))
+    results = [
+        {
+            "id": address.id,
+            "label": f"{address.street} {address.house_no}, {address.zip} {address.city}",
+            "customer_name": address.customer_name,
+        }
+        for address in search.suggest_addresses(db, q.strip(), limit)
+    ]
+    return JSONResponse({"results": results})
+
+
 @router.post("")
 def create_address(
     request: Request,
@@ -261,6 +239,9 @@ def create_address(
     if not all([street, house_no, zip_code, city]):
         flash(request, "Alle adressefelter skal udfyldes", "error")
         return RedirectResponse("/admin/addresses", status_code=303)
+    if duplicate_address(db, street, house_no, zip_code, city):
+        flash(request, "Adressen findes allerede", "error")
+        return RedirectResponse("/admin/addresses", status_code=303)
 
     address = models.Address(
         street=street,
@@ -402,6 +383,11 @@ def update_address_fields(
         return RedirectResponse(
             f"/admin/addresses/{address_id}/edit/address", status_code=303
         )
+    if duplicate_address(db, street, house_no, zip_code, city, exclude_id=address_id):
+        flash(request, "Adressen findes allerede", "error")
+        return RedirectResponse(
+            f"/admin/addresses/{address_id}/edit/address", status_code=303
+        )
 
     address.street = street
     address.house_no = house_no
@@ -577,53 +563,41 @@ def mark_needs_reschedule(
 def import_csv(
     request: Request,
     file: UploadFile = File(...),
+    mode: str = Form("append"),
     db: Session = Depends(get_db),
     user: models.User = Depends(require_role(models.UserRole.ADMIN, models.UserRole.USER)),
 ):
-    try:
-        raw = file.file.read()
-        content = raw.decode("utf-8-sig")
-        reader = csv.DictReader(io.StringIO(content))
-    except Exception:
-        flash(request, "CSV-filen kunne ikke læses", "error")
+    if mode not in address_import.IMPORT_MODES:
+        flash(request, "Ukendt importtype", "error")
         return RedirectResponse("/admin/addresses", status_code=303)
+    job = jobs.enqueue(
+        db,
+        "import_addresses",
+        user,
+        {"mode": mode, "back_url": "/admin/addresses"},
+        files={"input.csv": file.file},
+    )
+    return RedirectResponse(f"/jobs/{job.id}", status_code=303)
 
-    required_fields = {"street", "house_no", "zip", "city"}
-    if not reader.fieldnames or not required_fields.issubset(set(reader.fieldnames)):
-        flash(request, "CSV skal indeholde street, house_no, zip, city", "error")
-        return RedirectResponse("/admin/addresses", status_code=303)
 
-    created = 0
-    skipped = 0
+@jobs.register("import_addresses")
+def run_import(job: jobs.JobContext, db: Session) -> None:
+    mode = job.params["mode"]
     try:
-        for row in reader:
-            street = (row.get("street") or "").strip()
-            house_no = (row.get("house_no") or "").strip()
-            zip_code = (row.get("zip") or "").strip()
-            city = (row.get("city") or "").strip()
-            customer_name = (row.get("customer_name") or "").strip() or None
-            customer_email = (row.get("customer_email") or "").strip() or None
-            customer_phone = (row.get("customer_phone") or "").strip() or None
-            if not all([street, house_no, zip_code, city]):
-                skipped += 1
-                continue
-            db.add(
-                models.Address(
-                    street=street,
-                    house_no=house_no,
-                    zip=zip_code,
-                    city=city,
-                    customer_name=customer_name,
-                    customer_email=customer_email,
-                    customer_phone=customer_phone,
-                )
+        with (job.directory / "input.csv").open("rb") as file:
+            result = address_import.import_addresses(
+                db, file, mode, on_progress=lambda result: job.progress(result.processed)
             )
-            created += 1
-        db.commit()
-    except SQLAlchemyError:
-        db.rollback()
-        flash(request, "Der opstod en fejl under import", "error")
-        return RedirectResponse("/admin/addresses", status_code=303)
-
-    flash(request, f"Importerede {created} adresser, {skipped} sprunget over", "success")
-    return RedirectResponse("/admin/addresses", status_code=303)
+    except address_import.AddressImportError as exc:
+        raise jobs.JobError(str(exc))
+    finally:
+        invalidate_snapshot()
+
+    message = f"Importerede {result.created} adresser"
+    if mode == "upsert":
+        message += f", {result.updated} opdateret, {result.unchanged} uændret"
+    message += f", {result.skipped} sprunget over"
+    if result.errors:
+        message += ". " + "; ".join(result.errors)
+    job.progress(result.processed, force=True)
+    job.message = message
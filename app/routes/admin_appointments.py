@@ -1,37 +1,26 @@
 from __future__ import annotations
 
 from datetime import date, datetime, time, timedelta
-from pathlib import Path
 from uuid import uuid4
-import re
-import unicodedata
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 from starlette.responses import JSONResponse, RedirectResponse
 
-from app import models
+from app import models, photo_store
 from app.db import get_db
+from app.dates import on_day
 from app.dependencies import consume_flashes, flash, require_role
+from app.photos import submit_renditions
 
 router = APIRouter(prefix="/admin/appointments", tags=["admin"])
 
-UPLOAD_DIR = Path("data") / "uploads"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 PHOTO_LABELS = {
     "both": "Begge målere",
     "new": "Ny måler",
     "old": "Gammel måler",
 }
 
-PHOTO_FILENAME = {
-    "both": "begge",
-    "new": "ny",
-    "old": "gammel",
-}
-
 STATUS_LABELS = {
     models.AppointmentStatus.SCHEDULED: "Planlagt",
     models.AppointmentStatus.INFORMED: "Beboer/kunde informeret",
@@ -66,33 +55,8 @@ def ensure_image(file: UploadFile) -> bool:
     return file.content_type is not None and file.content_type.startswith("image/")
 
 
-def slugify_address(address: models.Address) -> str:
-    value = f"{address.street}{address.house_no}".strip().lower()
-    value = value.replace("æ", "ae").replace("ø", "oe").replace("å", "aa")
-    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
-    return re.sub(r"[^a-z0-9]", "", value) or "adresse"
-
-
-def save_photo(address: models.Address, photo_type: str, file: UploadFile) -> str:
-    extension = Path(file.filename or "").suffix.lower() or ".jpg"
-    filename_slug = PHOTO_FILENAME.get(photo_type, "foto")
-    slug = slugify_address(address)
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    counter = 1
-
-    folder = UPLOAD_DIR / slug
-    folder.mkdir(parents=True, exist_ok=True)
-
-    while True:
-        filename = f"{slug}-{filename_slug}-{timestamp}-{counter}{extension}"
-        path = folder / filename
-        if not path.exists():
-            break
-        counter += 1
-
-    with path.open("wb") as buffer:
-        buffer.write(file.file.read())
-    return str(path.relative_to(UPLOAD_DIR))
+def save_photo(db: Session, file: UploadFile) -> models.PhotoBlob:
+    return photo_store.store_stream(db, file.file, file.filename)
 
 
 def availability_dates(db: Session) -> list[date]:
@@ -229,8 +193,8 @@ def appointment_overview(
                         models.AppointmentStatus.NEEDS_RESCHEDULE,
                     ]
                 ),
-                func.date(models.Appointment.starts_at) == models.VvsAvailability.date,
-                func.date(models.Appointment.starts_at) == selected_date,
+                models.VvsAvailability.date == selected_date,
+                on_day(models.Appointment.starts_at, selected_date),
             )
             .order_by(models.Appointment.starts_at)
             .all()
@@ -447,16 +411,18 @@ def upload_photo(
         flash(request, "Adresse ikke fundet", "error")
         return RedirectResponse(redirect_target, status_code=303)
 
-    file_path = save_photo(address, photo_type, file)
+    blob = save_photo(db, file)
     photo = models.AppointmentPhoto(
         appointment_id=appointment.id,
         address_id=appointment.address_id,
-        file_path=file_path,
+        file_path=blob.file_path,
+        blob_sha256=blob.sha256,
         photo_type=photo_type,
         uploaded_by_user_id=user.id,
     )
     db.add(photo)
     db.commit()
+    submit_renditions(blob.file_path)
 
     updated_photos = existing_photos + [photo]
     if photo_complete(updated_photos):
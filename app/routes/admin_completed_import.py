@@ -2,19 +2,19 @@ from __future__ import annotations
 
 import csv
 import io
-import re
-import unicodedata
 import zipfile
 from datetime import date, datetime, time, timedelta
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
 from sqlalchemy.orm import Session
-from starlette.responses import RedirectResponse, Response
+from starlette.responses import RedirectResponse
 
-from app import models
+from app import jobs, models, photo_store
+from app.planning import CHUNK_SIZE
 from app.db import get_db
-from app.dependencies import consume_flashes, flash, require_role
+from app.dependencies import consume_flashes, require_role
+from app.photos import generate_all_renditions
 
 router = APIRouter(prefix="/admin/import/completed", tags=["admin"])
 
@@ -32,6 +32,21 @@ ALLOWED_STATUSES = {
     "needs_reschedule",
 }
 
+EXPORT_FIELDS = [
+    "street",
+    "house_no",
+    "zip",
+    "city",
+    "changed_date",
+    "vvs_name",
+    "status",
+    "old_meter_no",
+    "new_meter_no",
+    "photo_both",
+    "photo_new",
+    "photo_old",
+]
+
 STATUS_MAP = {
     "draft": models.AppointmentStatus.DRAFT,
     "scheduled": models.AppointmentStatus.SCHEDULED,
@@ -43,69 +58,79 @@ STATUS_MAP = {
 }
 
 
-def slugify(value: str) -> str:
-    text = value.strip().lower()
-    text = text.replace("æ", "ae").replace("ø", "oe").replace("å", "aa")
-    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
-    return re.sub(r"[^a-z0-9]", "", text) or "adresse"
+def parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d")
 
 
-def slugify_address(address: models.Address) -> str:
-    return slugify(f"{address.street}{address.house_no}")
+def chunks(values: list, size: int = CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
 
 
-def parse_date(value: str) -> datetime:
-    return datetime.strptime(value, "%Y-%m-%d")
+def load_vvs_users(db: Session, names: set[str]) -> dict[str, models.User]:
+    users: dict[str, models.User] = {}
+    for chunk in chunks(sorted(names)):
+        for vvs_user in db.query(models.User).filter(
+            models.User.role == models.UserRole.VVS,
+            models.User.username.in_(chunk),
+        ):
+            users.setdefault(vvs_user.username, vvs_user)
+    return users
 
 
-def resolve_vvs(db: Session, vvs_name: str) -> models.User | None:
-    return (
-        db.query(models.User)
-        .filter(
-            models.User.role == models.UserRole.VVS,
-            models.User.username == vvs_name,
-        )
-        .first()
-    )
+def load_addresses(db: Session, keys: set[str]) -> dict[str, models.Address]:
+    addresses: dict[str, models.Address] = {}
+    for chunk in chunks(sorted(keys)):
+        for address in db.query(models.Address).filter(models.Address.address_key.in_(chunk)):
+            addresses[address.address_key] = address
+    return addresses
 
 
-def resolve_address(db: Session, street: str, house_no: str, zip_code: str, city: str) -> models.Address | None:
-    return (
-        db.query(models.Address)
+def load_availability(
+    db: Session, user_ids: set[int], dates: set[date]
+) -> set[tuple[int, date]]:
+    if not user_ids or not dates:
+        return set()
+    rows = (
+        db.query(models.VvsAvailability.user_id, models.VvsAvailability.date)
         .filter(
-            models.Address.street == street,
-            models.Address.house_no == house_no,
-            models.Address.zip == zip_code,
-            models.Address.city == city,
+            models.VvsAvailability.user_id.in_(user_ids),
+            models.VvsAvailability.date.between(min(dates), max(dates)),
         )
-        .first()
+        .all()
     )
+    return {(user_id, day) for user_id, day in rows}
+
+
+def load_closed_appointments(
+    db: Session, address_ids: set[int]
+) -> dict[int, models.Appointment]:
+    appointments: dict[int, models.Appointment] = {}
+    for chunk in chunks(sorted(address_ids)):
+        for appointment in (
+            db.query(models.Appointment)
+            .filter(
+                models.Appointment.address_id.in_(chunk),
+                models.Appointment.status == models.AppointmentStatus.CLOSED,
+            )
+            .order_by(models.Appointment.id)
+        ):
+            appointments.setdefault(appointment.address_id, appointment)
+    return appointments
 
 
-def save_zip_photo(address: models.Address, photo_type: str, filename: str, data: bytes) -> str:
-    slug = slugify_address(address)
-    extension = Path(filename).suffix.lower() or ".jpg"
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    counter = 1
-    folder = UPLOAD_DIR / slug
-    folder.mkdir(parents=True, exist_ok=True)
-    while True:
-        target_name = f"{slug}-{photo_type}-{timestamp}-{counter}{extension}"
-        path = folder / target_name
-        if not path.exists():
-            break
-        counter += 1
-    with path.open("wb") as buffer:
-        buffer.write(data)
-    return str(path.relative_to(UPLOAD_DIR))
-
-
-def read_zip(zip_file: UploadFile | None) -> dict[str, bytes]:
-    if not zip_file or not zip_file.filename:
-        return {}
-    data = zip_file.file.read()
-    with zipfile.ZipFile(io.BytesIO(data)) as archive:
-        return {name: archive.read(name) for name in archive.namelist()}
+def open_zip(path: Path) -> zipfile.ZipFile | None:
+    # The archive is read lazily from the job directory; only the central
+    # directory is loaded here.
+    if not path.exists():
+        return None
+    return zipfile.ZipFile(path)
+
+
+def zip_members(archive: zipfile.ZipFile | None) -> set[str]:
+    if archive is None:
+        return set()
+    return {info.filename for info in archive.infolist() if not info.is_dir() and info.file_size}
 
 
 def parse_photo_list(value: str) -> list[str]:
@@ -120,27 +145,74 @@ def ensure_closed(appointment: models.Appointment, user: models.User) -> None:
     appointment.changed_by_user_id = user.id
 
 
+def load_photo_keys(db: Session, appointment_ids: set[int]) -> set[tuple[int, str, str]]:
+    keys: set[tuple[int, str, str]] = set()
+    for chunk in chunks(sorted(appointment_ids)):
+        keys.update(
+            db.query(
+                models.AppointmentPhoto.appointment_id,
+                models.AppointmentPhoto.blob_sha256,
+                models.AppointmentPhoto.photo_type,
+            ).filter(
+                models.AppointmentPhoto.appointment_id.in_(chunk),
+                models.AppointmentPhoto.blob_sha256.is_not(None),
+            )
+        )
+    return keys
+
+
 def create_photo(
     db: Session,
     appointment: models.Appointment,
     address: models.Address,
     photo_type: str,
     filename: str,
-    data: bytes,
+    archive: zipfile.ZipFile,
     user: models.User,
-) -> None:
+    existing: set[tuple[int, str, str]],
+) -> str | None:
     if photo_type not in ALLOWED_TYPES:
-        return
-    file_path = save_zip_photo(address, photo_type, filename, data)
+        return None
+    blob = photo_store.store_zip_member(db, archive, filename)
+    # Re-importing the same ZIP must not attach the same photo twice.
+    key = (appointment.id, blob.sha256, photo_type)
+    if key in existing:
+        return None
+    existing.add(key)
     db.add(
         models.AppointmentPhoto(
             appointment_id=appointment.id,
             address_id=address.id,
-            file_path=file_path,
+            file_path=blob.file_path,
+            blob_sha256=blob.sha256,
             photo_type=photo_type,
             uploaded_by_user_id=user.id,
         )
     )
+    return blob.file_path
+
+
+def write_export(path: Path, export_rows: list[tuple[list[str], list[str]]]) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("completed.csv", "w", force_zip64=True) as entry:
+            output = io.TextIOWrapper(entry, encoding="utf-8", newline="")
+            writer = csv.writer(output)
+            writer.writerow(EXPORT_FIELDS)
+            for values, _ in export_rows:
+                writer.writerow(values)
+            output.flush()
+            output.detach()
+
+        # Photos are already compressed JPEGs, so they are stored as-is;
+        # ZipFile.write copies them in chunks instead of reading them whole.
+        written: set[str] = set()
+        for _, photo_paths in export_rows:
+            for photo_path in photo_paths:
+                full_path = (UPLOAD_DIR / photo_path).resolve()
+                if photo_path in written or not full_path.is_file():
+                    continue
+                written.add(photo_path)
+                archive.write(full_path, arcname=photo_path, compress_type=zipfile.ZIP_STORED)
 
 
 @router.get("")
@@ -165,6 +237,11 @@ def export_completed(
     db: Session = Depends(get_db),
     user: models.User = Depends(require_role(models.UserRole.ADMIN)),
 ):
+    job = jobs.enqueue(db, "export_completed", user, {"back_url": "/admin/import/completed"})
+    return RedirectResponse(f"/jobs/{job.id}", status_code=303)
+
+
+def load_export_rows(db: Session) -> list[tuple[list[str], list[str]]]:
     rows = (
         db.query(models.Appointment, models.Address, models.User)
         .join(models.Address, models.Address.id == models.Appointment.address_id)
@@ -181,8 +258,7 @@ def export_completed(
         .all()
     )
     if not rows:
-        flash(request, "Ingen afsluttede import-sager", "error")
-        return RedirectResponse("/admin/import/completed", status_code=303)
+        return []
 
     photos = (
         db.query(models.AppointmentPhoto)
@@ -197,37 +273,17 @@ def export_completed(
         if photo.photo_type in ALLOWED_TYPES:
             photo_map[photo.appointment_id][photo.photo_type].append(photo.file_path)
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(
-        [
-            "street",
-            "house_no",
-            "zip",
-            "city",
-            "changed_date",
-            "vvs_name",
-            "status",
-            "old_meter_no",
-            "new_meter_no",
-            "photo_both",
-            "photo_new",
-            "photo_old",
-        ]
-    )
-
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as archive:
-        for appointment, address, vvs_user in rows:
-            changed_date = appointment.starts_at.date().isoformat()
-            photo_lists = photo_map.get(appointment.id, {"both": [], "new": [], "old": []})
-            writer.writerow(
+    export_rows = []
+    for appointment, address, vvs_user in rows:
+        photo_lists = photo_map.get(appointment.id, {"both": [], "new": [], "old": []})
+        export_rows.append(
+            (
                 [
                     address.street,
                     address.house_no,
                     address.zip,
                     address.city,
-                    changed_date,
+                    appointment.starts_at.date().isoformat(),
                     vvs_user.username,
                     appointment.status.value,
                     appointment.old_meter_no or "",
@@ -235,22 +291,26 @@ def export_completed(
                     ";".join(photo_lists["both"]),
                     ";".join(photo_lists["new"]),
                     ";".join(photo_lists["old"]),
-                ]
+                ],
+                photo_lists["both"] + photo_lists["new"] + photo_lists["old"],
             )
+        )
+    return export_rows
 
-            for photo_path in photo_lists["both"] + photo_lists["new"] + photo_lists["old"]:
-                full_path = (UPLOAD_DIR / photo_path).resolve()
-                if full_path.exists():
-                    archive.write(full_path, arcname=photo_path)
 
-        archive.writestr("completed.csv", output.getvalue())
+@jobs.register("export_completed")
+def run_export(job: jobs.JobContext, db: Session) -> None:
+    export_rows = load_export_rows(db)
+    if not export_rows:
+        raise jobs.JobError("Ingen afsluttede import-sager")
+    db.rollback()
 
-    filename = "completed_export.zip"
-    return Response(
-        zip_buffer.getvalue(),
-        media_type="application/zip",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
+    temp_path = job.artifact_path.with_suffix(".tmp")
+    write_export(temp_path, export_rows)
+    temp_path.replace(job.artifact_path)
+    job.progress(len(export_rows), total=len(export_rows), force=True)
+    job.message = f"{len(export_rows)} sager eksporteret"
+    job.artifact_name = "completed_export.zip"
 
 
 @router.post("")
@@ -261,13 +321,20 @@ def import_completed(
     db: Session = Depends(get_db),
     user: models.User = Depends(require_role(models.UserRole.ADMIN)),
 ):
-    try:
-        raw = csv_file.file.read()
-        content = raw.decode("utf-8-sig")
-        reader = csv.DictReader(io.StringIO(content))
-    except Exception:
-        flash(request, "CSV-filen kunne ikke læses", "error")
-        return RedirectResponse("/admin/import/completed", status_code=303)
+    files = {"input.csv": csv_file.file}
+    if zip_file and zip_file.filename:
+        files["photos.zip"] = zip_file.file
+    job = jobs.enqueue(
+        db, "import_completed", user, {"back_url": "/admin/import/completed"}, files=files
+    )
+    return RedirectResponse(f"/jobs/{job.id}", status_code=303)
+
+
+@jobs.register("import_completed")
+def run_import(job: jobs.JobContext, db: Session) -> None:
+    user = db.get(models.User, job.user_id)
+    if not user:
+        raise jobs.JobError("Brugeren findes ikke længere")
 
     required_fields = {
         "street",
@@ -277,130 +344,152 @@ def import_completed(
         "changed_date",
         "vvs_name",
     }
-    if not reader.fieldnames or not required_fields.issubset(set(reader.fieldnames)):
-        flash(request, "CSV skal indeholde street, house_no, zip, city, changed_date, vvs_name", "error")
-        return RedirectResponse("/admin/import/completed", status_code=303)
-
-    zip_entries = read_zip(zip_file)
+    try:
+        archive = open_zip(job.directory / "photos.zip")
+    except zipfile.BadZipFile:
+        raise jobs.JobError("ZIP-filen kunne ikke læses")
+    try:
+        with (job.directory / "input.csv").open("rb") as file:
+            reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+            try:
+                fieldnames = reader.fieldnames
+                if not fieldnames or not required_fields.issubset(set(fieldnames)):
+                    raise jobs.JobError(
+                        "CSV skal indeholde street, house_no, zip, city, changed_date, vvs_name"
+                    )
+                job.message = import_rows(job, reader, required_fields, archive, db, user)
+            except (UnicodeDecodeError, csv.Error):
+                raise jobs.JobError("CSV-filen kunne ikke læses")
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def import_rows(
+    job: jobs.JobContext,
+    reader: csv.DictReader,
+    required_fields: set[str],
+    archive: zipfile.ZipFile | None,
+    db: Session,
+    user: models.User,
+) -> str:
+    members = zip_members(archive)
     created = 0
     skipped = 0
     skipped_existing_availability = 0
     photos_added = 0
-    created_availability: set[tuple[int, date]] = set()
 
+    rows = []
     for row in reader:
-        street = (row.get("street") or "").strip()
-        house_no = (row.get("house_no") or "").strip()
-        zip_code = (row.get("zip") or "").strip()
-        city = (row.get("city") or "").strip()
-        changed_raw = (row.get("changed_date") or "").strip()
-        vvs_name = (row.get("vvs_name") or "").strip()
-        status_raw = (row.get("status") or "").strip().lower()
-        if not all([street, house_no, zip_code, city, changed_raw, vvs_name]):
-            skipped += 1
-            continue
-
-        if status_raw and status_raw not in ALLOWED_STATUSES:
+        values = {
+            name: (row.get(name) or "").strip()
+            for name in ("street", "house_no", "zip", "city", "changed_date", "vvs_name")
+        }
+        values["status"] = (row.get("status") or "").strip().lower()
+        if not all(values[name] for name in required_fields):
             skipped += 1
             continue
-
-        address = resolve_address(db, street, house_no, zip_code, city)
-        if not address:
+        if values["status"] and values["status"] not in ALLOWED_STATUSES:
             skipped += 1
             continue
-
-        vvs_user = resolve_vvs(db, vvs_name)
-        if not vvs_user:
+        try:
+            values["changed_date"] = parse_date(values["changed_date"])
+        except ValueError:
             skipped += 1
             continue
+        values["address_key"] = models.normalize_address(
+            values["street"], values["house_no"], values["zip"], values["city"]
+        )
+        values["photos"] = {
+            photo_type: parse_photo_list(row.get(f"photo_{photo_type}") or "")
+            for photo_type in ("both", "new", "old")
+        }
+        rows.append(values)
+
+    # Everything the rows refer to is loaded up front in a few queries.
+    address_map = load_addresses(db, {values["address_key"] for values in rows})
+    vvs_map = load_vvs_users(db, {values["vvs_name"] for values in rows})
+    existing_availability = load_availability(
+        db,
+        {vvs_user.id for vvs_user in vvs_map.values()},
+        {values["changed_date"].date() for values in rows},
+    )
+    closed_map = load_closed_appointments(
+        db, {address.id for address in address_map.values()}
+    )
 
-        try:
-            changed_date = parse_date(changed_raw)
-        except ValueError:
+    created_availability: set[tuple[int, date]] = set()
+    pending_photos: list[tuple[models.Appointment, models.Address, str, str]] = []
+    job.progress(0, total=len(rows), force=True)
+    for index, values in enumerate(rows, start=1):
+        job.progress(index)
+        address = address_map.get(values["address_key"])
+        vvs_user = vvs_map.get(values["vvs_name"])
+        if not address or not vvs_user:
             skipped += 1
             continue
 
-        availability_date = changed_date.date()
-        availability_key = (vvs_user.id, availability_date)
+        changed_date = values["changed_date"]
+        availability_key = (vvs_user.id, changed_date.date())
         if availability_key not in created_availability:
-            existing_availability = (
-                db.query(models.VvsAvailability)
-                .filter(
-                    models.VvsAvailability.user_id == vvs_user.id,
-                    models.VvsAvailability.date == availability_date,
-                )
-                .first()
-            )
-            if existing_availability:
+            if availability_key in existing_availability:
                 skipped += 1
                 skipped_existing_availability += 1
                 continue
-
             db.add(
                 models.VvsAvailability(
                     user_id=vvs_user.id,
-                    date=availability_date,
+                    date=changed_date.date(),
                     start_time=time(8, 0),
                     end_time=time(16, 0),
                 )
             )
-            db.flush()
             created_availability.add(availability_key)
 
-        status_value = status_raw or "closed"
-
-        appointment = (
-            db.query(models.Appointment)
-            .filter(
-                models.Appointment.address_id == address.id,
-                models.Appointment.status == models.AppointmentStatus.CLOSED,
-            )
-            .first()
-        )
+        status_value = values["status"] or "closed"
+        appointment = closed_map.get(address.id)
         if not appointment:
             appointment = models.Appointment(
                 address_id=address.id,
                 contractor_id=vvs_user.id,
                 starts_at=changed_date,
                 ends_at=changed_date + timedelta(minutes=30),
-                status=STATUS_MAP[status_value],
-                changed_date=datetime.utcnow(),
-                changed_by_user_id=user.id,
             )
             db.add(appointment)
-            db.flush()
 
         appointment.status = STATUS_MAP[status_value]
         appointment.changed_date = datetime.utcnow()
         appointment.changed_by_user_id = user.id
-
-        for filename in parse_photo_list(row.get("photo_both") or ""):
-            data = zip_entries.get(filename)
-            if data:
-                create_photo(db, appointment, address, "both", filename, data, user)
-                photos_added += 1
-        for filename in parse_photo_list(row.get("photo_new") or ""):
-            data = zip_entries.get(filename)
-            if data:
-                create_photo(db, appointment, address, "new", filename, data, user)
-                photos_added += 1
-        for filename in parse_photo_list(row.get("photo_old") or ""):
-            data = zip_entries.get(filename)
-            if data:
-                create_photo(db, appointment, address, "old", filename, data, user)
-                photos_added += 1
-
         if status_value == "closed":
             ensure_closed(appointment, user)
+            closed_map[address.id] = appointment
+        else:
+            closed_map.pop(address.id, None)
+
+        for photo_type, filenames in values["photos"].items():
+            for filename in filenames:
+                if filename in members:
+                    pending_photos.append((appointment, address, photo_type, filename))
         created += 1
 
+    # A single flush assigns ids to the new appointments before photos are linked.
+    db.flush()
+    existing_photos = load_photo_keys(
+        db, {appointment.id for appointment, _, _, _ in pending_photos}
+    )
+    new_files: list[str] = []
+    for appointment, address, photo_type, filename in pending_photos:
+        file_path = create_photo(
+            db, appointment, address, photo_type, filename, archive, user, existing_photos
+        )
+        if file_path:
+            new_files.append(file_path)
+            photos_added += 1
+
     db.commit()
+    generate_all_renditions(new_files)
     skip_detail = ""
     if skipped_existing_availability:
         skip_detail = f" ({skipped_existing_availability} pga. eksisterende arbejdsdag)"
-    flash(
-        request,
-        f"Importerede {created} sager. {photos_added} fotos tilføjet. {skipped} rækker sprunget over{skip_detail}.",
-        "success",
-    )
-    return RedirectResponse("/admin/import/completed", status_code=303)
+    job.progress(len(rows), force=True)
+    return f"Importerede {created} sager. {photos_added} fotos tilføjet. {skipped} rækker sprunget over{skip_detail}."
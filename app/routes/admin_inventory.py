@@ -1,13 +1,13 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, Form, Request
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 from starlette.responses import RedirectResponse
 
 from app import models
 from app.db import get_db
 from app.dependencies import consume_flashes, flash, require_role
+from app.stock import available_stock
 
 router = APIRouter(prefix="/admin/inventory", tags=["admin"])
 
@@ -18,11 +18,7 @@ def inventory_dashboard(
     db: Session = Depends(get_db),
     user: models.User = Depends(require_role(models.UserRole.ADMIN)),
 ):
-    stock = (
-        db.query(func.coalesce(func.sum(models.StockMovement.quantity), 0))
-        .scalar()
-        or 0
-    )
+    stock = available_stock(db)
     batches = (
         db.query(models.MeterBatch)
         .order_by(models.MeterBatch.purchased_at.desc())
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 import os
 import re
@@ -12,13 +13,14 @@ import io
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
 from markdown import markdown
 import qrcode
-from sqlalchemy import func
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from starlette.responses import RedirectResponse, Response
-from weasyprint import HTML
 
-from app import models
+from app import jobs, letter_batches, models
 from app.db import get_db
+from app.dates import on_day
+from app.file_cache import FileCache, content_key
 from app.dependencies import consume_flashes, flash, require_role
 
 router = APIRouter(prefix="/admin/letters", tags=["admin"])
@@ -26,6 +28,13 @@ router = APIRouter(prefix="/admin/letters", tags=["admin"])
 UPLOAD_DIR = Path("data") / "uploads" / "logo"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+LINK_CHUNK_SIZE = 500
+
+qr_cache = FileCache(
+    Path("data") / "cache" / "qr",
+    int(os.environ.get("QR_CACHE_MB", "32")) * 1024 * 1024,
+)
+
 DEFAULT_BODY = (
     "# Kære beboer\n\n"
     "Vi kommer og udskifter vandmåleren på den planlagte dato. "
@@ -69,6 +78,13 @@ def render_body(body_markdown: str) -> str:
     return markdown(body_markdown, extensions=["extra", "nl2br"])
 
 
+@lru_cache(maxsize=32)
+def compiled_body(
+    template_id: int | None, updated_at: datetime | None, body_markdown: str
+) -> str:
+    return render_body(body_markdown)
+
+
 def time_window(starts_at: datetime) -> str:
     return "Formiddag (08:00–12:00)" if starts_at.hour < 12 else "Eftermiddag (12:00–16:00)"
 
@@ -102,21 +118,42 @@ def logo_paths(template: models.LetterTemplate | None) -> tuple[str | None, str
     return f"/upload/{relative_path}", file_path.as_uri()
 
 
-def get_or_create_link(db: Session, address: models.Address) -> models.ResidentLink:
-    link = (
-        db.query(models.ResidentLink)
-        .filter(
-            models.ResidentLink.address_id == address.id,
-            models.ResidentLink.active.is_(True),
+def active_links(db: Session, address_ids: list[int]) -> dict[int, models.ResidentLink]:
+    links: dict[int, models.ResidentLink] = {}
+    for start in range(0, len(address_ids), LINK_CHUNK_SIZE):
+        for link in (
+            db.query(models.ResidentLink)
+            .filter(
+                models.ResidentLink.address_id.in_(address_ids[start : start + LINK_CHUNK_SIZE]),
+                models.ResidentLink.active.is_(True),
+            )
+            .order_by(models.ResidentLink.created_at.desc(), models.ResidentLink.id.desc())
+        ):
+            links.setdefault(link.address_id, link)
+    return links
+
+
+def provision_links(db: Session, address_ids: list[int]) -> dict[int, models.ResidentLink]:
+    address_ids = list(dict.fromkeys(address_ids))
+    links = active_links(db, address_ids)
+    missing_ids = [address_id for address_id in address_ids if address_id not in links]
+    if missing_ids:
+        # One executemany insert; the caller commits once it is done with the
+        # loaded rows.
+        now = datetime.utcnow()
+        db.execute(
+            insert(models.ResidentLink),
+            [
+                {"address_id": address_id, "token": uuid4().hex, "active": True, "created_at": now}
+                for address_id in missing_ids
+            ],
         )
-        .order_by(models.ResidentLink.created_at.desc())
-        .first()
-    )
-    if link:
-        return link
-    token = uuid4().hex
-    link = models.ResidentLink(address_id=address.id, token=token, active=True)
-    db.add(link)
+        links.update(active_links(db, missing_ids))
+    return links
+
+
+def get_or_create_link(db: Session, address: models.Address) -> models.ResidentLink:
+    link = provision_links(db, [address.id])[address.id]
     db.commit()
     return link
 
@@ -131,77 +168,72 @@ def response_label(response_type: str) -> str:
 
 
 def qr_image(url: str) -> str:
-    qr = qrcode.QRCode(box_size=4, border=2)
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = io.BytesIO()
-    img.save(buffer, "PNG")
-    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    key = content_key(url)
+    png = qr_cache.get(key)
+    if png is None:
+        qr = qrcode.QRCode(box_size=4, border=2)
+        qr.add_data(url)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color="black", back_color="white")
+        buffer = io.BytesIO()
+        img.save(buffer, "PNG")
+        png = buffer.getvalue()
+        qr_cache.put(key, png)
+    encoded = base64.b64encode(png).decode("ascii")
     return f"data:image/png;base64,{encoded}"
 
 
+def shared_letter_context(template: models.LetterTemplate) -> dict[str, object]:
+    logo_url, logo_file = logo_paths(template)
+    include_resident_link = (
+        template.include_resident_link if template.include_resident_link is not None else True
+    )
+    return {
+        "body_html": compiled_body(template.id, template.updated_at, template.body_markdown),
+        "logo_url": logo_url,
+        "logo_file": logo_file,
+        "include_resident_link": include_resident_link,
+    }
+
+
 def letter_context(
     address: models.Address,
     appointment: models.Appointment,
-    template: models.LetterTemplate,
+    shared: dict[str, object],
     base_url: str,
-    db: Session,
+    link: models.ResidentLink | None,
 ):
-    logo_url, logo_file = logo_paths(template)
-    include_resident_link = (
-        template.include_resident_link if template.include_resident_link is not None else True
-    )
     response_url = None
     qr_data = None
     link_active = None
-    if include_resident_link:
-        link = get_or_create_link(db, address)
+    if shared["include_resident_link"] and link is not None:
         response_url = f"{base_url}/r/{link.token}"
         qr_data = qr_image(response_url)
         link_active = link.active
     return {
         "address": address,
         "appointment": appointment,
-        "body_html": render_body(template.body_markdown),
-        "logo_url": logo_url,
-        "logo_file": logo_file,
         "visit_date": appointment.starts_at.strftime("%d/%m/%Y"),
         "visit_window": time_window(appointment.starts_at),
-        "include_resident_link": include_resident_link,
         "response_url": response_url,
         "qr_data": qr_data,
         "link_active": link_active,
     }
 
 
-def render_pdf(html: str) -> bytes:
-    base_url = str(Path(".").resolve())
-    pdf_bytes = HTML(string=html, base_url=base_url).write_pdf()
-    return pdf_bytes if pdf_bytes is not None else b""
-
-
 def planned_dates(db: Session) -> list[str]:
     rows = (
-        db.query(func.date(models.Appointment.starts_at))
+        db.query(models.Appointment.plan_date)
         .filter(
             models.Appointment.status.in_(
                 [models.AppointmentStatus.SCHEDULED, models.AppointmentStatus.INFORMED]
             )
         )
         .distinct()
-        .order_by(func.date(models.Appointment.starts_at))
+        .order_by(models.Appointment.plan_date)
         .all()
     )
-    values: list[str] = []
-    for (value,) in rows:
-        if value is None:
-            continue
-        if isinstance(value, str):
-            values.append(value)
-        else:
-            values.append(value.isoformat())
-    return values
+    return [value.isoformat() for (value,) in rows if value is not None]
 
 
 @router.get("/template")
@@ -291,7 +323,9 @@ def letter_preview(
 
     template = latest_template(db) or models.LetterTemplate(body_markdown=DEFAULT_BODY, include_resident_link=True)
     base_url = public_base_url(request)
-    context = letter_context(address, appointment, template, base_url, db)
+    shared = shared_letter_context(template)
+    link = get_or_create_link(db, address) if shared["include_resident_link"] else None
+    context = letter_context(address, appointment, shared, base_url, link)
     latest_response = (
         db.query(models.ResidentResponse)
         .filter(models.ResidentResponse.address_id == address.id)
@@ -312,6 +346,7 @@ def letter_preview(
             "current_user": user,
             "flashes": consume_flashes(request),
             "resident_response": response_meta,
+            **shared,
             **context,
         },
     )
@@ -335,12 +370,14 @@ def letter_pdf(
 
     template = latest_template(db) or models.LetterTemplate(body_markdown=DEFAULT_BODY, include_resident_link=True)
     base_url = public_base_url(request)
-    context = letter_context(address, appointment, template, base_url, db)
+    shared = shared_letter_context(template)
+    link = get_or_create_link(db, address) if shared["include_resident_link"] else None
+    context = letter_context(address, appointment, shared, base_url, link)
 
     html = request.app.state.templates.get_template("letter_pdf.html").render(
-        letters=[context]
+        shared=shared, letters=[context]
     )
-    pdf_bytes = render_pdf(html)
+    pdf_bytes = letter_batches.cached_pdf(html)
 
     if appointment.status != models.AppointmentStatus.INFORMED:
         appointment.status = models.AppointmentStatus.INFORMED
@@ -369,55 +406,68 @@ def batch_pdf(
         return RedirectResponse("/admin/letters/template", status_code=303)
 
     try:
-        day = datetime.strptime(date, "%Y-%m-%d").date()
+        datetime.strptime(date, "%Y-%m-%d")
     except ValueError:
         flash(request, "Dato er ugyldig", "error")
         return RedirectResponse("/admin/letters/template", status_code=303)
 
-    rows = (
+    job = jobs.enqueue(
+        db,
+        "batch_pdf",
+        user,
+        {"date": date, "base_url": public_base_url(request), "back_url": "/admin/letters/template"},
+    )
+    return RedirectResponse(f"/jobs/{job.id}", status_code=303)
+
+
+def batch_rows(db: Session, day) -> list[tuple[models.Appointment, models.Address]]:
+    return (
         db.query(models.Appointment, models.Address)
         .join(models.Address, models.Address.id == models.Appointment.address_id)
         .filter(
             models.Appointment.status.in_(
                 [models.AppointmentStatus.SCHEDULED, models.AppointmentStatus.INFORMED]
             ),
-            func.date(models.Appointment.starts_at) == day,
+            on_day(models.Appointment.starts_at, day),
         )
         .order_by(models.Appointment.starts_at)
         .all()
     )
 
+
+@jobs.register("batch_pdf")
+def run_batch_pdf(job: jobs.JobContext, db: Session) -> None:
+    day = datetime.strptime(job.params["date"], "%Y-%m-%d").date()
+    rows = batch_rows(db, day)
     if not rows:
-        flash(request, "Ingen planlagte adresser på datoen", "error")
-        return RedirectResponse("/admin/letters/template", status_code=303)
+        raise jobs.JobError("Ingen planlagte adresser på datoen")
 
     template = latest_template(db) or models.LetterTemplate(body_markdown=DEFAULT_BODY, include_resident_link=True)
-    base_url = public_base_url(request)
+    shared = shared_letter_context(template)
+    links = (
+        provision_links(db, [address.id for _, address in rows])
+        if shared["include_resident_link"]
+        else {}
+    )
     letters = [
-        letter_context(address, appointment, template, base_url, db)
+        letter_context(address, appointment, shared, job.params["base_url"], links.get(address.id))
         for appointment, address in rows
     ]
+    # The HTML is rendered before the commit expires the loaded rows, which
+    # would otherwise be selected again one by one by the template.
+    pdf_template = job.templates.get_template("letter_pdf.html")
+    chunks = letter_batches.chunked(letters)
+    html_chunks = [pdf_template.render(shared=shared, letters=chunk) for chunk in chunks]
+    appointment_ids = [appointment.id for appointment, _ in rows]
+    db.commit()
 
-    html = request.app.state.templates.get_template("letter_pdf.html").render(
-        letters=letters
+    # Chunks are rendered in the letter process pool and merged into the job artifact.
+    job.progress(0, total=len(letters), force=True)
+    letter_batches.render_batch(
+        html_chunks, [len(chunk) for chunk in chunks], job.artifact_path, job.progress
     )
+    job.progress(len(letters), force=True)
 
-    pdf_bytes = render_pdf(html)
-
-    appointments_to_update = [appointment for appointment, _ in rows]
-    updated = False
-    for appointment in appointments_to_update:
-        if appointment.status != models.AppointmentStatus.INFORMED:
-            appointment.status = models.AppointmentStatus.INFORMED
-            appointment.changed_date = datetime.utcnow()
-            appointment.changed_by_user_id = user.id
-            updated = True
-    if updated:
-        db.commit()
-
-    filename = f"breve-{day.isoformat()}.pdf"
-    return Response(
-        pdf_bytes,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
+    letter_batches.mark_informed(db, appointment_ids, job.user_id)
+    job.message = f"{len(letters)} breve genereret"
+    job.artifact_name = f"breve-{day.isoformat()}.pdf"
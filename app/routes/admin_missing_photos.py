@@ -1,56 +1,124 @@
+from __future__ import annotations
+
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.orm import Query, Session
+from starlette.responses import JSONResponse
 
 from app import models
 from app.db import get_db
 from app.dependencies import consume_flashes, require_role
+from app.pagination import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/admin/missing-photos", tags=["admin"])
 
+PAGE_SIZE = 100
+
 STATUS_LABELS = {
     models.AppointmentStatus.COMPLETED: "Skiftet",
     models.AppointmentStatus.CLOSED: "Afsluttet",
 }
 
 
+def parse_cursor(raw: str | None) -> tuple[datetime, int] | None:
+    values = decode_cursor(raw, 2)
+    if values is None:
+        return None
+    try:
+        return datetime.fromisoformat(values[0]), int(values[1])
+    except (TypeError, ValueError):
+        return None
+
+
+def missing_photos_query(db: Session) -> Query:
+    # Latest completed/closed appointment per address, kept only when the
+    # address has no photos at all; both steps run in the database.
+    ranked = (
+        select(
+            models.Appointment.id.label("appointment_id"),
+            func.row_number()
+            .over(
+                partition_by=models.Appointment.address_id,
+                order_by=(models.Appointment.starts_at.desc(), models.Appointment.id.desc()),
+            )
+            .label("position"),
+        )
+        .where(
+            models.Appointment.status.in_(
+                [models.AppointmentStatus.COMPLETED, models.AppointmentStatus.CLOSED]
+            ),
+            models.Appointment.contractor_id.is_not(None),
+        )
+        .subquery()
+    )
+    has_photos = exists().where(
+        models.AppointmentPhoto.address_id == models.Appointment.address_id
+    )
+    return (
+        db.query(models.Appointment, models.Address, models.User)
+        .join(
+            ranked,
+            and_(ranked.c.appointment_id == models.Appointment.id, ranked.c.position == 1),
+        )
+        .join(models.Address, models.Address.id == models.Appointment.address_id)
+        .join(models.User, models.User.id == models.Appointment.contractor_id)
+        .filter(~has_photos)
+    )
+
+
+def count_missing_photos(db: Session) -> int:
+    report = missing_photos_query(db).with_entities(models.Appointment.id).subquery()
+    return db.execute(select(func.count()).select_from(report)).scalar_one()
+
+
 @router.get("")
 def missing_photos_overview(
     request: Request,
+    cursor: str | None = None,
+    total: int | None = None,
     db: Session = Depends(get_db),
     user: models.User = Depends(require_role(models.UserRole.ADMIN)),
 ):
-    photo_address_ids = {
-        row[0]
-        for row in db.query(models.AppointmentPhoto.address_id).distinct().all()
-    }
-    appointments = (
-        db.query(models.Appointment, models.Address, models.User)
-        .join(models.Address, models.Address.id == models.Appointment.address_id)
-        .join(models.User, models.User.id == models.Appointment.contractor_id)
-        .filter(
-            models.Appointment.status.in_(
-                [models.AppointmentStatus.COMPLETED, models.AppointmentStatus.CLOSED]
+    query = missing_photos_query(db)
+    after = parse_cursor(cursor)
+    if after:
+        starts_at, appointment_id = after
+        query = query.filter(
+            or_(
+                models.Appointment.starts_at < starts_at,
+                and_(
+                    models.Appointment.starts_at == starts_at,
+                    models.Appointment.id < appointment_id,
+                ),
             )
         )
-        .order_by(models.Appointment.starts_at.desc())
+    results = (
+        query.order_by(models.Appointment.starts_at.desc(), models.Appointment.id.desc())
+        .limit(PAGE_SIZE + 1)
         .all()
     )
-
-    seen_addresses: set[int] = set()
-    rows: list[dict[str, object]] = []
-    for appointment, address, contractor in appointments:
-        if address.id in seen_addresses:
-            continue
-        seen_addresses.add(address.id)
-        if address.id in photo_address_ids:
-            continue
-        rows.append(
-            {
-                "appointment": appointment,
-                "address": address,
-                "contractor": contractor,
-            }
+    next_cursor = None
+    if len(results) > PAGE_SIZE:
+        results = results[:PAGE_SIZE]
+        last_appointment = results[-1][0]
+        next_cursor = encode_cursor(
+            [last_appointment.starts_at.isoformat(), last_appointment.id]
         )
+    # The total is counted on the first page and carried along in the page
+    # links; /count gives a fresh number.
+    if total is None or after is None:
+        total = count_missing_photos(db)
+
+    rows = [
+        {
+            "appointment": appointment,
+            "address": address,
+            "contractor": contractor,
+        }
+        for appointment, address, contractor in results
+    ]
 
     return request.app.state.templates.TemplateResponse(
         "admin_missing_photos.html",
@@ -59,6 +127,17 @@ def missing_photos_overview(
             "current_user": user,
             "flashes": consume_flashes(request),
             "rows": rows,
+            "total_count": total,
             "status_labels": STATUS_LABELS,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
         },
     )
+
+
+@router.get("/count")
+def missing_photos_count(
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_role(models.UserRole.ADMIN)),
+):
+    return JSONResponse({"count": count_missing_photos(db)})
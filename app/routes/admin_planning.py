@@ -1,38 +1,24 @@
 from __future__ import annotations
 
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import date, datetime, time, timedelta
-import re
 
 from fastapi import APIRouter, Depends, Form, Request
-from sqlalchemy import func, select
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from starlette.responses import RedirectResponse
 
-from app import models
+from app import models, planning
+from app.dates import day_bounds, on_day
 from app.db import get_db
 from app.dependencies import consume_flashes, flash, require_role
+from app.stock import InsufficientStock, available_stock
 
 router = APIRouter(prefix="/admin/planning", tags=["admin"])
 
-
-def street_priority_map(db: Session) -> dict[str, int]:
-    rows = db.query(models.StreetPriority).all()
-    return {row.street.lower(): row.priority for row in rows}
-
-
-def address_sort_key(
-    address: models.Address, priority_map: dict[str, int]
-) -> tuple[int, str, int, str]:
-    street = (address.street or "").lower()
-    priority = priority_map.get(street, 0)
-    house_no = (address.house_no or "").strip()
-    match = re.match(r"(\d+)\s*(.*)", house_no)
-    if match:
-        number = int(match.group(1))
-        suffix = match.group(2).strip().lower()
-        return (-priority, street, number, suffix)
-    return (-priority, street, 999999, house_no.lower())
+# Addresses past the day's capacity are listed a page at a time in the preview.
+PREVIEW_PAGE_SIZE = 200
 
 
 @dataclass
@@ -58,6 +44,22 @@ def parse_time(raw: str) -> time:
     return datetime.strptime(raw, "%H:%M").time()
 
 
+def slot_times(plan_date: date, start_time: time, end_time: time) -> list[tuple[datetime, datetime]]:
+    times: list[tuple[datetime, datetime]] = []
+    windows = [(time(8, 0), time(12, 0)), (time(12, 0), time(16, 0))]
+    for window_start, window_end in windows:
+        start = max(start_time, window_start)
+        end = min(end_time, window_end)
+        if start >= end:
+            continue
+        current = datetime.combine(plan_date, start)
+        end_dt = datetime.combine(plan_date, end)
+        while current + timedelta(minutes=30) <= end_dt:
+            times.append((current, current + timedelta(minutes=30)))
+            current += timedelta(minutes=30)
+    return times
+
+
 def build_slots(db: Session, plan_date: date) -> list[tuple[models.User, datetime, datetime]]:
     availability = (
         db.query(models.VvsAvailability, models.User)
@@ -66,172 +68,39 @@ def build_slots(db: Session, plan_date: date) -> list[tuple[models.User, datetim
         .order_by(models.User.username)
         .all()
     )
-    slots: list[tuple[models.User, datetime, datetime]] = []
-    windows = [(time(8, 0), time(12, 0)), (time(12, 0), time(16, 0))]
-
-    for entry, contractor in availability:
-        for window_start, window_end in windows:
-            start = max(entry.start_time, window_start)
-            end = min(entry.end_time, window_end)
-            if start >= end:
-                continue
-            current = datetime.combine(plan_date, start)
-            end_dt = datetime.combine(plan_date, end)
-            while current + timedelta(minutes=30) <= end_dt:
-                slots.append((contractor, current, current + timedelta(minutes=30)))
-                current += timedelta(minutes=30)
-
+    slots = [
+        (contractor, starts_at, ends_at)
+        for entry, contractor in availability
+        for starts_at, ends_at in slot_times(plan_date, entry.start_time, entry.end_time)
+    ]
     slots.sort(key=lambda item: (item[1], item[0].username))
     return slots
 
 
-def available_stock(db: Session) -> int:
-    return (
-        db.query(func.coalesce(func.sum(models.StockMovement.quantity), 0)).scalar() or 0
-    )
-
-
-def apply_buffer_rule(
-    addresses: list[models.Address], limit: int = 14
-) -> list[models.Address]:
-    return addresses
-
-
-def latest_status_map(db: Session, address_ids: list[int]) -> dict[int, models.AppointmentStatus]:
-    if not address_ids:
-        return {}
-
-    appointments = (
-        db.query(models.Appointment)
-        .filter(
-            models.Appointment.address_id.in_(address_ids),
-            models.Appointment.status.in_(
-                [
-                    models.AppointmentStatus.SCHEDULED,
-                    models.AppointmentStatus.INFORMED,
-                    models.AppointmentStatus.COMPLETED,
-                    models.AppointmentStatus.CLOSED,
-                    models.AppointmentStatus.NOT_HOME,
-                    models.AppointmentStatus.NEEDS_RESCHEDULE,
-                ]
-            ),
-        )
-        .order_by(models.Appointment.starts_at.desc())
-        .all()
-    )
-
-    status_map: dict[int, models.AppointmentStatus] = {}
-    for appointment in appointments:
-        if appointment.address_id in status_map:
-            continue
-        status_map[appointment.address_id] = appointment.status
-    return status_map
-
-
-def unavailable_address_ids(db: Session, plan_date: date) -> set[int]:
-    day_start = datetime.combine(plan_date, time.min)
-    day_end = datetime.combine(plan_date, time.max)
-    rows = (
-        db.query(models.AddressUnavailablePeriod.address_id)
-        .filter(
-            models.AddressUnavailablePeriod.starts_at <= day_end,
-            models.AddressUnavailablePeriod.ends_at >= day_start,
-        )
-        .distinct()
-        .all()
-    )
-    return {row[0] for row in rows}
-
-
 def fetch_addresses(
-    db: Session, plan_date: date | None = None
+    db: Session,
+    plan_date: date | None = None,
+    limit: int | None = None,
+    offset: int = 0,
 ) -> tuple[list[models.Address], set[int]]:
-    scheduled = select(models.Appointment.address_id).where(
-        models.Appointment.status.in_(
-            [
-                models.AppointmentStatus.SCHEDULED,
-                models.AppointmentStatus.INFORMED,
-                models.AppointmentStatus.COMPLETED,
-                models.AppointmentStatus.CLOSED,
-            ]
-        )
-    )
-    query = (
-        db.query(models.Address)
-        .filter(~models.Address.id.in_(scheduled))
-        .filter(models.Address.blocked_reason.is_(None))
-    )
-    if plan_date:
-        unavailable_ids = unavailable_address_ids(db, plan_date)
-        if unavailable_ids:
-            query = query.filter(~models.Address.id.in_(unavailable_ids))
-    addresses = query.all()
-    priority_map = street_priority_map(db)
-    sorted_addresses = sorted(addresses, key=lambda address: address_sort_key(address, priority_map))
-    status_map = latest_status_map(db, [address.id for address in sorted_addresses])
-    reschedule_ids = {
-        address_id
-        for address_id, status in status_map.items()
-        if status == models.AppointmentStatus.NEEDS_RESCHEDULE
-    }
-
-    reschedule_addresses = [
-        address for address in sorted_addresses if address.id in reschedule_ids
-    ]
-    remaining = [
-        address for address in sorted_addresses if address.id not in reschedule_ids
-    ]
-    ordered_remaining = apply_buffer_rule(remaining, limit=14)
-    return reschedule_addresses + ordered_remaining, reschedule_ids
+    return planning.plannable_addresses(db, plan_date, limit=limit, offset=offset)
 
 
 def fetch_skipped_addresses(
     db: Session, plan_date: date | None = None
 ) -> tuple[list[models.Address], list[models.Address]]:
-    scheduled = select(models.Appointment.address_id).where(
-        models.Appointment.status.in_(
-            [
-                models.AppointmentStatus.SCHEDULED,
-                models.AppointmentStatus.INFORMED,
-                models.AppointmentStatus.COMPLETED,
-                models.AppointmentStatus.CLOSED,
-            ]
-        )
-    )
-    base_query = db.query(models.Address).filter(~models.Address.id.in_(scheduled))
-    if plan_date:
-        unavailable_ids = unavailable_address_ids(db, plan_date)
-        if unavailable_ids:
-            base_query = base_query.filter(~models.Address.id.in_(unavailable_ids))
-    priority_map = street_priority_map(db)
-    blocked_addresses = (
-        base_query.filter(models.Address.blocked_reason.is_not(None)).all()
-    )
-    buffer_addresses = (
-        base_query.filter(
-            models.Address.blocked_reason.is_(None),
-            models.Address.buffer_flag.is_(True),
-        ).all()
-    )
-    blocked_sorted = sorted(
-        blocked_addresses, key=lambda address: address_sort_key(address, priority_map)
-    )
-    buffer_sorted = sorted(
-        buffer_addresses, key=lambda address: address_sort_key(address, priority_map)
-    )
-    return blocked_sorted, buffer_sorted
+    return planning.skipped_addresses(db, plan_date)
 
 
 def fetch_unavailable_periods(
     db: Session, plan_date: date
 ) -> list[dict[str, object]]:
-    day_start = datetime.combine(plan_date, time.min)
-    day_end = datetime.combine(plan_date, time.max)
+    day_start, next_day = day_bounds(plan_date)
     rows = (
         db.query(models.AddressUnavailablePeriod, models.Address)
         .join(models.Address, models.Address.id == models.AddressUnavailablePeriod.address_id)
         .filter(
-            models.AddressUnavailablePeriod.starts_at <= day_end,
+            models.AddressUnavailablePeriod.starts_at < next_day,
             models.AddressUnavailablePeriod.ends_at >= day_start,
         )
         .order_by(models.AddressUnavailablePeriod.starts_at)
@@ -286,84 +155,89 @@ def has_conflict(db: Session, contractor_id: int, starts_at: datetime, ends_at:
     )
 
 
-def compute_plan_from_addresses(
-    db: Session, plan_date: date, addresses: list[models.Address]
-) -> tuple[list[PlannedSlot], list[models.Address], int, int]:
-    slots = build_slots(db, plan_date)
-    stock = available_stock(db)
-    max_count = min(len(slots), len(addresses), stock)
-    planned: list[PlannedSlot] = []
-
-    for idx in range(max_count):
-        contractor, starts_at, ends_at = slots[idx]
-        planned.append(
-            PlannedSlot(
-                address=addresses[idx],
-                contractor=contractor,
-                starts_at=starts_at,
-                ends_at=ends_at,
-            )
-        )
-
-    unplanned = addresses[max_count:]
-    return planned, unplanned, stock, len(slots)
-
-
-def compute_plan(db: Session, plan_date: date) -> tuple[list[PlannedSlot], list[models.Address], int, int, set[int]]:
+def compute_plan(
+    db: Session, plan_date: date, address_order: list[int] | None = None
+) -> tuple[list[PlannedSlot], int, int, int, set[int]]:
     slots = build_slots(db, plan_date)
-    addresses, reschedule_ids = fetch_addresses(db, plan_date)
     stock = available_stock(db)
-    max_count = min(len(slots), len(addresses), stock)
-    planned: list[PlannedSlot] = []
+    max_count = max(min(len(slots), stock), 0)
 
-    for idx in range(max_count):
-        contractor, starts_at, ends_at = slots[idx]
-        planned.append(
-            PlannedSlot(
-                address=addresses[idx],
-                contractor=contractor,
-                starts_at=starts_at,
-                ends_at=ends_at,
-            )
+    if address_order is None:
+        addresses, reschedule_ids = planning.plannable_addresses(
+            db, plan_date, limit=max_count
         )
-
-    unplanned = addresses[max_count:]
-    return planned, unplanned, stock, len(slots), reschedule_ids
+    else:
+        selected_ids = address_order[:max_count]
+        address_map: dict[int, models.Address] = {}
+        reschedule_ids = set()
+        if selected_ids:
+            for address, reschedule in (
+                db.query(models.Address, models.PlanningQueueEntry.reschedule)
+                .join(
+                    models.PlanningQueueEntry,
+                    models.PlanningQueueEntry.address_id == models.Address.id,
+                )
+                .filter(models.Address.id.in_(selected_ids))
+                .all()
+            ):
+                address_map[address.id] = address
+                if reschedule:
+                    reschedule_ids.add(address.id)
+        addresses = [address_map[address_id] for address_id in selected_ids]
+    total = planning.plannable_count(db, plan_date)
+
+    planned = [
+        PlannedSlot(
+            address=address,
+            contractor=contractor,
+            starts_at=starts_at,
+            ends_at=ends_at,
+        )
+        for (contractor, starts_at, ends_at), address in zip(slots, addresses)
+    ]
+    return planned, total - len(planned), stock, len(slots), reschedule_ids
 
 
 def available_planning_dates(db: Session) -> list[dict[str, object]]:
-    rows = (
-        db.query(models.VvsAvailability.date)
-        .distinct()
-        .order_by(models.VvsAvailability.date)
+    # Two queries for all dates: slot counts from the availability rows and
+    # appointment counts grouped by plan_date.
+    slot_counts: dict[date, int] = defaultdict(int)
+    for availability_date, start_time, end_time in (
+        db.query(
+            models.VvsAvailability.date,
+            models.VvsAvailability.start_time,
+            models.VvsAvailability.end_time,
+        )
+        .join(models.User, models.User.id == models.VvsAvailability.user_id)
+        .all()
+    ):
+        slot_counts[availability_date] += len(
+            slot_times(availability_date, start_time, end_time)
+        )
+    scheduled_counts = dict(
+        db.query(models.Appointment.plan_date, func.count(models.Appointment.id))
+        .filter(
+            models.Appointment.plan_date.in_(list(slot_counts)),
+            models.Appointment.status.in_(
+                [
+                    models.AppointmentStatus.SCHEDULED,
+                    models.AppointmentStatus.INFORMED,
+                    models.AppointmentStatus.COMPLETED,
+                    models.AppointmentStatus.CLOSED,
+                    models.AppointmentStatus.NOT_HOME,
+                    models.AppointmentStatus.NEEDS_RESCHEDULE,
+                ]
+            ),
+        )
+        .group_by(models.Appointment.plan_date)
         .all()
     )
     options: list[dict[str, object]] = []
-    for (availability_date,) in rows:
-        slot_count = len(build_slots(db, availability_date))
+    for availability_date in sorted(slot_counts):
+        slot_count = slot_counts[availability_date]
         if slot_count == 0:
             continue
-        day_start = datetime.combine(availability_date, time.min)
-        day_end = datetime.combine(availability_date, time.max)
-        scheduled_count = (
-            db.query(func.count(models.Appointment.id))
-            .filter(
-                models.Appointment.status.in_(
-                    [
-                        models.AppointmentStatus.SCHEDULED,
-                        models.AppointmentStatus.INFORMED,
-                        models.AppointmentStatus.COMPLETED,
-                        models.AppointmentStatus.CLOSED,
-                        models.AppointmentStatus.NOT_HOME,
-                        models.AppointmentStatus.NEEDS_RESCHEDULE,
-                    ]
-                ),
-                models.Appointment.starts_at >= day_start,
-                models.Appointment.starts_at <= day_end,
-            )
-            .scalar()
-            or 0
-        )
+        scheduled_count = scheduled_counts.get(availability_date, 0)
         label = (
             f"{availability_date.strftime('%d/%m/%Y')} "
             f"({scheduled_count} planlagt ud af {slot_count} mulighed)"
@@ -383,14 +257,17 @@ def planning_form(
     request: Request,
     date_query: str | None = None,
     preview: int | None = None,
+    page: int = 1,
     db: Session = Depends(get_db),
     user: models.User = Depends(require_role(models.UserRole.ADMIN)),
 ):
     planned: list[PlannedSlot] = []
     unplanned: list[models.Address] = []
+    remaining = 0
     stock = 0
     slot_count = 0
     plan_date = None
+    page = max(page, 1)
 
     options = available_planning_dates(db)
     option_values = {option["value"] for option in options}
@@ -407,14 +284,27 @@ def planning_form(
         return RedirectResponse("/admin/planning", status_code=303)
 
     ordered_addresses: list[models.Address] = []
-    reschedule_ids: set[int] = set()
     skipped_blocked: list[models.Address] = []
     skipped_buffer: list[models.Address] = []
     unavailable_entries: list[dict[str, object]] = []
     scheduled_addresses: list[models.Address] = []
     if plan_date and preview:
-        planned, unplanned, stock, slot_count, reschedule_ids = compute_plan(db, plan_date)
-        ordered_addresses, _ = fetch_addresses(db, plan_date)
+        # Only the day's capacity and one page of the rest are loaded; the
+        # order list covers the planned addresses plus the first page.
+        planned, remaining, stock, slot_count, _ = compute_plan(db, plan_date)
+        first_page, _ = fetch_addresses(
+            db, plan_date, limit=PREVIEW_PAGE_SIZE, offset=len(planned)
+        )
+        ordered_addresses = [slot.address for slot in planned] + first_page
+        if page == 1:
+            unplanned = first_page
+        else:
+            unplanned, _ = fetch_addresses(
+                db,
+                plan_date,
+                limit=PREVIEW_PAGE_SIZE,
+                offset=len(planned) + (page - 1) * PREVIEW_PAGE_SIZE,
+            )
         skipped_blocked, skipped_buffer = fetch_skipped_addresses(db, plan_date)
         unavailable_entries = fetch_unavailable_periods(db, plan_date)
         unavailable_ids = {entry["address"].id for entry in unavailable_entries}
@@ -436,15 +326,15 @@ def planning_form(
             .join(models.Appointment, models.Appointment.address_id == models.Address.id)
             .filter(
                 models.Appointment.status == models.AppointmentStatus.SCHEDULED,
-                models.Appointment.starts_at >= datetime.combine(plan_date, time.min),
-                models.Appointment.starts_at <= datetime.combine(plan_date, time.max),
+                on_day(models.Appointment.starts_at, plan_date),
             )
             .order_by(models.Appointment.starts_at)
             .all()
         )
         scheduled_addresses = scheduled_rows
 
-    total_addresses = len(planned) + len(unplanned)
+    total_addresses = len(planned) + remaining
+    page_count = max(-(-remaining // PREVIEW_PAGE_SIZE), 1)
 
     return request.app.state.templates.TemplateResponse(
         "admin_planning.html",
@@ -458,6 +348,8 @@ def planning_form(
             "slot_count": slot_count,
             "plan_date": plan_date,
             "total_addresses": total_addresses,
+            "page": page,
+            "page_count": page_count,
             "date_options": options,
             "ordered_addresses": ordered_addresses,
             "unavailable_entries": unavailable_entries,
@@ -506,35 +398,30 @@ def commit_plan(
         flash(request, "Dato er ugyldig", "error")
         return RedirectResponse("/admin/planning", status_code=303)
 
-    planned: list[PlannedSlot]
-    unplanned: list[models.Address]
-    stock: int
-    slot_count: int
-
     ordered_ids = [
         int(value)
         for value in address_order.split(",")
         if value.strip().isdigit()
     ]
     if ordered_ids:
-        addresses, _ = fetch_addresses(db, plan_date)
-        address_map = {address.id: address for address in addresses}
-        if any(address_id not in address_map for address_id in ordered_ids):
+        # Only the submitted ids are loaded; the full queue is only counted.
+        plannable_ids = planning.plannable_ids(db, plan_date, ordered_ids)
+        if any(address_id not in plannable_ids for address_id in ordered_ids):
             flash(request, "Rækkefølgen indeholder ugyldige adresser", "error")
             return RedirectResponse(
                 f"/admin/planning?date_query={date_raw}&preview=1", status_code=303
             )
-        if len(ordered_ids) != len(address_map):
+        planned, remaining, stock, slot_count, _ = compute_plan(db, plan_date, ordered_ids)
+        # The preview only sends the planned addresses and the first page of
+        # the rest, so the order has to fill the day rather than cover the queue.
+        expected_count = min(len(planned) + remaining, slot_count, stock)
+        if len(set(ordered_ids)) != len(ordered_ids) or len(ordered_ids) < expected_count:
             flash(request, "Rækkefølgen matcher ikke alle adresser", "error")
             return RedirectResponse(
                 f"/admin/planning?date_query={date_raw}&preview=1", status_code=303
             )
-        ordered_addresses = [address_map[address_id] for address_id in ordered_ids]
-        planned, unplanned, stock, slot_count = compute_plan_from_addresses(
-            db, plan_date, ordered_addresses
-        )
     else:
-        planned, unplanned, stock, slot_count, _ = compute_plan(db, plan_date)
+        planned, remaining, stock, slot_count, _ = compute_plan(db, plan_date)
 
     if slot_count == 0:
         flash(request, "Ingen arbejdsdage på denne dato", "error")
@@ -564,9 +451,13 @@ def commit_plan(
             note=f"Auto-planlægning {plan_date.isoformat()}",
         )
     )
-    db.commit()
+    try:
+        db.commit()
+    except InsufficientStock:
+        db.rollback()
+        flash(request, "Lageret er ændret imens. Prøv igen", "error")
+        return RedirectResponse(f"/admin/planning?date_query={date_raw}&preview=1", status_code=303)
 
-    remaining = len(unplanned)
     flash(
         request,
         f"Planlagt {len(planned)} adresser. {remaining} tilbage.",
@@ -609,8 +500,7 @@ def manual_planning_form(
             .filter(
                 models.Appointment.contractor_id.in_([user.id for user in vvs_users]),
                 models.Appointment.status == models.AppointmentStatus.SCHEDULED,
-                models.Appointment.starts_at >= datetime.combine(plan_date, time.min),
-                models.Appointment.starts_at < datetime.combine(plan_date, time.max),
+                on_day(models.Appointment.starts_at, plan_date),
             )
             .order_by(models.Appointment.starts_at)
             .all()
@@ -765,7 +655,14 @@ def manual_planning_commit(
             note=f"Manuel planlægning {plan_date.isoformat()}",
         )
     )
-    db.commit()
+    try:
+        db.commit()
+    except InsufficientStock:
+        db.rollback()
+        flash(request, "Ingen lager tilbage", "error")
+        return RedirectResponse(
+            f"/admin/planning/manual?date_query={date_raw}", status_code=303
+        )
 
     flash(request, "Adresse planlagt", "success")
     return RedirectResponse(
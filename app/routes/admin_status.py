@@ -1,15 +1,19 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from datetime import datetime, time, timedelta
+from datetime import date
+from itertools import chain
+import os
+import time
 
 from fastapi import APIRouter, Depends, Request
-from sqlalchemy import func
+from sqlalchemy import case, event, func
 from sqlalchemy.orm import Session
 
 from app import models
-from app.db import get_db
+from app.db import SessionLocal, get_db
 from app.dependencies import consume_flashes, require_role
+from app.stock import available_stock
 
 router = APIRouter(prefix="/admin/status", tags=["admin"])
 
@@ -18,104 +22,126 @@ INFORMED_STATUSES = {models.AppointmentStatus.INFORMED}
 CLOSED_STATUSES = {models.AppointmentStatus.CLOSED}
 PLANNED_STATUSES = {models.AppointmentStatus.SCHEDULED}
 
+SNAPSHOT_TTL_SECONDS = float(os.environ.get("STATUS_CACHE_TTL", "30"))
+SNAPSHOT_MODELS = (
+    models.Address,
+    models.Appointment,
+    models.StockMovement,
+    models.VvsAvailability,
+)
 
-def latest_status_map(
-    db: Session, address_ids: list[int]
-) -> dict[int, models.AppointmentStatus]:
-    if not address_ids:
-        return {}
-
-    appointments = (
-        db.query(models.Appointment)
-        .filter(
-            models.Appointment.address_id.in_(address_ids),
-            models.Appointment.status.in_([
-                *COMPLETED_STATUSES,
-                *CLOSED_STATUSES,
-                *INFORMED_STATUSES,
-                *PLANNED_STATUSES,
-                models.AppointmentStatus.NOT_HOME,
-                models.AppointmentStatus.NEEDS_RESCHEDULE,
-            ]),
-        )
-        .order_by(models.Appointment.starts_at.desc())
-        .all()
-    )
+# The snapshot is cached per process. Commits made by other workers or
+# instances are only picked up once STATUS_CACHE_TTL expires.
+_snapshot: tuple[float, dict[str, object]] | None = None
+_generation = 0
+DIRTY_KEY = "status_snapshot_dirty"
 
-    status_map: dict[int, models.AppointmentStatus] = {}
-    for appointment in appointments:
-        if appointment.address_id in status_map:
-            continue
-        status_map[appointment.address_id] = appointment.status
-    return status_map
 
+def invalidate_snapshot() -> None:
+    global _snapshot, _generation
+    _snapshot = None
+    _generation += 1
 
-@router.get("")
-def status_dashboard(
-    request: Request,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(require_role(models.UserRole.ADMIN)),
-):
-    addresses = db.query(models.Address).order_by(models.Address.street).all()
-    address_ids = [address.id for address in addresses]
-    status_map = latest_status_map(db, address_ids)
-
-    completed_ids = {aid for aid, status in status_map.items() if status in COMPLETED_STATUSES}
-    closed_ids = {aid for aid, status in status_map.items() if status in CLOSED_STATUSES}
-    informed_ids = {aid for aid, status in status_map.items() if status in INFORMED_STATUSES}
-    planned_ids = {aid for aid, status in status_map.items() if status in PLANNED_STATUSES}
-    not_home_ids = {
-        aid
-        for aid, status in status_map.items()
-        if status == models.AppointmentStatus.NOT_HOME
-    }
-    not_home_total = (
-        db.query(func.count(models.Appointment.id))
-        .filter(models.Appointment.status == models.AppointmentStatus.NOT_HOME)
-        .scalar()
-        or 0
-    )
-    needs_reschedule_ids = {
-        aid
-        for aid, status in status_map.items()
-        if status == models.AppointmentStatus.NEEDS_RESCHEDULE
-    }
 
-    total = len(addresses)
-    completed = len(completed_ids)
-    closed = len(closed_ids)
-    informed = len(informed_ids)
-    planned = len(planned_ids)
-    not_home = len(not_home_ids)
-    needs_reschedule = len(needs_reschedule_ids)
-    remaining = max(
-        total - completed - closed - informed - planned - not_home - needs_reschedule, 0
-    )
-    not_home_count = not_home_total
-    stock = db.query(func.coalesce(func.sum(models.StockMovement.quantity), 0)).scalar() or 0
+@event.listens_for(SessionLocal, "after_flush")
+def track_snapshot_changes(session: Session, flush_context) -> None:
+    # Flushed rows are not visible to other sessions until the commit, so the
+    # snapshot is only invalidated once the transaction has committed.
+    if any(
+        isinstance(obj, SNAPSHOT_MODELS)
+        for obj in chain(session.new, session.dirty, session.deleted)
+    ):
+        session.info[DIRTY_KEY] = True
 
-    street_totals: dict[str, int] = defaultdict(int)
-    street_completed: dict[str, int] = defaultdict(int)
 
-    for address in addresses:
-        street_totals[address.street] += 1
-        if address.id in completed_ids:
-            street_completed[address.street] += 1
+@event.listens_for(SessionLocal, "after_commit")
+def invalidate_after_commit(session: Session) -> None:
+    if session.info.pop(DIRTY_KEY, False):
+        invalidate_snapshot()
 
-    street_progress = []
-    for street, total_count in street_totals.items():
-        done = street_completed.get(street, 0)
-        street_progress.append(
-            {
-                "street": street,
-                "completed": done,
-                "total": total_count,
-                "is_complete": done == total_count,
-            }
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def discard_after_rollback(session: Session, previous_transaction) -> None:
+    # Rolling back a savepoint keeps changes flushed earlier in the transaction.
+    if previous_transaction.parent is None:
+        session.info.pop(DIRTY_KEY, None)
+
+
+def as_date(value: date | str) -> date:
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def build_snapshot(db: Session) -> dict[str, object]:
+    status_counts: dict[models.AppointmentStatus | None, int] = {
+        status: count
+        for status, count in db.query(
+            models.AddressCurrentStatus.status, func.count(models.AddressCurrentStatus.address_id)
         )
+        .group_by(models.AddressCurrentStatus.status)
+        .all()
+    }
+
+    def count_for(statuses: set[models.AppointmentStatus]) -> int:
+        return sum(status_counts.get(status, 0) for status in statuses)
 
+    total = sum(status_counts.values())
+    completed = count_for(COMPLETED_STATUSES)
+    closed = count_for(CLOSED_STATUSES)
+    informed = count_for(INFORMED_STATUSES)
+    planned = count_for(PLANNED_STATUSES)
+    not_home = count_for({models.AppointmentStatus.NOT_HOME})
+    needs_reschedule = count_for({models.AppointmentStatus.NEEDS_RESCHEDULE})
+    remaining = max(
+        total - completed - closed - informed - planned - not_home - needs_reschedule, 0
+    )
+    stock = available_stock(db)
+
+    street_rows = (
+        db.query(
+            models.Address.street,
+            func.count(models.Address.id),
+            func.coalesce(
+                func.sum(
+                    case(
+                        (models.AddressCurrentStatus.status.in_(COMPLETED_STATUSES), 1),
+                        else_=0,
+                    )
+                ),
+                0,
+            ),
+        )
+        .outerjoin(
+            models.AddressCurrentStatus,
+            models.AddressCurrentStatus.address_id == models.Address.id,
+        )
+        .group_by(models.Address.street)
+        .all()
+    )
+    street_progress = [
+        {
+            "street": street,
+            "completed": done,
+            "total": total_count,
+            "is_complete": done == total_count,
+        }
+        for street, total_count, done in street_rows
+    ]
     street_progress.sort(key=lambda row: row["street"].lower())
 
+    appointment_day = models.Appointment.plan_date
+    day_counts: dict[date, dict[models.AppointmentStatus, int]] = defaultdict(dict)
+    not_home_total = 0
+    for day, status, count in (
+        db.query(appointment_day, models.Appointment.status, func.count(models.Appointment.id))
+        .group_by(appointment_day, models.Appointment.status)
+        .all()
+    ):
+        day_counts[as_date(day)][status] = count
+        if status == models.AppointmentStatus.NOT_HOME:
+            not_home_total += count
+
     availability_dates = [
         row[0]
         for row in db.query(models.VvsAvailability.date)
@@ -125,84 +151,59 @@ def status_dashboard(
     ]
     day_status = []
     for day in availability_dates:
-        day_start = datetime.combine(day, time.min)
-        day_end = day_start + timedelta(days=1)
-        total_count = (
-            db.query(func.count(models.Appointment.id))
-            .filter(
-                models.Appointment.starts_at >= day_start,
-                models.Appointment.starts_at < day_end,
-            )
-            .scalar()
-            or 0
-        )
-        completed_count = (
-            db.query(func.count(models.Appointment.id))
-            .filter(
-                models.Appointment.starts_at >= day_start,
-                models.Appointment.starts_at < day_end,
-                models.Appointment.status.in_(COMPLETED_STATUSES),
-            )
-            .scalar()
-            or 0
-        )
-        closed_count = (
-            db.query(func.count(models.Appointment.id))
-            .filter(
-                models.Appointment.starts_at >= day_start,
-                models.Appointment.starts_at < day_end,
-                models.Appointment.status.in_(CLOSED_STATUSES),
-            )
-            .scalar()
-            or 0
-        )
-        informed_count = (
-            db.query(func.count(models.Appointment.id))
-            .filter(
-                models.Appointment.starts_at >= day_start,
-                models.Appointment.starts_at < day_end,
-                models.Appointment.status.in_(INFORMED_STATUSES),
-            )
-            .scalar()
-            or 0
-        )
-        not_home_count = (
-            db.query(func.count(models.Appointment.id))
-            .filter(
-                models.Appointment.starts_at >= day_start,
-                models.Appointment.starts_at < day_end,
-                models.Appointment.status == models.AppointmentStatus.NOT_HOME,
-            )
-            .scalar()
-            or 0
-        )
+        counts = day_counts.get(day, {})
         day_status.append(
             {
                 "date": day,
-                "completed": completed_count,
-                "closed": closed_count,
-                "informed": informed_count,
-                "not_home": not_home_count,
-                "total": total_count,
+                "completed": sum(counts.get(status, 0) for status in COMPLETED_STATUSES),
+                "closed": sum(counts.get(status, 0) for status in CLOSED_STATUSES),
+                "informed": sum(counts.get(status, 0) for status in INFORMED_STATUSES),
+                "not_home": counts.get(models.AppointmentStatus.NOT_HOME, 0),
+                "total": sum(counts.values()),
             }
         )
 
+    return {
+        "total": total,
+        "completed": completed,
+        "closed": closed,
+        "informed": informed,
+        "planned": planned,
+        "not_home": not_home_total,
+        "needs_reschedule": needs_reschedule,
+        "remaining": remaining,
+        "stock": stock,
+        "street_progress": street_progress,
+        "day_status": day_status,
+    }
+
+
+def dashboard_snapshot(db: Session) -> dict[str, object]:
+    global _snapshot
+    cached = _snapshot
+    now = time.monotonic()
+    if cached and now - cached[0] < SNAPSHOT_TTL_SECONDS:
+        return cached[1]
+    generation = _generation
+    snapshot = build_snapshot(db)
+    # A commit while the snapshot was built may not be part of it.
+    if generation == _generation:
+        _snapshot = (now, snapshot)
+    return snapshot
+
+
+@router.get("")
+def status_dashboard(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_role(models.UserRole.ADMIN)),
+):
     return request.app.state.templates.TemplateResponse(
         "admin_status.html",
         {
             "request": request,
             "current_user": user,
             "flashes": consume_flashes(request),
-            "total": total,
-            "completed": completed,
-            "closed": closed,
-            "informed": informed,
-            "planned": planned,
-            "not_home": not_home_count,
-            "needs_reschedule": needs_reschedule,
-            "remaining": remaining,
-            "stock": stock,
-            "street_progress": street_progress,
-            "day_status": day_status,
+            **dashboard_snapshot(db),
         },
     )
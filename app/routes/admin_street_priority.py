@@ -4,7 +4,6 @@ import csv
 import io
 
 from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 from starlette.responses import RedirectResponse, Response
 
@@ -74,7 +73,7 @@ def set_priority(
         return RedirectResponse("/admin/street-priority", status_code=303)
 
     existing = db.query(models.StreetPriority).filter(
-        func.lower(models.StreetPriority.street) == street.lower()
+        models.StreetPriority.street_key == models.normalize_street(street)
     ).first()
 
     if existing:
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+from starlette.responses import FileResponse, JSONResponse
+
+from app import jobs, models
+from app.db import get_db
+from app.dependencies import consume_flashes, require_role
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def job_for_user(db: Session, job_id: str, user: models.User) -> models.Job:
+    job = db.get(models.Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job ikke fundet")
+    if user.role != models.UserRole.ADMIN and job.created_by_user_id != user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return job
+
+
+def job_payload(job: models.Job) -> dict[str, object]:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "label": jobs.JOB_LABELS.get(job.kind, job.kind),
+        "status": job.status.value,
+        "progress": job.progress,
+        "total": job.total,
+        "message": job.message,
+        "download_url": f"/jobs/{job.id}/download" if job.artifact_name else None,
+    }
+
+
+@router.get("/{job_id}")
+def job_page(
+    request: Request,
+    job_id: str,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_role(models.UserRole.ADMIN, models.UserRole.USER)),
+):
+    job = job_for_user(db, job_id, user)
+    return request.app.state.templates.TemplateResponse(
+        "job_status.html",
+        {
+            "request": request,
+            "current_user": user,
+            "flashes": consume_flashes(request),
+            "job": job_payload(job),
+            "back_url": json.loads(job.params or "{}").get("back_url", "/"),
+        },
+    )
+
+
+@router.get("/{job_id}/status")
+def job_status(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_role(models.UserRole.ADMIN, models.UserRole.USER)),
+):
+    return JSONResponse(job_payload(job_for_user(db, job_id, user)))
+
+
+@router.get("/{job_id}/download")
+def job_download(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_role(models.UserRole.ADMIN, models.UserRole.USER)),
+):
+    job = job_for_user(db, job_id, user)
+    path = jobs.artifact_path(job)
+    if job.status != models.JobStatus.DONE or not job.artifact_name or not path.exists():
+        raise HTTPException(status_code=404, detail="Filen er ikke klar")
+    return FileResponse(path, filename=job.artifact_name)
@@ -1,10 +1,11 @@
-from datetime import datetime, time
+from datetime import datetime
 
 from fastapi import APIRouter, Depends, Request
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app import models
+from app.dates import on_day
 from app.db import get_db
 from app.dependencies import consume_flashes, require_role
 
@@ -36,14 +37,11 @@ def user_dashboard(
 
     scheduled_addresses = []
     if selected_date:
-        day_start = datetime.combine(selected_date, time.min)
-        day_end = datetime.combine(selected_date, time.max)
         scheduled_addresses = (
             db.query(models.Address)
             .join(models.Appointment, models.Appointment.address_id == models.Address.id)
             .filter(
-                models.Appointment.starts_at >= day_start,
-                models.Appointment.starts_at <= day_end,
+                on_day(models.Appointment.starts_at, selected_date),
                 models.Appointment.status.in_(
                     [
                         models.AppointmentStatus.SCHEDULED,
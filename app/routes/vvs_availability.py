@@ -3,12 +3,12 @@ from __future__ import annotations
 from datetime import datetime, time
 
 from fastapi import APIRouter, Depends, Form, HTTPException, Request
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 from starlette.responses import RedirectResponse
 
 from app import models
 from app.db import get_db
+from app.dates import on_day
 from app.dependencies import consume_flashes, flash, require_role
 
 router = APIRouter(prefix="/vvs", tags=["vvs"])
@@ -34,7 +34,7 @@ def has_scheduled_appointments(db: Session, user_id: int, entry_date) -> bool:
         .filter(
             models.Appointment.contractor_id == user_id,
             models.Appointment.status == models.AppointmentStatus.SCHEDULED,
-            func.date(models.Appointment.starts_at) == entry_date,
+            on_day(models.Appointment.starts_at, entry_date),
         )
         .first()
         is not None
@@ -1,37 +1,27 @@
 from __future__ import annotations
 
 from datetime import date, datetime, time, timedelta
-from pathlib import Path
 from uuid import uuid4
-import re
-import unicodedata
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
-from sqlalchemy import func
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import JSONResponse, RedirectResponse
 
-from app import models
+from app import chunked_uploads, models, photo_store
 from app.db import get_db
+from app.dates import on_day
 from app.dependencies import consume_flashes, flash, require_role
+from app.photos import submit_renditions
 
 router = APIRouter(prefix="/vvs/tasks", tags=["vvs"])
 
-UPLOAD_DIR = Path("data") / "uploads"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 PHOTO_LABELS = {
     "both": "Begge målere",
     "new": "Ny måler",
     "old": "Gammel måler",
 }
 
-PHOTO_FILENAME = {
-    "both": "begge",
-    "new": "ny",
-    "old": "gammel",
-}
-
 STATUS_LABELS = {
     models.AppointmentStatus.SCHEDULED: "Planlagt",
     models.AppointmentStatus.INFORMED: "Beboer/kunde informeret",
@@ -66,33 +56,14 @@ def ensure_image(file: UploadFile) -> bool:
     return file.content_type is not None and file.content_type.startswith("image/")
 
 
-def slugify_address(address: models.Address) -> str:
-    value = f"{address.street}{address.house_no}".strip().lower()
-    value = value.replace("æ", "ae").replace("ø", "oe").replace("å", "aa")
-    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
-    return re.sub(r"[^a-z0-9]", "", value) or "adresse"
-
-
-def save_photo(address: models.Address, photo_type: str, file: UploadFile) -> str:
-    extension = Path(file.filename or "").suffix.lower() or ".jpg"
-    filename_slug = PHOTO_FILENAME.get(photo_type, "foto")
-    slug = slugify_address(address)
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    counter = 1
+def save_photo(db: Session, file: UploadFile) -> models.PhotoBlob:
+    return photo_store.store_stream(db, file.file, file.filename)
 
-    folder = UPLOAD_DIR / slug
-    folder.mkdir(parents=True, exist_ok=True)
 
-    while True:
-        filename = f"{slug}-{filename_slug}-{timestamp}-{counter}{extension}"
-        path = folder / filename
-        if not path.exists():
-            break
-        counter += 1
-
-    with path.open("wb") as buffer:
-        buffer.write(file.file.read())
-    return str(path.relative_to(UPLOAD_DIR))
+def save_chunked_photo(db: Session, upload: chunked_uploads.UploadSession) -> models.PhotoBlob:
+    blob = photo_store.store_file(db, upload.data_path, upload.filename)
+    chunked_uploads.discard(upload)
+    return blob
 
 
 def availability_dates(db: Session, user_id: int) -> list[date]:
@@ -199,8 +170,8 @@ def vvs_tasks(
                         models.AppointmentStatus.NEEDS_RESCHEDULE,
                     ]
                 ),
-                func.date(models.Appointment.starts_at) == models.VvsAvailability.date,
-                func.date(models.Appointment.starts_at) == selected_date,
+                models.VvsAvailability.date == selected_date,
+                on_day(models.Appointment.starts_at, selected_date),
             )
             .order_by(models.Appointment.starts_at)
             .all()
@@ -249,7 +220,8 @@ def upload_photo(
     date_query: str = Form(""),
     old_meter_no: str = Form(""),
     new_meter_no: str = Form(""),
-    file: UploadFile = File(...),
+    upload_id: str = Form(""),
+    file: UploadFile | None = File(None),
     db: Session = Depends(get_db),
     user: models.User = Depends(require_role(models.UserRole.VVS)),
 ):
@@ -307,7 +279,13 @@ def upload_photo(
             flash(request, "Foto af denne type er allerede uploadet", "error")
             return RedirectResponse(redirect_url, status_code=303)
 
-    if not ensure_image(file):
+    upload = None
+    if upload_id:
+        upload = chunked_uploads.get_upload(upload_id, user.id, appointment.id)
+        if not upload or not upload.complete:
+            flash(request, "Upload er ikke færdig, prøv igen", "error")
+            return RedirectResponse(redirect_url, status_code=303)
+    elif not file or not ensure_image(file):
         flash(request, "Kun billedfiler er tilladt", "error")
         return RedirectResponse(redirect_url, status_code=303)
 
@@ -316,16 +294,18 @@ def upload_photo(
         flash(request, "Adresse ikke fundet", "error")
         return RedirectResponse(redirect_url, status_code=303)
 
-    file_path = save_photo(address, photo_type, file)
+    blob = save_chunked_photo(db, upload) if upload else save_photo(db, file)
     photo = models.AppointmentPhoto(
         appointment_id=appointment.id,
         address_id=appointment.address_id,
-        file_path=file_path,
+        file_path=blob.file_path,
+        blob_sha256=blob.sha256,
         photo_type=photo_type,
         uploaded_by_user_id=user.id,
     )
     db.add(photo)
     db.commit()
+    submit_renditions(blob.file_path)
 
     updated_photos = existing_photos + [photo]
     if photo_complete(updated_photos):
@@ -340,6 +320,76 @@ def upload_photo(
     return RedirectResponse(redirect_url, status_code=303)
 
 
+@router.post("/{appointment_id}/uploads")
+def start_upload(
+    appointment_id: int,
+    filename: str = Form(""),
+    size: int = Form(...),
+    content_type: str = Form(""),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_role(models.UserRole.VVS)),
+):
+    appointment = (
+        db.query(models.Appointment.id)
+        .filter(
+            models.Appointment.id == appointment_id,
+            models.Appointment.contractor_id == user.id,
+        )
+        .first()
+    )
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Opgave ikke fundet")
+    try:
+        upload = chunked_uploads.create_upload(
+            user.id, appointment_id, filename, content_type, size
+        )
+    except chunked_uploads.ChunkedUploadError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=400)
+    return JSONResponse(
+        {
+            "upload_id": upload.id,
+            "offset": 0,
+            "size": upload.size,
+            "max_chunk_size": chunked_uploads.MAX_CHUNK_BYTES,
+        }
+    )
+
+
+@router.get("/{appointment_id}/uploads/{upload_id}")
+def upload_status(
+    appointment_id: int,
+    upload_id: str,
+    user: models.User = Depends(require_role(models.UserRole.VVS)),
+):
+    upload = chunked_uploads.get_upload(upload_id, user.id, appointment_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload ikke fundet")
+    return JSONResponse({"upload_id": upload.id, "offset": upload.offset, "size": upload.size})
+
+
+@router.put("/{appointment_id}/uploads/{upload_id}")
+async def upload_chunk(
+    request: Request,
+    appointment_id: int,
+    upload_id: str,
+    offset: int,
+    user: models.User = Depends(require_role(models.UserRole.VVS)),
+):
+    # The body is written to disk as it arrives; chunks are never held in full.
+    upload = await run_in_threadpool(
+        chunked_uploads.get_upload, upload_id, user.id, appointment_id
+    )
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload ikke fundet")
+    try:
+        new_offset = await chunked_uploads.append_chunk(upload, offset, request.stream())
+    except chunked_uploads.OffsetMismatch as exc:
+        return JSONResponse({"offset": exc.offset}, status_code=409)
+    except chunked_uploads.ChunkedUploadError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=400)
+    return JSONResponse({"offset": new_offset, "size": upload.size})
+
+
 def task_edit_context(
     db: Session, appointment_id: int, user_id: int
 ) -> dict[str, object] | None:
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from sqlalchemy import column, func, literal_column, or_, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Query, Session
+
+from app import models
+
+SEARCH_COLUMNS = (
+    "street",
+    "house_no",
+    "zip",
+    "city",
+    "customer_name",
+    "customer_email",
+    "customer_phone",
+)
+MIN_TRIGRAM_LENGTH = 3
+FUZZY_CANDIDATES = 5
+FUZZY_MIN_OVERLAP = 0.5
+
+search_table = table("address_search", column("rowid"), column("rank"))
+
+
+def _column_list(prefix: str = "") -> str:
+    return ", ".join(f"{prefix}{name}" for name in SEARCH_COLUMNS)
+
+
+CREATE_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS address_search USING fts5("
+    f"{_column_list()}, content='addresses', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS address_search_ai AFTER INSERT ON addresses BEGIN "
+    f"INSERT INTO address_search(rowid, {_column_list()}) "
+    f"VALUES (new.id, {_column_list('new.')}); END",
+    f"CREATE TRIGGER IF NOT EXISTS address_search_ad AFTER DELETE ON addresses BEGIN "
+    f"INSERT INTO address_search(address_search, rowid, {_column_list()}) "
+    f"VALUES ('delete', old.id, {_column_list('old.')}); END",
+    f"CREATE TRIGGER IF NOT EXISTS address_search_au AFTER UPDATE ON addresses BEGIN "
+    f"INSERT INTO address_search(address_search, rowid, {_column_list()}) "
+    f"VALUES ('delete', old.id, {_column_list('old.')}); "
+    f"INSERT INTO address_search(rowid, {_column_list()}) "
+    f"VALUES (new.id, {_column_list('new.')}); END",
+]
+
+
+def supports_fts(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def ensure_search_index(connection: Connection) -> None:
+    if not supports_fts(connection):
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'address_search'")
+    ).first()
+    for statement in CREATE_STATEMENTS:
+        connection.execute(text(statement))
+    if not exists:
+        rebuild_search_index(connection)
+
+
+def rebuild_search_index(connection: Connection) -> None:
+    connection.execute(text("INSERT INTO address_search(address_search) VALUES ('rebuild')"))
+
+
+def quote_term(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_terms(value: str) -> list[str]:
+    return [term for term in value.lower().split() if term]
+
+
+def match_ids(expression: str):
+    return select(search_table.c.rowid).where(
+        literal_column("address_search").op("MATCH")(expression)
+    )
+
+
+def like_filter(term: str):
+    pattern = f"%{term}%"
+    return or_(
+        *(func.lower(getattr(models.Address, name)).like(pattern) for name in SEARCH_COLUMNS)
+    )
+
+
+def filter_addresses(db: Session, query: Query, value: str) -> Query:
+    terms = search_terms(value)
+    if not terms:
+        return query
+    if not supports_fts(db.get_bind()):
+        return query.filter(*(like_filter(term) for term in terms))
+
+    long_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TRIGRAM_LENGTH]
+    if long_terms:
+        expression = " AND ".join(quote_term(term) for term in long_terms)
+        query = query.filter(models.Address.id.in_(match_ids(expression)))
+    for term in short_terms:
+        query = query.filter(like_filter(term))
+    return query
+
+
+def trigrams(terms: list[str]) -> set[str]:
+    return {
+        term[index : index + MIN_TRIGRAM_LENGTH]
+        for term in terms
+        for index in range(len(term) - MIN_TRIGRAM_LENGTH + 1)
+    }
+
+
+def address_trigrams(address: models.Address) -> set[str]:
+    values = [(getattr(address, name) or "").lower() for name in SEARCH_COLUMNS]
+    return trigrams(values)
+
+
+def suggest_addresses(db: Session, value: str, limit: int = 10) -> list[models.Address]:
+    terms = search_terms(value)
+    if not terms:
+        return []
+    results = (
+        filter_addresses(db, db.query(models.Address), value)
+        .order_by(models.Address.street_key, models.Address.house_number, models.Address.id)
+        .limit(limit)
+        .all()
+    )
+    wanted = trigrams(terms)
+    if len(results) >= limit or not wanted or not supports_fts(db.get_bind()):
+        return results
+
+    # Fill up with typo-tolerant matches: candidates sharing any trigram with the
+    # search, kept when at least half of the search trigrams are present.
+    expression = " OR ".join(quote_term(trigram) for trigram in sorted(wanted))
+    seen = {address.id for address in results}
+    candidate_ids = [
+        row[0]
+        for row in db.execute(
+            match_ids(expression).order_by(search_table.c.rank).limit(limit * FUZZY_CANDIDATES)
+        ).all()
+        if row[0] not in seen
+    ]
+    if not candidate_ids:
+        return results
+    scored = []
+    for address in db.query(models.Address).filter(models.Address.id.in_(candidate_ids)).all():
+        overlap = len(wanted & address_trigrams(address)) / len(wanted)
+        if overlap >= FUZZY_MIN_OVERLAP:
+            scored.append((-overlap, address.street_key, address.house_number, address.id, address))
+    scored.sort(key=lambda item: item[:4])
+    results.extend(item[-1] for item in scored[: limit - len(results)])
+    return results
@@ -32,4 +32,41 @@ document.addEventListener('DOMContentLoaded', () => {
       togglePanel(target)
     })
   })
+
+  const searchInput = document.querySelector('[data-address-search]')
+  const suggestionList = document.getElementById('address-suggestions')
+  if (searchInput && suggestionList) {
+    let suggestions = []
+    let timer = null
+
+    const loadSuggestions = async () => {
+      const value = searchInput.value.trim()
+      if (value.length < 2) {
+        suggestions = []
+        suggestionList.innerHTML = ''
+        return
+      }
+      const response = await fetch(`/admin/addresses/search?q=${encodeURIComponent(value)}`)
+      if (!response.ok) return
+      const data = await response.json()
+      suggestions = data.results || []
+      suggestionList.innerHTML = ''
+      suggestions.forEach((item) => {
+        const option = document.createElement('option')
+        option.value = item.label
+        if (item.customer_name) option.label = item.customer_name
+        suggestionList.appendChild(option)
+      })
+    }
+
+    searchInput.addEventListener('input', () => {
+      const match = suggestions.find((item) => item.label === searchInput.value)
+      if (match) {
+        window.location.href = `/admin/addresses/${match.id}/edit`
+        return
+      }
+      clearTimeout(timer)
+      timer = setTimeout(loadSuggestions, 200)
+    })
+  }
 })
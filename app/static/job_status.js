@@ -0,0 +1,40 @@
+document.addEventListener('DOMContentLoaded', () => {
+  const container = document.querySelector('[data-job]')
+  if (!container) return
+  const jobId = container.getAttribute('data-job')
+  const progress = container.querySelector('[data-job-progress]')
+  const message = container.querySelector('[data-job-message]')
+  const download = container.querySelector('[data-job-download]')
+
+  const statusLabels = {
+    queued: 'I kø',
+    running: 'Kører',
+    done: 'Færdig',
+    failed: 'Fejlet',
+  }
+
+  const render = (job) => {
+    let text = statusLabels[job.status] || job.status
+    if (job.status === 'running' || job.status === 'done') {
+      text += job.total ? ` · ${job.progress} af ${job.total}` : ` · ${job.progress} behandlet`
+    }
+    progress.textContent = text
+    message.textContent = job.message || ''
+    if (job.download_url) {
+      download.href = job.download_url
+      download.classList.remove('is-hidden')
+    }
+  }
+
+  const poll = async () => {
+    const response = await fetch(`/jobs/${jobId}/status`)
+    if (!response.ok) return
+    const job = await response.json()
+    render(job)
+    if (job.status === 'queued' || job.status === 'running') {
+      setTimeout(poll, 1000)
+    }
+  }
+
+  poll()
+})
@@ -29,7 +29,7 @@ document.addEventListener("DOMContentLoaded", () => {
   document.addEventListener("click", (event) => {
     const target = event.target.closest("img[data-lightbox]")
     if (!target) return
-    open(target.src, target.alt)
+    open(target.dataset.full || target.src, target.alt)
   })
 
   overlay.addEventListener("click", (event) => {
@@ -1,3 +1,128 @@
+const UPLOAD_CHUNK_SIZE = 512 * 1024
+const UPLOAD_MAX_RETRIES = 8
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
+const storedUploadId = (key) => {
+  try {
+    return window.localStorage.getItem(key)
+  } catch (error) {
+    return null
+  }
+}
+
+const storeUploadId = (key, value) => {
+  try {
+    if (value) {
+      window.localStorage.setItem(key, value)
+    } else {
+      window.localStorage.removeItem(key)
+    }
+  } catch (error) {
+    // Private browsing: uploads still resume within the page.
+  }
+}
+
+class UploadError extends Error {}
+
+const uploadOffset = async (baseUrl, uploadId) => {
+  const response = await fetch(`${baseUrl}/${uploadId}`)
+  if (!response.ok) return null
+  const payload = await response.json()
+  return payload.offset
+}
+
+const startUpload = async (baseUrl, file) => {
+  const formData = new FormData()
+  formData.append('filename', file.name)
+  formData.append('size', file.size)
+  formData.append('content_type', file.type)
+  const response = await fetch(baseUrl, { method: 'POST', body: formData })
+  const payload = await response.json().catch(() => ({}))
+  if (!response.ok) {
+    throw new UploadError(payload.error || 'Upload kunne ikke startes')
+  }
+  return payload.upload_id
+}
+
+// Sends the file in chunks; after a dropped connection it asks the server how
+// far it got and continues from there, also after a page reload.
+const uploadInChunks = async (appointmentId, file, onProgress) => {
+  const baseUrl = `/vvs/tasks/${appointmentId}/uploads`
+  const storageKey = `upload:${appointmentId}:${file.name}:${file.size}:${file.lastModified}`
+  let uploadId = storedUploadId(storageKey)
+  let offset = uploadId ? await uploadOffset(baseUrl, uploadId) : null
+  if (offset === null) {
+    uploadId = await startUpload(baseUrl, file)
+    offset = 0
+    storeUploadId(storageKey, uploadId)
+  }
+
+  let failures = 0
+  while (offset < file.size) {
+    onProgress(offset / file.size)
+    try {
+      const response = await fetch(`${baseUrl}/${uploadId}?offset=${offset}`, {
+        method: 'PUT',
+        body: file.slice(offset, offset + UPLOAD_CHUNK_SIZE),
+        headers: { 'Content-Type': 'application/octet-stream' }
+      })
+      const payload = await response.json()
+      if (response.status === 400 || response.status === 404) {
+        storeUploadId(storageKey, null)
+        throw new UploadError(payload.error || 'Upload fejlede')
+      }
+      if (!response.ok && response.status !== 409) {
+        throw new Error(`HTTP ${response.status}`)
+      }
+      offset = payload.offset
+      failures = 0
+    } catch (error) {
+      if (error instanceof UploadError) throw error
+      failures += 1
+      if (failures > UPLOAD_MAX_RETRIES) {
+        throw new UploadError('Forbindelsen er ustabil, prøv igen')
+      }
+      await sleep(Math.min(1000 * 2 ** failures, 15000))
+      const serverOffset = await uploadOffset(baseUrl, uploadId).catch(() => null)
+      if (serverOffset !== null) offset = serverOffset
+    }
+  }
+  onProgress(1)
+  storeUploadId(storageKey, null)
+  return uploadId
+}
+
+const attachChunkedUploads = () => {
+  document.querySelectorAll('form[data-chunked-upload]').forEach((form) => {
+    form.addEventListener('submit', async (event) => {
+      const input = form.querySelector('input[type="file"]')
+      const file = input && input.files[0]
+      if (!file) return
+      event.preventDefault()
+      const status = form.querySelector('[data-upload-status]')
+      const button = form.querySelector('button[type="submit"]')
+      button.disabled = true
+      try {
+        const uploadId = await uploadInChunks(
+          form.getAttribute('data-chunked-upload'),
+          file,
+          (ratio) => {
+            status.textContent = `Uploader… ${Math.round(ratio * 100)} %`
+          }
+        )
+        form.querySelector('input[name="upload_id"]').value = uploadId
+        // The file is already on the server; only the form fields are posted.
+        input.disabled = true
+        form.submit()
+      } catch (error) {
+        status.textContent = error instanceof UploadError ? error.message : 'Upload fejlede'
+        button.disabled = false
+      }
+    })
+  })
+}
+
 document.addEventListener('DOMContentLoaded', () => {
   const triggers = document.querySelectorAll('[data-inline-edit-trigger]')
 
@@ -128,4 +253,5 @@ document.addEventListener('DOMContentLoaded', () => {
   })
 
   attachDurationSync(document)
+  attachChunkedUploads()
 })
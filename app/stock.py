@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+
+BALANCE_ID = 1
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def available_stock(db: Session) -> int:
+    return db.query(models.StockBalance.quantity).filter_by(id=BALANCE_ID).scalar() or 0
+
+
+def ledger_stock(connection: Connection) -> int:
+    table = models.StockMovement.__table__
+    return connection.execute(select(func.coalesce(func.sum(table.c.quantity), 0))).scalar()
+
+
+def rebuild_stock_balance(connection: Connection, pending: int = 0) -> int:
+    """Sets the balance row to the ledger sum, less movements still being guarded."""
+    table = models.StockBalance.__table__
+    quantity = ledger_stock(connection) - pending
+    values = {"quantity": quantity, "updated_at": datetime.utcnow()}
+    updated = connection.execute(update(table).where(table.c.id == BALANCE_ID).values(**values))
+    if updated.rowcount == 0:
+        connection.execute(table.insert().values(id=BALANCE_ID, **values))
+    return quantity
+
+
+def reconcile_stock(db: Session) -> tuple[int | None, int]:
+    """Compares the balance row with the full ledger and repairs it if they differ."""
+    balance = db.query(models.StockBalance.quantity).filter_by(id=BALANCE_ID).scalar()
+    ledger = ledger_stock(db.connection())
+    if balance != ledger:
+        rebuild_stock_balance(db.connection())
+        db.commit()
+    return balance, ledger
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def track_stock_movements(session: Session, flush_context) -> None:
+    delta = 0
+    reserving = False
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, models.StockMovement):
+            continue
+        history = inspect(obj).attrs.quantity.history
+        if obj in session.deleted:
+            delta -= sum(history.deleted or history.unchanged)
+            continue
+        delta += sum(history.added) - sum(history.deleted)
+        reserving = reserving or obj.movement_type == models.InventoryMovementType.RESERVE
+    if not delta:
+        return
+
+    # The balance row is updated in the same transaction as the movements. Its
+    # row lock serialises concurrent planning commits, and the guard makes the
+    # flush fail instead of reserving meters that are no longer in stock.
+    table = models.StockBalance.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == BALANCE_ID)
+        .values(quantity=table.c.quantity + delta, updated_at=datetime.utcnow())
+    )
+    guarded = reserving and delta < 0
+    if guarded:
+        statement = statement.where(table.c.quantity + delta >= 0)
+    connection = session.connection()
+    if connection.execute(statement).rowcount:
+        return
+    if not guarded:
+        rebuild_stock_balance(connection)
+        return
+    balance_exists = connection.execute(
+        select(table.c.id).where(table.c.id == BALANCE_ID)
+    ).first()
+    if balance_exists is None:
+        # The ledger already holds this flush's movements; rebuild the row as
+        # it stood before them and apply the guarded update again.
+        rebuild_stock_balance(connection, pending=delta)
+        if connection.execute(statement).rowcount:
+            return
+    raise InsufficientStock("Ikke nok målere på lager")
+
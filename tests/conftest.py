@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+import sys
+import tempfile
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The engine is created when app.db is imported, so the database has to be
+# chosen first. Set DATABASE_URL to run the suite against another server.
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp(prefix='meterreplace-')) / 'test.db'}"
+)
+os.environ.setdefault("SQLITE_MAINTENANCE_MINUTES", "0")
+# Static files, templates and data/ are resolved from the working directory.
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import models  # noqa: E402
+from app.auth import hash_password  # noqa: E402
+from app.db import Base, SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def migrated_database() -> None:
+    # The schema comes from the migrations, as on an upgraded installation;
+    # init_db() at startup then only adds what they do not manage.
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    command.upgrade(config, "head")
+
+
+@pytest.fixture(scope="session")
+def client(migrated_database):
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    with SessionLocal() as session:
+        yield session
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+
+
+@pytest.fixture
+def admin_client(client, db):
+    db.add(
+        models.User(
+            username="test-admin",
+            role=models.UserRole.ADMIN,
+            password_hash=hash_password("test-password"),
+        )
+    )
+    db.commit()
+    client.post("/login", data={"username": "test-admin", "password": "test-password"})
+    yield client
+    client.cookies.clear()
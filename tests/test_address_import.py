@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from app import address_import, models
+
+HEADER = "street,house_no,zip,city,customer_name\n"
+
+
+def csv_file(*lines: str) -> io.BytesIO:
+    return io.BytesIO((HEADER + "".join(f"{line}\n" for line in lines)).encode("utf-8"))
+
+
+def test_import_writes_in_batches_and_refreshes_projections(db, monkeypatch):
+    monkeypatch.setattr(address_import, "BATCH_SIZE", 2)
+    progress: list[int] = []
+
+    result = address_import.import_addresses(
+        db,
+        csv_file(
+            "Bakkevej,1,8000,Aarhus,",
+            "Bakkevej,2,8000,Aarhus,",
+            "Østergade,3B,8000,Aarhus,",
+            ",4,8000,Aarhus,",
+            "Skovvej,5,8000,Aarhus,",
+        ),
+        on_progress=lambda current: progress.append(current.created),
+    )
+
+    assert (result.processed, result.created, result.skipped) == (5, 4, 1)
+    assert result.errors == ["Linje 5: mangler street"]
+    assert progress == [2, 4]
+    address_ids = {address.id for address in db.query(models.Address)}
+    assert {entry.address_id for entry in db.query(models.PlanningQueueEntry)} == address_ids
+    assert {row.address_id for row in db.query(models.AddressCurrentStatus)} == address_ids
+    address = db.query(models.Address).filter_by(street="Østergade").one()
+    assert (address.street_key, address.house_number, address.house_suffix) == ("østergade", 3, "b")
+
+
+def test_append_skips_existing_and_repeated_addresses(db):
+    db.add(models.Address(street="Bakkevej", house_no="1", zip="8000", city="Aarhus"))
+    db.commit()
+
+    result = address_import.import_addresses(
+        db,
+        csv_file(
+            "bakkevej,1,8000,Aarhus,Ny Navn",
+            "Skovvej,5,8000,Aarhus,Første",
+            "Skovvej,5,8000,Aarhus,Anden",
+        ),
+        mode="append",
+    )
+
+    assert (result.created, result.updated, result.skipped) == (1, 0, 2)
+    assert result.errors == [
+        "Linje 2: adressen findes allerede",
+        "Linje 4: adressen står flere gange i filen",
+    ]
+    names = {address.street: address.customer_name for address in db.query(models.Address)}
+    assert names == {"Bakkevej": None, "Skovvej": "Første"}
+
+
+def test_upsert_updates_existing_and_last_row_wins(db):
+    db.add_all(
+        [
+            models.Address(street="Bakkevej", house_no="1", zip="8000", city="Aarhus"),
+            models.Address(
+                street="Skovvej", house_no="5", zip="8000", city="Aarhus", customer_name="Uændret"
+            ),
+        ]
+    )
+    db.commit()
+
+    result = address_import.import_addresses(
+        db,
+        csv_file(
+            "Bakkevej,1,8000,Aarhus,Første",
+            "Bakkevej,1,8000,Aarhus,Anden",
+            "Skovvej,5,8000,Aarhus,Uændret",
+            "Åvej,2,8000,Aarhus,Ny",
+            "Åvej,2,8000,Aarhus,Nyere",
+        ),
+        mode="upsert",
+    )
+
+    assert (result.created, result.updated, result.unchanged, result.skipped) == (1, 1, 3, 0)
+    names = {address.street: address.customer_name for address in db.query(models.Address)}
+    assert names == {"Bakkevej": "Anden", "Skovvej": "Uændret", "Åvej": "Nyere"}
+
+
+def test_unknown_mode_is_rejected(db):
+    with pytest.raises(address_import.AddressImportError, match="Ukendt importtype"):
+        address_import.import_addresses(db, csv_file(), mode="replace")
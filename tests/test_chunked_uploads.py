@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app import chunked_uploads
+
+
+async def body(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.fixture
+def upload():
+    session = chunked_uploads.create_upload(1, 1, "foto.jpg", "image/jpeg", 8)
+    yield session
+    chunked_uploads.discard(session)
+
+
+def test_append_chunk_rejects_wrong_offset(upload):
+    assert asyncio.run(chunked_uploads.append_chunk(upload, 0, body(b"abcd"))) == 4
+    with pytest.raises(chunked_uploads.OffsetMismatch) as error:
+        asyncio.run(chunked_uploads.append_chunk(upload, 0, body(b"abcd")))
+    assert error.value.offset == 4
+
+
+def test_concurrent_chunks_at_same_offset_do_not_interleave(upload):
+    release = asyncio.Event()
+
+    async def slow_body():
+        yield b"ab"
+        await release.wait()
+        yield b"cd"
+
+    async def scenario():
+        first = asyncio.create_task(chunked_uploads.append_chunk(upload, 0, slow_body()))
+        await asyncio.sleep(0.05)
+        with pytest.raises(chunked_uploads.OffsetMismatch):
+            await chunked_uploads.append_chunk(upload, 0, body(b"wxyz"))
+        release.set()
+        return await first
+
+    assert asyncio.run(scenario()) == 4
+    assert upload.data_path.read_bytes() == b"abcd"
+
+
+def test_oversized_chunk_is_truncated(upload):
+    with pytest.raises(chunked_uploads.ChunkedUploadError):
+        asyncio.run(chunked_uploads.append_chunk(upload, 0, body(b"abcdef", b"ghij")))
+    assert upload.offset == 0
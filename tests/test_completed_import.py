@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import csv
+import io
+import zipfile
+
+from app import jobs, models
+from app.routes import admin_completed_import
+from app.routes.admin_completed_import import import_rows, write_export
+
+REQUIRED_FIELDS = {"street", "house_no", "zip", "city", "changed_date", "vvs_name"}
+
+
+def test_reopened_address_does_not_reuse_closed_appointment(db):
+    admin = models.User(username="import-admin", role=models.UserRole.ADMIN, password_hash="x")
+    vvs = models.User(username="vvs", role=models.UserRole.VVS, password_hash="x")
+    address = models.Address(street="Bakkevej", house_no="1", zip="8000", city="Aarhus")
+    db.add_all([admin, vvs, address])
+    db.commit()
+
+    reader = csv.DictReader(
+        io.StringIO(
+            "street,house_no,zip,city,changed_date,vvs_name,status\n"
+            "Bakkevej,1,8000,Aarhus,2026-10-01,vvs,closed\n"
+            "Bakkevej,1,8000,Aarhus,2026-10-01,vvs,completed\n"
+            "Bakkevej,1,8000,Aarhus,2026-10-01,vvs,closed\n"
+        )
+    )
+    job = jobs.JobContext(
+        job_id="test", kind="import_completed", params={}, user_id=admin.id, templates=None
+    )
+    import_rows(job, reader, REQUIRED_FIELDS, None, db, admin)
+
+    statuses = [
+        appointment.status
+        for appointment in db.query(models.Appointment).order_by(models.Appointment.id)
+    ]
+    assert statuses == [models.AppointmentStatus.COMPLETED, models.AppointmentStatus.CLOSED]
+
+
+def test_export_writes_csv_and_each_photo_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(admin_completed_import, "UPLOAD_DIR", tmp_path)
+    (tmp_path / "blobs").mkdir()
+    (tmp_path / "blobs" / "a.jpg").write_bytes(b"jpeg")
+    row = ["Bakkevej", "1", "8000", "Aarhus", "2026-10-01", "vvs", "closed", "", "", "blobs/a.jpg", "", ""]
+    export_path = tmp_path / "export.zip"
+
+    write_export(export_path, [(row, ["blobs/a.jpg"]), (row, ["blobs/a.jpg", "blobs/missing.jpg"])])
+
+    with zipfile.ZipFile(export_path) as archive:
+        assert archive.namelist() == ["completed.csv", "blobs/a.jpg"]
+        assert archive.getinfo("blobs/a.jpg").compress_type == zipfile.ZIP_STORED
+        lines = archive.read("completed.csv").decode("utf-8").splitlines()
+    assert lines[0].startswith("street,house_no")
+    assert len(lines) == 3
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import pytest
+
+from app import db as app_db
+from app.db import engine
+
+
+def test_profile_pragmas_can_be_overridden(monkeypatch):
+    monkeypatch.setattr(app_db, "SQLITE_PROFILE", "safe")
+    monkeypatch.setenv("SQLITE_PRAGMAS", "synchronous=NORMAL, cache_size=-32768")
+
+    assert app_db.sqlite_pragmas() == {
+        "journal_mode": "DELETE",
+        "busy_timeout": 10000,
+        "synchronous": "NORMAL",
+        "cache_size": "-32768",
+    }
+
+
+def test_unknown_profile_is_rejected(monkeypatch):
+    monkeypatch.setattr(app_db, "SQLITE_PROFILE", "fast")
+    with pytest.raises(RuntimeError, match="Unknown SQLITE_PROFILE"):
+        app_db.sqlite_pragmas()
+
+
+@pytest.mark.skipif(
+    engine.dialect.name != "sqlite" or app_db.SQLITE_PROFILE != "production",
+    reason="checks the production SQLite profile",
+)
+def test_connections_use_production_profile():
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 10000
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import os
+
+from app.file_cache import FileCache, content_key
+
+
+def test_content_key_separates_parts():
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert content_key("æ") == content_key("æ".encode("utf-8"))
+
+
+def test_put_and_get(tmp_path):
+    cache = FileCache(tmp_path, 1024)
+    key = content_key("letter")
+
+    assert cache.get(key) is None
+    cache.put(key, b"pdf")
+    assert cache.get(key) == b"pdf"
+    assert cache.path(key) == tmp_path / key[:2] / key
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = FileCache(tmp_path, 25)
+    first, second, third = (content_key(name) for name in ("first", "second", "third"))
+    cache.put(first, b"x" * 10)
+    cache.put(second, b"x" * 10)
+    os.utime(cache.path(first), (1000, 1000))
+    os.utime(cache.path(second), (2000, 2000))
+
+    assert cache.get(first) is not None
+    cache.put(third, b"x" * 10)
+
+    assert cache.get(second) is None
+    assert cache.get(first) == b"x" * 10
+    assert cache.get(third) == b"x" * 10
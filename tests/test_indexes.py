@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from datetime import date
+import importlib.util
+from pathlib import Path
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app import models, planning
+from app.dates import on_day
+from app.db import engine
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="EXPLAIN QUERY PLAN is SQLite syntax"
+)
+
+MIGRATION = (
+    Path(__file__).resolve().parent.parent / "alembic" / "versions" / "0026_add_hot_path_indexes.py"
+)
+spec = importlib.util.spec_from_file_location("hot_path_indexes", MIGRATION)
+hot_path_indexes = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(hot_path_indexes)
+
+
+def query_plan(db, query) -> str:
+    statement = query.statement.compile(engine, compile_kwargs={"literal_binds": True})
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_migrated_database_has_hot_path_indexes(db):
+    inspector = inspect(db.connection())
+    for name, table, columns in hot_path_indexes.INDEXES:
+        indexes = {index["name"]: index["column_names"] for index in inspector.get_indexes(table)}
+        assert indexes.get(name) == columns
+
+
+def test_appointments_by_day_use_starts_at_index(db):
+    query = db.query(models.Appointment).filter(
+        on_day(models.Appointment.starts_at, date(2026, 11, 2))
+    )
+    assert "USING INDEX ix_appointments_starts_at" in query_plan(db, query)
+
+
+def test_photos_by_appointment_use_index(db):
+    query = db.query(models.AppointmentPhoto).filter(models.AppointmentPhoto.appointment_id == 1)
+    assert "USING INDEX ix_appointment_photos_appointment_id" in query_plan(db, query)
+
+
+def test_address_pages_use_queue_sort_key(db):
+    query = planning.order_addresses(
+        db.query(models.Address), after=(0, "bakkevej", 1, "", 1)
+    ).limit(51)
+    plan = query_plan(db, query)
+    assert "INDEX ix_planning_queue_sort_key" in plan
+    assert "TEMP B-TREE" not in plan
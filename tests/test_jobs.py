@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from datetime import datetime
+from uuid import uuid4
+
+from app import jobs, models
+
+
+def running_job(db, worker_id: str, heartbeat_at: datetime) -> models.Job:
+    job = models.Job(
+        id=uuid4().hex,
+        kind="batch_pdf",
+        status=models.JobStatus.RUNNING,
+        started_at=heartbeat_at,
+        worker_id=worker_id,
+        heartbeat_at=heartbeat_at,
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_fail_stale_jobs_keeps_jobs_of_live_workers(db):
+    live = running_job(db, "other-host:1:live", datetime.utcnow())
+    stale = running_job(db, "other-host:2:gone", datetime.utcnow() - jobs.STALE_AFTER * 2)
+
+    jobs.fail_stale_jobs()
+
+    db.expire_all()
+    assert db.get(models.Job, live.id).status == models.JobStatus.RUNNING
+    assert db.get(models.Job, stale.id).status == models.JobStatus.FAILED
+
+
+def test_heartbeat_only_touches_own_jobs(db):
+    old = datetime.utcnow() - jobs.STALE_AFTER * 2
+    own = running_job(db, jobs.WORKER_ID, old)
+    other = running_job(db, "other-host:3:gone", old)
+
+    jobs.send_heartbeat()
+
+    db.expire_all()
+    assert db.get(models.Job, own.id).heartbeat_at > old
+    assert db.get(models.Job, other.id).heartbeat_at == old
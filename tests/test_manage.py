@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from datetime import datetime
+import logging
+
+from app import manage, models
+
+
+def test_rebuild_status_restores_projections(db, caplog):
+    db.add(models.Address(street="Bakkevej", house_no="1", zip="8000", city="Aarhus"))
+    db.commit()
+    db.query(models.PlanningQueueEntry).delete()
+    db.query(models.AddressCurrentStatus).delete()
+    db.commit()
+
+    with caplog.at_level(logging.INFO, logger="app.manage"):
+        manage.main(["rebuild-status"])
+
+    assert db.query(models.PlanningQueueEntry).count() == 1
+    assert db.query(models.AddressCurrentStatus).count() == 1
+    assert "Status og planlægningskø genopbygget" in caplog.text
+
+
+def test_renditions_reports_pending_photos(db, caplog, monkeypatch):
+    monkeypatch.setattr(manage.photos, "missing_renditions", lambda: ["a.jpg", "b.jpg"])
+    generated: list[list[str]] = []
+    monkeypatch.setattr(manage.photos, "generate_all_renditions", generated.append)
+
+    with caplog.at_level(logging.INFO, logger="app.manage"):
+        manage.main(["renditions"])
+
+    assert generated == [["a.jpg", "b.jpg"]]
+    assert "Billedstørrelser genereret for 2 fotos" in caplog.text
+
+
+def test_photo_store_moves_legacy_photos_and_drops_unused_blobs(
+    db, caplog, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(manage.photo_store, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(manage.photos, "generate_all_renditions", lambda paths: None)
+    (tmp_path / "legacy.jpg").write_bytes(b"legacy")
+    (tmp_path / "unused.jpg").write_bytes(b"unused")
+    contractor = models.User(username="vvs", role=models.UserRole.VVS, password_hash="x")
+    address = models.Address(street="Bakkevej", house_no="1", zip="8000", city="Aarhus")
+    db.add_all([contractor, address])
+    db.flush()
+    appointment = models.Appointment(
+        address_id=address.id,
+        contractor_id=contractor.id,
+        starts_at=datetime(2026, 10, 1, 8),
+        ends_at=datetime(2026, 10, 1, 8, 30),
+        status=models.AppointmentStatus.CLOSED,
+    )
+    db.add(appointment)
+    db.flush()
+    db.add(
+        models.AppointmentPhoto(
+            appointment_id=appointment.id, address_id=address.id, file_path="legacy.jpg"
+        )
+    )
+    db.add(models.PhotoBlob(sha256="0" * 64, file_path="unused.jpg", size=6, ref_count=0))
+    db.commit()
+
+    with caplog.at_level(logging.INFO, logger="app.manage"):
+        manage.main(["photo-store"])
+
+    db.expire_all()
+    photo = db.query(models.AppointmentPhoto).one()
+    assert photo.blob_sha256 is not None
+    assert (tmp_path / photo.file_path).read_bytes() == b"legacy"
+    assert [blob.sha256 for blob in db.query(models.PhotoBlob)] == [photo.blob_sha256]
+    assert not (tmp_path / "unused.jpg").exists()
+    assert "1 fotos flyttet til blob-lageret, 1 ubrugte blobs slettet" in caplog.text
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from app.db import engine
+
+ROOT = Path(__file__).resolve().parent.parent
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="runs against a throwaway SQLite file"
+)
+
+
+def migrate(url: str, monkeypatch, revision: str, downgrade: bool = False) -> None:
+    monkeypatch.setenv("DATABASE_URL", url)
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    if downgrade:
+        command.downgrade(config, revision)
+    else:
+        command.upgrade(config, revision)
+
+
+def address_columns(url: str) -> set[str]:
+    inspector = inspect(create_engine(url))
+    return {column["name"] for column in inspector.get_columns("addresses")}
+
+
+def test_untracked_schema_downgrade_drops_only_what_it_added(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    migrate(url, monkeypatch, "0030")
+    with create_engine(url).begin() as connection:
+        connection.exec_driver_sql("ALTER TABLE addresses ADD COLUMN old_meter_no VARCHAR(120)")
+
+    migrate(url, monkeypatch, "0031")
+    assert {"old_meter_no", "new_meter_no"} <= address_columns(url)
+
+    migrate(url, monkeypatch, "0030", downgrade=True)
+    columns = address_columns(url)
+    assert "old_meter_no" in columns
+    assert "new_meter_no" not in columns
+    inspector = inspect(create_engine(url))
+    assert "address_unavailable_periods" not in inspector.get_table_names()
+    with create_engine(url).connect() as connection:
+        triggers = connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        ).scalars().all()
+    assert sorted(triggers) == ["address_search_ad", "address_search_ai", "address_search_au"]
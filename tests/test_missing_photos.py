@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from app import models
+from app.routes import admin_missing_photos
+
+
+def add_report_data(db) -> dict[str, models.Appointment]:
+    contractor = models.User(username="vvs", role=models.UserRole.VVS, password_hash="x")
+    db.add(contractor)
+    appointments: dict[str, models.Appointment] = {}
+    for index, street in enumerate(["Bakkevej", "Østergade", "Skovvej"], start=1):
+        address = models.Address(street=street, house_no="1", zip="8000", city="Aarhus")
+        db.add(address)
+        db.flush()
+        for day, status in (
+            (index, models.AppointmentStatus.CLOSED),
+            (index + 10, models.AppointmentStatus.COMPLETED),
+        ):
+            appointment = models.Appointment(
+                address_id=address.id,
+                contractor_id=contractor.id,
+                starts_at=datetime(2026, 9, day, 8),
+                ends_at=datetime(2026, 9, day, 8, 30),
+                status=status,
+            )
+            db.add(appointment)
+            appointments[street] = appointment
+    db.flush()
+    # Skovvej has a photo on its older appointment, which covers the address.
+    skovvej = appointments["Skovvej"]
+    older = (
+        db.query(models.Appointment)
+        .filter(
+            models.Appointment.address_id == skovvej.address_id,
+            models.Appointment.id != skovvej.id,
+        )
+        .one()
+    )
+    db.add(
+        models.AppointmentPhoto(
+            appointment_id=older.id, address_id=older.address_id, file_path="photo.jpg"
+        )
+    )
+    db.commit()
+    return appointments
+
+
+def test_report_keeps_latest_appointment_of_addresses_without_photos(db):
+    appointments = add_report_data(db)
+
+    rows = admin_missing_photos.missing_photos_query(db).all()
+
+    assert sorted(appointment.id for appointment, _, _ in rows) == sorted(
+        [appointments["Bakkevej"].id, appointments["Østergade"].id]
+    )
+    assert admin_missing_photos.count_missing_photos(db) == 2
+
+
+def test_report_pages_with_cursor_and_counts_once(admin_client, db, monkeypatch):
+    add_report_data(db)
+    monkeypatch.setattr(admin_missing_photos, "PAGE_SIZE", 1)
+
+    response = admin_client.get("/admin/missing-photos")
+    assert "Adresser uden fotos (2)" in response.text
+    assert "Østergade" in response.text
+    assert "Bakkevej" not in response.text
+    next_link = response.text.split('href="/admin/missing-photos?cursor=')[1].split('"')[0]
+    assert next_link.endswith("&total=2")
+
+    response = admin_client.get(f"/admin/missing-photos?cursor={next_link}")
+    assert "Bakkevej" in response.text
+    assert "Østergade" not in response.text
+    assert "Næste side" not in response.text
+
+    assert admin_client.get("/admin/missing-photos/count").json() == {"count": 2}
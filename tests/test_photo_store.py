@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from app import models, photo_store
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(photo_store, "UPLOAD_DIR", tmp_path)
+    return tmp_path
+
+
+def test_same_content_is_stored_once(db, upload_dir):
+    first = photo_store.store_stream(db, io.BytesIO(b"photo"), "a.jpg")
+    second = photo_store.store_stream(db, io.BytesIO(b"photo"), "b.JPG")
+    db.commit()
+
+    assert first is second
+    assert db.query(models.PhotoBlob).count() == 1
+    assert (upload_dir / first.file_path).read_bytes() == b"photo"
+
+
+def test_rollback_discards_new_blob_row(db):
+    photo_store.store_stream(db, io.BytesIO(b"photo"), "a.jpg")
+    db.rollback()
+
+    assert db.query(models.PhotoBlob).count() == 0
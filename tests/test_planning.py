@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import event
+
+from app import models, planning
+from app.db import engine
+from app.routes import admin_planning
+from app.routes.admin_planning import available_planning_dates, compute_plan
+
+
+def add_addresses(db, streets: list[str]) -> None:
+    for index, street in enumerate(streets):
+        db.add(models.Address(street=street, house_no=str(index + 1), zip="8000", city="Aarhus"))
+    db.commit()
+
+
+def test_street_priority_matches_non_ascii_street(db):
+    add_addresses(db, ["Bakkevej", "Østergade", "Åvej", "Bakkevej"])
+    db.add(models.StreetPriority(street="Østergade", priority=5))
+    db.commit()
+
+    queued, _ = planning.plannable_addresses(db, limit=2)
+    assert queued[0].street == "Østergade"
+
+    ordered = planning.order_addresses(db.query(models.Address)).limit(2).all()
+    assert ordered[0].street == "Østergade"
+
+
+def test_street_priority_change_updates_queue(db):
+    add_addresses(db, ["Bakkevej", "Ålegade"])
+    entry = models.StreetPriority(street="ÅLEGADE", priority=3)
+    db.add(entry)
+    db.commit()
+
+    queue = {row.street_key: row.priority for row in db.query(models.PlanningQueueEntry)}
+    assert queue == {"bakkevej": 0, "ålegade": 3}
+
+    entry.priority = 0
+    db.commit()
+    queued, _ = planning.plannable_addresses(db)
+    assert [address.street for address in queued] == ["Bakkevej", "Ålegade"]
+
+
+def add_vvs_days(db, days: list[date]) -> models.User:
+    contractor = models.User(username="vvs", role=models.UserRole.VVS, password_hash="x")
+    db.add(contractor)
+    db.flush()
+    for day in days:
+        db.add(
+            models.VvsAvailability(
+                user_id=contractor.id, date=day, start_time=time(8), end_time=time(10)
+            )
+        )
+    db.commit()
+    return contractor
+
+
+def test_planning_dates_use_constant_queries(db):
+    days = [date(2026, 11, 2) + timedelta(days=offset) for offset in range(5)]
+    contractor = add_vvs_days(db, days)
+    add_addresses(db, ["Bakkevej"])
+    address = db.query(models.Address).one()
+    db.add(
+        models.Appointment(
+            address_id=address.id,
+            contractor_id=contractor.id,
+            starts_at=datetime.combine(days[1], time(8)),
+            ends_at=datetime.combine(days[1], time(8, 30)),
+            status=models.AppointmentStatus.SCHEDULED,
+        )
+    )
+    db.commit()
+
+    statements: list[str] = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        options = available_planning_dates(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 2
+    assert [option["value"] for option in options] == [day.isoformat() for day in days]
+    assert options[1]["label"] == "03/11/2026 (1 planlagt ud af 4 mulighed)"
+    assert options[0]["slot_count"] == 4
+
+
+def test_commit_plan_checks_submitted_order(admin_client, db):
+    add_vvs_days(db, [date(2026, 11, 2)])
+    add_addresses(db, ["Bakkevej", "Østergade"])
+    db.add(models.StockMovement(movement_type=models.InventoryMovementType.PURCHASE, quantity=5))
+    db.commit()
+    ids = [address.id for address in db.query(models.Address).order_by(models.Address.id.desc())]
+
+    response = admin_client.post(
+        "/admin/planning/commit",
+        data={"date_raw": "2026-11-02", "address_order": str(ids[0])},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+    assert db.query(models.Appointment).count() == 0
+
+    response = admin_client.post(
+        "/admin/planning/commit",
+        data={"date_raw": "2026-11-02", "address_order": ",".join(map(str, ids))},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+    appointments = db.query(models.Appointment).order_by(models.Appointment.starts_at).all()
+    assert [appointment.address_id for appointment in appointments] == ids
+
+
+def test_preview_loads_capacity_and_one_page(admin_client, db, monkeypatch):
+    monkeypatch.setattr(admin_planning, "PREVIEW_PAGE_SIZE", 1)
+    add_vvs_days(db, [date(2026, 11, 2)])
+    add_addresses(db, ["Algade", "Bakkevej", "Cirkelvej", "Dalvej"])
+    db.add(models.StockMovement(movement_type=models.InventoryMovementType.PURCHASE, quantity=1))
+    db.commit()
+
+    response = admin_client.get("/admin/planning?date_query=2026-11-02&preview=1")
+    assert "Planlagt 1 af 4 adresser" in response.text
+    assert "Side 1 af 3" in response.text
+    assert "Bakkevej 2" in response.text
+    assert "Cirkelvej" not in response.text
+
+    response = admin_client.get("/admin/planning?date_query=2026-11-02&preview=1&page=2")
+    assert "Cirkelvej 3" in response.text
+    assert "Dalvej" not in response.text
+
+
+def test_compute_plan_with_order_keeps_reschedule_flags(db):
+    day = date(2026, 11, 2)
+    contractor = add_vvs_days(db, [day])
+    add_addresses(db, ["Bakkevej", "Østergade"])
+    first, second = db.query(models.Address).order_by(models.Address.id).all()
+    db.add(
+        models.Appointment(
+            address_id=second.id,
+            contractor_id=contractor.id,
+            starts_at=datetime(2026, 10, 1, 8),
+            ends_at=datetime(2026, 10, 1, 8, 30),
+            status=models.AppointmentStatus.NEEDS_RESCHEDULE,
+        )
+    )
+    db.add(models.StockMovement(movement_type=models.InventoryMovementType.PURCHASE, quantity=5))
+    db.commit()
+
+    planned, remaining, _, _, reschedule_ids = compute_plan(db, day, [first.id, second.id])
+    assert [slot.address.id for slot in planned] == [first.id, second.id]
+    assert remaining == 0
+    assert reschedule_ids == {second.id}
+
+
+def test_unavailable_periods_use_half_open_day(db):
+    add_addresses(db, ["Bakkevej", "Østergade"])
+    first, second = db.query(models.Address).order_by(models.Address.id).all()
+    plan_date = date(2026, 11, 2)
+    db.add(
+        models.AddressUnavailablePeriod(
+            address_id=first.id,
+            starts_at=datetime(2026, 11, 2, 23, 59, 59, 999999),
+            ends_at=datetime(2026, 11, 5),
+        )
+    )
+    db.add(
+        models.AddressUnavailablePeriod(
+            address_id=second.id, starts_at=datetime(2026, 11, 3), ends_at=datetime(2026, 11, 5)
+        )
+    )
+    db.commit()
+
+    assert planning.plannable_ids(db, plan_date) == {second.id}
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from datetime import date, time
+
+from app import models
+
+
+def test_address_routes(admin_client, db):
+    response = admin_client.post(
+        "/admin/addresses",
+        data={"street": "Østergade", "house_no": "4", "zip": "8000", "city": "Aarhus"},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+    address = db.query(models.Address).one()
+    assert address.street_key == "østergade"
+    db.add(models.Address(street="Bakkevej", house_no="1", zip="8000", city="Aarhus"))
+    db.commit()
+
+    response = admin_client.get("/admin/addresses")
+    assert response.status_code == 200
+    assert "<td>Østergade</td>" in response.text
+    assert "<td>Bakkevej</td>" in response.text
+    response = admin_client.get("/admin/addresses", params={"q": "øster"})
+    assert response.status_code == 200
+    assert "<td>Østergade</td>" in response.text
+    assert "<td>Bakkevej</td>" not in response.text
+
+
+def test_planning_routes(admin_client, db):
+    contractor = models.User(username="vvs", role=models.UserRole.VVS, password_hash="x")
+    db.add(contractor)
+    db.flush()
+    db.add(
+        models.VvsAvailability(
+            user_id=contractor.id, date=date(2026, 11, 2), start_time=time(8), end_time=time(9)
+        )
+    )
+    for number in range(3):
+        db.add(models.Address(street="Bakkevej", house_no=str(number + 1), zip="1", city="c"))
+    db.add(models.StockMovement(movement_type=models.InventoryMovementType.PURCHASE, quantity=5))
+    db.commit()
+
+    response = admin_client.get("/admin/planning", params={"date_query": "2026-11-02", "preview": 1})
+    assert response.status_code == 200
+    assert "0 planlagt ud af 2 mulighed" in response.text
+
+    response = admin_client.post(
+        "/admin/planning/commit", data={"date_raw": "2026-11-02"}, follow_redirects=False
+    )
+    assert response.status_code == 303
+    assert db.query(models.Appointment).count() == 2
+
+    response = admin_client.get("/admin/planning", params={"date_query": "2026-11-02"})
+    assert "2 planlagt ud af 2 mulighed" in response.text
+
+
+def test_status_route(admin_client, db):
+    db.add(models.Address(street="Bakkevej", house_no="1", zip="1", city="c"))
+    db.add(models.StockMovement(movement_type=models.InventoryMovementType.PURCHASE, quantity=7))
+    db.commit()
+
+    response = admin_client.get("/admin/status")
+    assert response.status_code == 200
+    assert "7" in response.text
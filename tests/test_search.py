@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+
+from app import models, search
+from app.db import engine
+
+requires_fts = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="other backends fall back to LIKE"
+)
+
+
+def add_addresses(db) -> None:
+    db.add_all(
+        [
+            models.Address(street="Østergade", house_no="4", zip="8000", city="Aarhus"),
+            models.Address(
+                street="Bakkevej",
+                house_no="12B",
+                zip="8200",
+                city="Aarhus N",
+                customer_name="Jens Hansen",
+            ),
+            models.Address(street="Skovvej", house_no="1", zip="8000", city="Aarhus"),
+        ]
+    )
+    db.commit()
+
+
+def streets(addresses) -> list[str]:
+    return sorted(address.street for address in addresses)
+
+
+def test_search_matches_every_term(db):
+    add_addresses(db)
+    query = search.filter_addresses(db, db.query(models.Address), "hansen 12")
+    assert streets(query.all()) == ["Bakkevej"]
+
+    query = search.filter_addresses(db, db.query(models.Address), "stergad")
+    assert streets(query.all()) == ["Østergade"]
+
+
+def test_search_index_follows_updates(db):
+    add_addresses(db)
+    address = db.query(models.Address).filter_by(street="Skovvej").one()
+    address.street = "Fyrrevej"
+    db.commit()
+
+    assert search.filter_addresses(db, db.query(models.Address), "skovvej").all() == []
+    query = search.filter_addresses(db, db.query(models.Address), "fyrrevej")
+    assert streets(query.all()) == ["Fyrrevej"]
+
+
+@requires_fts
+def test_suggestions_tolerate_typos(db):
+    add_addresses(db)
+    assert streets(search.suggest_addresses(db, "bakkevje")) == ["Bakkevej"]
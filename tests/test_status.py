@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from app import models
+from app.db import SessionLocal
+from app.routes import admin_status
+
+
+def test_snapshot_is_invalidated_on_commit_not_flush(db):
+    admin_status.invalidate_snapshot()
+    before = admin_status.dashboard_snapshot(db)
+
+    db.add(models.Address(street="Bakkevej", house_no="1", zip="8000", city="Aarhus"))
+    db.flush()
+    # A dashboard request between the flush and the commit must not cache
+    # numbers that are about to change.
+    with SessionLocal() as other:
+        assert admin_status.dashboard_snapshot(other) == before
+    assert admin_status._snapshot is not None
+
+    db.commit()
+    assert admin_status._snapshot is None
+
+
+def test_snapshot_survives_rolled_back_changes(db):
+    admin_status.invalidate_snapshot()
+    admin_status.dashboard_snapshot(db)
+
+    db.add(models.Address(street="Bakkevej", house_no="2", zip="8000", city="Aarhus"))
+    db.flush()
+    db.rollback()
+    assert admin_status._snapshot is not None
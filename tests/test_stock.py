@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from datetime import date, time
+import logging
+
+import pytest
+from sqlalchemy import delete, update
+
+from app import manage, models, stock
+from app.routes import admin_planning
+
+
+def add_movement(db, movement_type: models.InventoryMovementType, quantity: int) -> None:
+    db.add(models.StockMovement(movement_type=movement_type, quantity=quantity))
+    db.commit()
+
+
+def test_reserving_more_than_stock_is_rejected(db):
+    add_movement(db, models.InventoryMovementType.PURCHASE, 2)
+
+    with pytest.raises(stock.InsufficientStock):
+        add_movement(db, models.InventoryMovementType.RESERVE, -3)
+    db.rollback()
+
+    assert stock.available_stock(db) == 2
+    assert stock.ledger_stock(db.connection()) == 2
+
+
+def test_guard_rebuilds_missing_balance_row(db):
+    add_movement(db, models.InventoryMovementType.PURCHASE, 2)
+    db.execute(delete(models.StockBalance.__table__))
+    db.commit()
+
+    add_movement(db, models.InventoryMovementType.RESERVE, -1)
+    assert stock.available_stock(db) == 1
+
+    db.execute(delete(models.StockBalance.__table__))
+    db.commit()
+    with pytest.raises(stock.InsufficientStock):
+        add_movement(db, models.InventoryMovementType.RESERVE, -2)
+    db.rollback()
+    assert stock.ledger_stock(db.connection()) == 1
+
+
+def test_reconcile_repairs_drifted_balance(db, caplog):
+    add_movement(db, models.InventoryMovementType.PURCHASE, 4)
+    db.execute(update(models.StockBalance.__table__).values(quantity=99))
+    db.commit()
+
+    with caplog.at_level(logging.INFO, logger="app.manage"):
+        manage.main(["reconcile-stock"])
+
+    assert stock.available_stock(db) == 4
+    assert "Lagersaldo rettet fra 99 til 4" in caplog.text
+    assert stock.reconcile_stock(db) == (4, 4)
+
+
+def test_commit_plan_rolls_back_when_stock_runs_out(admin_client, db, monkeypatch):
+    contractor = models.User(username="vvs", role=models.UserRole.VVS, password_hash="x")
+    db.add(contractor)
+    db.flush()
+    db.add(
+        models.VvsAvailability(
+            user_id=contractor.id, date=date(2026, 11, 2), start_time=time(8), end_time=time(10)
+        )
+    )
+    for house_no in ("1", "2"):
+        db.add(models.Address(street="Bakkevej", house_no=house_no, zip="8000", city="Aarhus"))
+    db.commit()
+    add_movement(db, models.InventoryMovementType.PURCHASE, 1)
+    # Another commit took the stock after this request read it.
+    monkeypatch.setattr(admin_planning, "available_stock", lambda db: 2)
+
+    response = admin_client.post("/admin/planning/commit", data={"date_raw": "2026-11-02"})
+
+    assert "Lageret er ændret imens. Prøv igen" in response.text
+    assert db.query(models.Appointment).count() == 0
+    assert stock.available_stock(db) == 1